@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import numpy as np
+from pattern import Pattern
+from storage import read_metadata
+
+LIBRARY_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(LIBRARY_ROOT, '.generation_cache')
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, type):
+        return value.__module__ + '.' + value.__qualname__
+    raise TypeError("Cannot hash argument of type {!r}".format(type(value)))
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=_to_json).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def library_modules():
+    """
+    :return: Sorted names of the library's modules, i.e. every .py file next to this one
+    """
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(LIBRARY_ROOT) if name.endswith('.py'))
+
+
+@functools.lru_cache(maxsize=None)
+def library_version():
+    """
+    Hashes every module of the library rather than a fixed list, so that new modules and the ones only imported
+    inside functions (e.g. polygon_merge, stl_writer or kicad_reader) invalidate cached geometry when edited too.
+    :return: Hash of the library's own source files and the versions of the libraries that shape its output
+    """
+    import ezdxf
+    modules = library_modules()
+    sources = []
+    for name in modules:
+        with open(os.path.join(LIBRARY_ROOT, name + '.py'), 'rb') as f:
+            sources.append(hashlib.sha256(f.read()).hexdigest())
+    return _digest(modules, sources, np.__version__, ezdxf.__version__)
+
+
+def geometry_digest(pattern, digests=None):
+    """
+    :param pattern: Pattern or PCBPattern
+    :param digests: Dictionary of {id(cell): digest} of the cells hashed so far, so shared cells are hashed once
+    :return: Hash of everything an exporter reads from the pattern: its geometry, text, setting, cell instances and
+             pending transform (but not its parameters)
+    """
+    digests = {} if digests is None else digests
+    h = hashlib.sha256(np.ascontiguousarray(pattern.transform, dtype=np.float64).tobytes())
+    if isinstance(pattern, Pattern):
+        columns = [(name + '/' + field, column) for name in list(Pattern.BUFFERS) + ['polygons']
+                   for field, column in getattr(pattern, name).columns().items()]
+        for name, column in columns + [('polygons/vertices', pattern.polygons.vertices.points)]:
+            column = np.ascontiguousarray(column)
+            h.update('{}{}{}'.format(name, column.dtype.str, column.shape).encode('utf-8'))
+            h.update(column.tobytes())
+        h.update(_digest(pattern.setting, pattern.text).encode('utf-8'))
+        for cell, transforms in pattern.instances:
+            if id(cell) not in digests:
+                digests[id(cell)] = geometry_digest(cell, digests)
+            h.update(digests[id(cell)].encode('utf-8'))
+            h.update(np.ascontiguousarray(transforms, dtype=np.float64).tobytes())
+    else:  # a PCBPattern's records are plain tuples
+        h.update(_digest({name: value for name, value in vars(pattern).items()
+                          if name not in ('transform', 'parameters', 'cache_key')}).encode('utf-8'))
+    return h.hexdigest()
+
+
+class GenerationCache:
+    """
+    Content-addressed cache of generated patterns and the files exported from them. Every entry is a directory named
+    after the hash of its inputs; entries are evicted least recently used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, func):
+        """
+        Decorator for generator functions that return a Pattern or PCBPattern. The key hashes the function's source,
+        its arguments (after applying defaults) and library_version(); on a hit, the saved geometry is loaded instead
+        of calling the function. The arguments are recorded in the result's parameters, and the key in its cache_key.
+        """
+        signature = inspect.signature(func)
+        source = inspect.getsource(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parameters = json.loads(json.dumps(bound.arguments, default=_to_json))  # as stored in the metadata
+            key = _digest(func.__module__ + '.' + func.__qualname__, source, parameters, library_version())
+            path = os.path.join(self._entry(key), 'geometry.npz')
+            if os.path.exists(path):
+                self.hits += 1
+                self._touch(key)
+                result = self._load(path)
+            else:
+                self.misses += 1
+                result = func(*args, **kwargs)
+                result.parameters = dict(parameters, **result.parameters)
+                os.makedirs(self._entry(key), exist_ok=True)
+                result.save(path)
+                self.evict()
+            result.cache_key = key
+            return result
+        return wrapper
+
+    def export(self, pattern, method, *outfiles, **kwargs):
+        """
+        Calls an exporter of a pattern returned by a cached generator, reusing the files from an earlier identical
+        export when possible, e.g. cache.export(p, 'generate_svg', 'out.svg', save=True, offset_x=10). The export key
+        includes geometry_digest(pattern), so a pattern changed (or transformed) after generation is exported afresh.
+        :param pattern: Pattern or PCBPattern returned by a function wrapped with cached
+        :param method: Name of the exporter method
+        :param outfiles: Output file paths, passed to the exporter as its leading positional arguments
+        :return: The exporter's return value, or None if the files were copied from the cache
+        """
+        key = getattr(pattern, 'cache_key', None)
+        if key is None:
+            return getattr(pattern, method)(*outfiles, **kwargs)
+        suffixes = [os.path.splitext(outfile)[1] for outfile in outfiles]
+        export_key = _digest(key, geometry_digest(pattern), method, suffixes, kwargs)
+        cached_files = [os.path.join(self._entry(key), '{}_{}{}'.format(export_key[:16], i, os.path.splitext(f)[1]))
+                        for i, f in enumerate(outfiles)]
+        if all(os.path.exists(f) for f in cached_files):
+            self.hits += 1
+            self._touch(key)
+            for cached_file, outfile in zip(cached_files, outfiles):
+                shutil.copyfile(cached_file, outfile)
+            return None
+        self.misses += 1
+        result = getattr(pattern, method)(*outfiles, **kwargs)
+        if all(os.path.exists(f) for f in outfiles):  # e.g. not when called with save=False
+            os.makedirs(self._entry(key), exist_ok=True)
+            for cached_file, outfile in zip(cached_files, outfiles):
+                shutil.copyfile(outfile, cached_file)
+            self.evict()
+        return result
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes
+        :return: Number of bytes freed
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            entries.append((os.stat(path).st_mtime, size, path))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            freed += size
+        return freed
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _touch(self, key):
+        os.utime(self._entry(key))  # the entry directory's mtime is its last use
+
+    @staticmethod
+    def _load(path):
+        if read_metadata(path)['class'] == 'PCBPattern':
+            from pcb_layout_plus_dxf import PCBPattern  # pulls in shapely, only needed for boards
+            return PCBPattern.load(path)
+        return Pattern.load(path)
+
+
+default_cache = GenerationCache()
+cached = default_cache.cached
@@ -0,0 +1,159 @@
+import numpy as np
+
+# Group codes kept for each supported entity; everything else is skipped while streaming
+ENTITY_CODES = {'LINE': {'8', '10', '20', '11', '21'},
+                'ARC': {'8', '10', '20', '40', '50', '51', '230'},
+                'CIRCLE': {'8', '10', '20', '40', '230'},
+                'LWPOLYLINE': {'8', '10', '20', '42', '70', '230'},
+                'POLYLINE': {'8', '70', '230'},
+                'VERTEX': {'10', '20', '42', '70'},
+                'SEQEND': set()}
+MESH_VERTEX_FLAGS = 16 | 64 | 128  # VERTEX flags of spline frame points, 3D meshes and polyface faces (not outlines)
+
+
+class DXFGeometry:
+    """
+    Flat geometry read from a DXF file: straight segments and arcs, each with the layer of its entity
+    """
+
+    def __init__(self):
+        self.segments = []  # [x1, y1, x2, y2]
+        self.segment_layers = []
+        self.arcs = []  # [cx, cy, radius, start angle, end angle] (radians, counterclockwise from start to end)
+        self.arc_layers = []
+        self.skipped = {}  # entity type: count, for the entities that are not read (INSERT, TEXT, SPLINE, ...)
+
+    def add_polyline(self, pts, bulges, closed, layer, mirrored):
+        """
+        Adds the straight and bulged (arc) segments of a polyline
+        :param pts: List of [x, y] vertices
+        :param bulges: Bulge of the segment starting at each vertex (tan of a quarter of its included angle)
+        :param closed: Whether the polyline has a segment back from its last vertex to the first
+        :param mirrored: Whether the entity's extrusion direction is -z, which mirrors its x coordinates
+        """
+        if len(pts) < 2:
+            return
+        if mirrored:
+            pts = [[-x, y] for x, y in pts]
+            bulges = [-b for b in bulges]
+        count = len(pts) if closed else len(pts) - 1
+        for k in range(count):
+            (x1, y1), (x2, y2), bulge = pts[k], pts[(k + 1)%len(pts)], bulges[k]
+            if bulge == 0 or (x1 == x2 and y1 == y2):
+                self.segments.append([x1, y1, x2, y2])
+                self.segment_layers.append(layer)
+                continue
+            # arc through both vertices, turning counterclockwise if bulge > 0, by an included angle of 4*atan(bulge)
+            theta = 4*np.arctan(bulge)
+            dx, dy = x2 - x1, y2 - y1
+            chord = np.hypot(dx, dy)
+            radius = chord/(2*abs(np.sin(theta/2)))
+            # distance from the chord midpoint to the center, towards the left of the chord for counterclockwise arcs
+            h = radius*np.cos(theta/2)*np.sign(theta)
+            cx, cy = (x1 + x2)/2 - h*dy/chord, (y1 + y2)/2 + h*dx/chord
+            a1, a2 = np.arctan2(y1 - cy, x1 - cx), np.arctan2(y2 - cy, x2 - cx)
+            if theta < 0:
+                a1, a2 = a2, a1
+            self._append_arc(cx, cy, radius, a1, a2, layer)
+
+    def add_arc(self, cx, cy, radius, start_angle, end_angle, layer, mirrored):
+        """
+        :param start_angle: Start angle (degrees)
+        :param end_angle: End angle (degrees), reached counterclockwise from start_angle
+        """
+        a1, a2 = np.deg2rad(start_angle), np.deg2rad(end_angle)
+        if mirrored:  # x -> -x reverses the direction, so the arc now runs from pi - a2 to pi - a1
+            cx, a1, a2 = -cx, np.pi - a2, np.pi - a1
+        self._append_arc(cx, cy, radius, a1, a2, layer)
+
+    def _append_arc(self, cx, cy, radius, a1, a2, layer):
+        """
+        Stores a counterclockwise arc with its start angle in [0, 2pi) and its end angle in (start, start + 2pi]
+        """
+        a1 %= 2*np.pi
+        a2 %= 2*np.pi
+        if a2 <= a1:
+            a2 += 2*np.pi
+        self.arcs.append([cx, cy, radius, a1, a2])
+        self.arc_layers.append(layer)
+
+
+def read_dxf_geometry(infile):
+    """
+    Streams the ENTITIES section of an ASCII DXF file, keeping only the group codes of LINE, ARC, CIRCLE, LWPOLYLINE
+    and POLYLINE entities. The file is read line by line and no document is built, so memory use is that of the
+    returned geometry. Entities inside blocks are not read (INSERTs are counted as skipped).
+    :param infile: File path
+    :return: DXFGeometry
+    """
+    geometry = DXFGeometry()
+    section = None
+    kind, tags = None, []
+    polyline = None  # (flags, layer, mirrored, vertices, bulges) of the POLYLINE whose VERTEX entities are being read
+
+    def finish(kind, tags):
+        nonlocal polyline
+        values = {}
+        for code, value in tags:
+            values.setdefault(code, value)
+        layer = values.get('8', '0')
+        mirrored = float(values.get('230', 1)) < 0
+        if kind == 'LINE':
+            geometry.segments.append([float(values['10']), float(values['20']), float(values['11']),
+                                      float(values['21'])])
+            geometry.segment_layers.append(layer)
+        elif kind == 'ARC':
+            geometry.add_arc(float(values['10']), float(values['20']), float(values['40']), float(values['50']),
+                             float(values['51']), layer, mirrored)
+        elif kind == 'CIRCLE':
+            geometry.arcs.append([float(values['10'])*(-1 if mirrored else 1), float(values['20']),
+                                  float(values['40']), 0., 2*np.pi])
+            geometry.arc_layers.append(layer)
+        elif kind == 'LWPOLYLINE':
+            pts, bulges = [], []
+            for code, value in tags:
+                if code == '10':
+                    pts.append([float(value), 0.])
+                    bulges.append(0.)
+                elif code == '20':
+                    pts[-1][1] = float(value)
+                elif code == '42' and bulges:
+                    bulges[-1] = float(value)
+            geometry.add_polyline(pts, bulges, int(values.get('70', 0)) & 1, layer, mirrored)
+        elif kind == 'POLYLINE':
+            polyline = (int(values.get('70', 0)), layer, mirrored, [], [])
+        elif kind == 'VERTEX' and polyline is not None:
+            if not int(values.get('70', 0)) & MESH_VERTEX_FLAGS:
+                polyline[3].append([float(values.get('10', 0)), float(values.get('20', 0))])
+                polyline[4].append(float(values.get('42', 0)))
+        elif kind == 'SEQEND' and polyline is not None:
+            flags, layer, mirrored, pts, bulges = polyline
+            if not flags & (16 | 64):  # 3D polygon meshes and polyface meshes are not outlines
+                geometry.add_polyline(pts, bulges, flags & 1, layer, mirrored)
+            polyline = None
+        else:
+            geometry.skipped[kind] = geometry.skipped.get(kind, 0) + 1
+
+    with open(infile, 'r', errors='replace') as f:
+        for code, value in zip(f, f):  # group code and value lines alternate
+            code = code.strip()
+            if code == '0':
+                if kind is not None:
+                    finish(kind, tags)
+                    kind = None
+                value = value.strip()
+                if value == 'ENDSEC':
+                    section = None
+                elif value == 'EOF':
+                    break
+                elif section == 'ENTITIES':
+                    kind, tags = value, []
+                    codes = ENTITY_CODES.get(value, ())
+                else:
+                    section = 'START' if value == 'SECTION' else section
+            elif kind is not None:
+                if code in codes:
+                    tags.append((code, value.strip()))
+            elif section == 'START' and code == '2':
+                section = value.strip()
+    return geometry
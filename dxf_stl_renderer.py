@@ -0,0 +1,212 @@
+"""
+Command-line entry point: runs a registered (or any) generator function and exports the result.
+
+    python dxf_stl_renderer.py run hexagon -p nx=14 -p gap=2.5 -f svg,dxf -o patterns/hexagon
+    python dxf_stl_renderer.py run scripts/generate_square_pattern.py:generate_squarelv1_pattern -p width=80 ...
+    python dxf_stl_renderer.py list
+    python dxf_stl_renderer.py bench-imports
+
+Only the standard library is imported up front. pattern (and with it numpy) is imported once a generator is loaded,
+and ezdxf, svgwrite and shapely only by the exporters that need them, so SVG-only runs never load them.
+"""
+import argparse
+import ast
+import importlib.util
+import inspect
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name: (script relative to the repository, function, default parameters taken from the script's __main__ block)
+GENERATORS = {
+    'hexagon': ('scripts/generate_hexagon_pattern.py', 'generate_hexagon_pattern',
+                dict(nx=14, ny=20, s=10., buffer_height=20., seamhole_diameter=3., spring_radius=0.6, spring_gap=0.7,
+                     spring_thickness=0.5, gap=3.)),
+    'square': ('scripts/generate_square_pattern.py', 'generate_squarelv1_pattern',
+               dict(width=80., height=120., nx=8, ny=12, buffer_height=20., seamhole_diameter=3., kerf=3.,
+                    gap=(5*3 + 4*3 + 7*2)*0.0254)),
+    'squarelv2': ('scripts/generate_squarelv2_pattern.py', 'generate_squarelv2_pattern',
+                  dict(width=140., height=200., nx=14, ny=20, buffer_height=20., seamhole_diameter=3., kerf=3.,
+                       kerflv2=1., gap=1.5, gaplv2=1.5)),
+    'aluminum_square_array': ('scripts/generate_aluminum_square_array.py', 'generate_aluminum_square_array',
+                              dict(nx=5, ny=5, cell_width=15, cell_height=15)),
+    'triangular': ('scripts/generate_triangular_pattern.py', 'generate_triangular_pattern',
+                   dict(width=25., height=154., nx=3, angle=math.pi/6, buffer_width=0., buffer_height=0.,
+                        gap=0.156*(25./3)/2/math.cos(math.pi/6))),
+    'hexagon_star': ('scripts/generate_hexagon_star_pattern.py', 'generate_hexagon_pattern',
+                     dict(nx=18, ny=18, s=10., buffer_height=20., kerf=1, gap=1, handle_x=10, handle_y=10)),
+    'serpentine': ('scripts/generate_serpentine_pattern.py', 'generate_hexagon_pattern',
+                   dict(nx=18, ny=18, s=10., buffer_height=20., kerf=1, gap=1, handle_x=10, handle_y=10)),
+    'test_cut_curio': ('scripts/generate_test_cut_silhouette_curio.py', 'generate_test_cut_curio', {}),
+}
+
+# Modules each output format needs beyond pattern/numpy, imported by the exporter itself
+FORMAT_DEPENDENCIES = {'svg': (), 'dxf': ('ezdxf',), 'png': (), 'stl': ('shapely',), 'npz': (),
+                       'kicad_pcb': ()}
+HEAVY_MODULES = ('ezdxf', 'svgwrite', 'shapely', 'matplotlib')
+
+
+def register_generator(name, script, function, defaults=None):
+    """
+    Makes a generator available to the command line under a short name
+    :param name: Name used on the command line
+    :param script: Path of the script defining the generator (absolute, or relative to the repository)
+    :param function: Name of the generator function in the script
+    :param defaults: Dictionary of default parameters
+    :return: None
+    """
+    GENERATORS[name] = (script, function, defaults or {})
+
+
+def load_generator(spec):
+    """
+    :param spec: A registered name, or script.py:function
+    :return: (generator function, default parameters)
+    """
+    if spec in GENERATORS:
+        script, function, defaults = GENERATORS[spec]
+    elif ':' in spec:
+        (script, function), defaults = spec.rsplit(':', 1), {}
+    else:
+        raise ValueError("Unknown generator {!r}, use one of {} or script.py:function".format(
+            spec, ', '.join(GENERATORS)))
+    path = script if os.path.isabs(script) else os.path.join(ROOT, script)
+    for directory in (ROOT, os.path.dirname(path)):  # the scripts import the library and their neighbours by name
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = sys.modules.get(name)
+    if module is None:
+        module_spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(module_spec)
+        sys.modules[name] = module
+        module_spec.loader.exec_module(module)
+    return getattr(module, function), defaults
+
+
+def parse_value(text):
+    """
+    :return: The Python literal written in text (number, tuple, ...), or text itself if it is not a literal
+    """
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def run(spec, parameters, formats, outstem, offset=(0., 0.)):
+    """
+    Generates a pattern and exports it to every requested format
+    :param spec: Generator name or script.py:function
+    :param parameters: Dictionary of parameters overriding the generator's defaults
+    :param formats: Output formats (see sweep.FORMATS)
+    :param outstem: Output path without extension
+    :param offset: (offset_x, offset_y) for the exporters that take one
+    :return: List of written files
+    """
+    generator, defaults = load_generator(spec)
+    parameters = dict(defaults, **parameters)
+    missing = [name for name, parameter in inspect.signature(generator).parameters.items()
+               if parameter.default is inspect.Parameter.empty and name not in parameters]
+    if missing:
+        raise ValueError("Missing parameters for {}: {} (pass them with -p name=value)".format(
+            spec, ', '.join(missing)))
+    from sweep import exporter as format_exporter
+
+    start = time.perf_counter()
+    pattern = generator(**parameters)
+    print("Generated {} in {:.3f} s".format(spec, time.perf_counter() - start))
+    written = []
+    for fmt in formats:
+        method, suffixes = format_exporter(pattern, fmt)
+        outfiles = [outstem + suffix for suffix in suffixes]
+        exporter = getattr(pattern, method)
+        kwargs = {name: value for name, value in zip(('offset_x', 'offset_y'), offset)
+                  if name in inspect.signature(exporter).parameters}
+        start = time.perf_counter()
+        exporter(*outfiles, **kwargs)
+        print("Wrote {} in {:.3f} s".format(', '.join(outfiles), time.perf_counter() - start))
+        written += outfiles
+    return written
+
+
+def benchmark_imports(formats=('svg', 'dxf', 'png', 'stl'), spec='hexagon', repeats=5, target_ms=150.):
+    """
+    Measures the cold-start import time of a run, per output format: each measurement is a fresh interpreter that
+    loads the generator and the exporter's dependencies (without generating anything)
+    :param formats: Output formats to measure
+    :param spec: Generator whose script is loaded
+    :param repeats: Number of fresh interpreters per format (the fastest one counts)
+    :param target_ms: Import time budget for SVG-only runs
+    :return: True if SVG-only runs meet target_ms
+    """
+    import subprocess
+    child = ("import sys, time\n"
+             "start = time.perf_counter()\n"
+             "import dxf_stl_renderer as cli\n"
+             "cli.load_generator({spec!r})\n"
+             "import sweep, pattern\n"
+             "for module in cli.FORMAT_DEPENDENCIES[{fmt!r}]:\n"
+             "    __import__(module)\n"
+             "print(time.perf_counter() - start, ','.join(m for m in cli.HEAVY_MODULES if m in sys.modules))\n")
+    met = True
+    for fmt in formats:
+        times, wall_times = [], []
+        for _ in range(repeats):
+            wall_start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', child.format(spec=spec, fmt=fmt)], cwd=ROOT, check=True,
+                                    capture_output=True, text=True).stdout.split('\n')[-2].split(' ')
+            wall_times.append(time.perf_counter() - wall_start)
+            times.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 and output[1] else 'none'
+        print("{:>10}: imports {:6.1f} ms, process {:6.1f} ms, heavy modules loaded: {}".format(
+            fmt, 1e3*min(times), 1e3*min(wall_times), heavy))
+        if fmt == 'svg' and 1e3*min(times) > target_ms:
+            met = False
+    print("SVG-only import time {} the {:.0f} ms target".format('meets' if met else 'exceeds', target_ms))
+    return met
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='dxf_stl_renderer', description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run a generator and export the result')
+    run_parser.add_argument('generator', help='registered name (see list) or script.py:function')
+    run_parser.add_argument('-p', '--param', action='append', default=[], metavar='NAME=VALUE',
+                            help='generator parameter (Python literal), may be repeated')
+    run_parser.add_argument('-f', '--formats', default='svg', help='comma-separated output formats (default: svg)')
+    run_parser.add_argument('-o', '--output', help='output path without extension (default: patterns/<generator>)')
+    run_parser.add_argument('--offset', nargs=2, type=float, default=(0., 0.), metavar=('X', 'Y'))
+
+    commands.add_parser('list', help='list the registered generators')
+
+    bench_parser = commands.add_parser('bench-imports', help='measure cold-start import time per output format')
+    bench_parser.add_argument('--target-ms', type=float, default=150.)
+    bench_parser.add_argument('--repeats', type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == 'list':
+        for name, (script, function, defaults) in GENERATORS.items():
+            print("{:<22} {}:{}".format(name, script, function))
+    elif args.command == 'bench-imports':
+        return 0 if benchmark_imports(repeats=args.repeats, target_ms=args.target_ms) else 1
+    else:
+        parameters = {}
+        for param in args.param:
+            name, _, value = param.partition('=')
+            parameters[name.strip()] = parse_value(value.strip())
+        name = os.path.splitext(os.path.basename(args.generator.split(':')[0]))[0]
+        outstem = args.output or os.path.join('patterns', name)
+        try:
+            run(args.generator, parameters, [fmt.strip() for fmt in args.formats.split(',')], outstem, args.offset)
+        except ValueError as e:
+            parser.error(str(e))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,597 @@
+import numpy as np
+
+
+class ColumnBuffer:
+    """
+    Growable, column-oriented record store backed by contiguous NumPy arrays.
+    Every field lives in its own array whose first axis is the record index. The capacity doubles whenever an append
+    would overflow, so appends are amortized O(1) and every field can be read back as a zero-copy slice.
+    Subclasses declare their fields in FIELDS as {name: (per-record shape, dtype)}.
+    """
+    FIELDS = {}
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        self._data = {name: np.empty((capacity,) + shape, dtype=dtype) for name, (shape, dtype) in self.FIELDS.items()}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return len(next(iter(self._data.values())))
+
+    @property
+    def nbytes(self):
+        """
+        :return: The number of bytes used by the stored records (excluding spare capacity)
+        """
+        return sum(arr[:self.size].nbytes for arr in self._data.values())
+
+    def column(self, name):
+        """
+        :param name: Field name
+        :return: A view of the field's values for all stored records
+        """
+        return self._data[name][:self.size]
+
+    def columns(self):
+        """
+        :return: Dictionary of {field name: view of the stored values}
+        """
+        return {name: arr[:self.size] for name, arr in self._data.items()}
+
+    def reserve(self, n):
+        """
+        Makes sure there is room to append n more records without reallocating
+        :param n: Number of records to make room for
+        :return: None
+        """
+        needed = self.size + n
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2*capacity)
+        for name, arr in self._data.items():
+            grown = np.empty((new_capacity,) + arr.shape[1:], dtype=arr.dtype)
+            grown[:self.size] = arr[:self.size]
+            self._data[name] = grown
+
+    def extend_columns(self, n, **columns):
+        """
+        Appends n records at once. Each keyword is a field name whose value broadcasts to (n,) + field shape, so
+        scalars can be used for fields that are the same for every new record.
+        :param n: Number of records to append
+        :return: Slice of the new records' indices
+        """
+        self.reserve(n)
+        start = self.size
+        for name, values in columns.items():
+            self._data[name][start:start + n] = values
+        self.size += n
+        return slice(start, start + n)
+
+    @classmethod
+    def from_columns(cls, **columns):
+        """
+        Wraps existing arrays (e.g. memory-mapped ones) without copying them. The buffer starts full, so the first
+        append copies the data into fresh, growable arrays.
+        :return: New buffer holding one record per row of the arrays
+        """
+        buf = cls(capacity=0)
+        buf._data = {name: columns[name] for name in cls.FIELDS}
+        buf.size = len(next(iter(buf._data.values())))
+        return buf
+
+    def clear(self):
+        self.size = 0
+
+    def copy(self):
+        other = self.__class__(capacity=max(self.size, 1))
+        other.extend_columns(self.size, **self.columns())
+        return other
+
+    def take(self, indices):
+        """
+        :param indices: Record indices (or a boolean mask) to keep, in the order they should appear
+        :return: A new buffer holding only the selected records
+        """
+        columns = {name: arr[indices] for name, arr in self.columns().items()}
+        n = len(next(iter(columns.values())))
+        other = self.__class__(capacity=max(n, 1))
+        other.extend_columns(n, **columns)
+        return other
+
+
+class SegmentBuffer(ColumnBuffer):
+    """
+    Line segments, stored as an (N, 2, 2) float64 array of [[x1, y1], [x2, y2]] plus the drawing mode of each segment
+    """
+    FIELDS = {'segments': ((2, 2), np.float64),
+              'mode': ((), np.uint8)}
+
+    @property
+    def segments(self):
+        return self._data['segments'][:self.size]
+
+    @property
+    def mode(self):
+        return self._data['mode'][:self.size]
+
+    def append(self, p1, p2, mode):
+        """
+        Adds a single segment
+        :param p1: Start point of the segment
+        :param p2: End point of the segment
+        :param mode: The drawing mode
+        :return: None
+        """
+        self.reserve(1)
+        self._data['segments'][self.size] = (p1, p2)
+        self._data['mode'][self.size] = mode
+        self.size += 1
+
+    def extend(self, segments, mode):
+        """
+        Adds many segments at once
+        :param segments: Array-like of shape (N, 2, 2)
+        :param mode: The drawing mode, either a single value or one per segment
+        :return: Slice of the new segments' indices
+        """
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+        return self.extend_columns(len(segments), segments=segments, mode=mode)
+
+
+class ArcBuffer(ColumnBuffer):
+    """
+    Circular arcs (full circles span 0 to 2*pi), stored column-wise as center, radius, start/end angle and mode
+    """
+    FIELDS = {'center': ((2,), np.float64),
+              'radius': ((), np.float64),
+              'start_angle': ((), np.float64),
+              'end_angle': ((), np.float64),
+              'mode': ((), np.uint8)}
+
+    @property
+    def center(self):
+        return self._data['center'][:self.size]
+
+    @property
+    def radius(self):
+        return self._data['radius'][:self.size]
+
+    @property
+    def start_angle(self):
+        return self._data['start_angle'][:self.size]
+
+    @property
+    def end_angle(self):
+        return self._data['end_angle'][:self.size]
+
+    @property
+    def mode(self):
+        return self._data['mode'][:self.size]
+
+    def append(self, center, radius, start_angle, end_angle, mode):
+        """
+        Adds a single arc
+        :param center: Center of arc
+        :param radius: Radius of arc
+        :param start_angle: Start angle of arc (radians, CCW from +x axis)
+        :param end_angle: End angle of arc (radians, CCW from +x axis)
+        :param mode: The drawing mode
+        :return: None
+        """
+        self.reserve(1)
+        i = self.size
+        self._data['center'][i] = center
+        self._data['radius'][i] = radius
+        self._data['start_angle'][i] = start_angle
+        self._data['end_angle'][i] = end_angle
+        self._data['mode'][i] = mode
+        self.size += 1
+
+    def extend(self, centers, radii, start_angles, end_angles, mode):
+        """
+        Adds many arcs at once. Every argument besides centers may be a scalar or one value per arc.
+        :param centers: Array-like of shape (N, 2)
+        :return: Slice of the new arcs' indices
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        return self.extend_columns(len(centers), center=centers, radius=radii, start_angle=start_angles,
+                                   end_angle=end_angles, mode=mode)
+
+
+class PointBuffer(ColumnBuffer):
+    """
+    Plain (N, 2) float64 point storage
+    """
+    FIELDS = {'points': ((2,), np.float64)}
+
+    @property
+    def points(self):
+        return self._data['points'][:self.size]
+
+    def extend(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.extend_columns(len(points), points=points)
+
+
+class PolygonBuffer(ColumnBuffer):
+    """
+    Closed polygons with a variable number of vertices. All vertices share one PointBuffer; each polygon record keeps
+    the offset and count of its vertices in that buffer, plus its drawing mode.
+    """
+    FIELDS = {'offset': ((), np.int64),
+              'count': ((), np.int64),
+              'mode': ((), np.uint8)}
+
+    def __init__(self, capacity=16):
+        super().__init__(capacity)
+        self.vertices = PointBuffer(capacity=4*capacity)
+
+    @property
+    def offset(self):
+        return self._data['offset'][:self.size]
+
+    @property
+    def count(self):
+        return self._data['count'][:self.size]
+
+    @property
+    def mode(self):
+        return self._data['mode'][:self.size]
+
+    @property
+    def nbytes(self):
+        return super().nbytes + self.vertices.nbytes
+
+    def __iter__(self):
+        """
+        :return: Iterator of (vertices, mode), where vertices is an (n, 2) view into the shared vertex buffer
+        """
+        points = self.vertices.points
+        for offset, count, mode in zip(self.offset, self.count, self.mode):
+            yield points[offset:offset + count], mode
+
+    def append(self, pts, mode):
+        """
+        Adds a single closed polygon
+        :param pts: Corners of the polygon (the closing edge back to pts[0] is implicit)
+        :param mode: The drawing mode
+        :return: None
+        """
+        span = self.vertices.extend(pts)
+        self.extend_columns(1, offset=span.start, count=span.stop - span.start, mode=mode)
+
+    def edges(self):
+        """
+        :return: (segments, mode), where segments is an (M, 2, 2) array of every polygon edge including the closing
+                 edges, and mode holds the drawing mode of each edge
+        """
+        points = self.vertices.points
+        offset, count = self.offset, self.count
+        nxt = np.arange(len(points)) + 1
+        ends = offset + count - 1
+        nxt[ends] = offset  # wrap the last vertex of each polygon back to its first
+        return np.stack([points, points[nxt]], axis=1), np.repeat(self.mode, count)
+
+    def extend(self, points, counts, mode):
+        """
+        Adds many closed polygons at once
+        :param points: Array of shape (M, 2) with the corners of every polygon, one polygon after another
+        :param counts: Number of corners of each polygon (summing to M)
+        :param mode: The drawing mode, either a single value or one per polygon
+        :return: Slice of the new polygons' indices
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        span = self.vertices.extend(points)
+        return self.extend_columns(len(counts), offset=span.start + np.cumsum(counts) - counts, count=counts,
+                                   mode=mode)
+
+    def clear(self):
+        super().clear()
+        self.vertices.clear()
+
+    def copy(self):
+        other = super().copy()
+        other.vertices = self.vertices.copy()
+        return other
+
+    def take(self, indices):
+        indices = np.arange(self.size)[indices]
+        other = self.__class__(capacity=max(len(indices), 1))
+        for i in indices:
+            other.append(*self.polygon(i))
+        return other
+
+    def polygon(self, i):
+        """
+        :param i: Polygon index
+        :return: (vertices, mode) of the i-th polygon
+        """
+        offset, count = self._data['offset'][i], self._data['count'][i]
+        return self.vertices.points[offset:offset + count], self._data['mode'][i]
+
+
+def arc_points(centers, radii, start_angles, end_angles, n):
+    """
+    Discretizes many arcs at once
+    :param centers: Array of shape (N, 2) with the center of each arc
+    :param radii: Radius of each arc (scalar or shape (N,))
+    :param start_angles: Start angle of each arc (radians, CCW from +x axis)
+    :param end_angles: End angle of each arc (radians, CCW from +x axis)
+    :param n: The number of points per arc (ends inclusive)
+    :return: Array of shape (N, n, 2) with the points of every arc
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    radii, start_angles, end_angles = [np.broadcast_to(np.asarray(x, dtype=np.float64), (len(centers),))
+                                       for x in (radii, start_angles, end_angles)]
+    theta = start_angles[:, None] + (end_angles - start_angles)[:, None]*np.linspace(0., 1., n)
+    return centers[:, None, :] + radii[:, None, None]*np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+
+
+def arc_segment_counts(radii, sweeps, tolerance):
+    """
+    Finds how many chords each arc needs so that no chord strays further than tolerance from its arc. A chord spanning
+    the angle step deviates from the arc by its sagitta r*(1 - cos(step/2)), so step <= 2*acos(1 - tolerance/r). Every
+    chord spans at most 120 degrees, so full circles get at least a triangle.
+    :param radii: Radius of each arc
+    :param sweeps: Angle swept by each arc (radians, sign ignored)
+    :param tolerance: Maximum chord deviation (mm)
+    :return: Integer array with the number of chords of each arc (at least 1)
+    """
+    radii = np.abs(np.asarray(radii, dtype=np.float64))
+    sweeps = np.abs(np.asarray(sweeps, dtype=np.float64))
+    with np.errstate(divide='ignore'):
+        step = 2*np.arccos(np.clip(1 - tolerance/radii, -1., 1.))
+    step = np.minimum(step, 2*np.pi/3)
+    return np.maximum(np.ceil(sweeps/step - 1e-9), 1).astype(np.int64)
+
+
+def adaptive_arc_points(centers, radii, start_angles, end_angles, tolerance):
+    """
+    Discretizes many arcs at once, each with as few points as the chord tolerance allows
+    :param centers: Array of shape (N, 2) with the center of each arc
+    :param radii: Radius of each arc (scalar or shape (N,))
+    :param start_angles: Start angle of each arc (radians, CCW from +x axis)
+    :param end_angles: End angle of each arc (radians, CCW from +x axis)
+    :param tolerance: Maximum chord deviation (mm)
+    :return: (points, counts), the (M, 2) points of all arcs one arc after another (ends inclusive), and the number of
+             points of each arc
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    radii, start_angles, end_angles = [np.broadcast_to(np.asarray(x, dtype=np.float64), (len(centers),))
+                                       for x in (radii, start_angles, end_angles)]
+    sweeps = end_angles - start_angles
+    counts = arc_segment_counts(radii, sweeps, tolerance) + 1
+    arc = np.repeat(np.arange(len(centers)), counts)
+    step = np.arange(len(arc)) - np.repeat(np.cumsum(counts) - counts, counts)
+    theta = start_angles[arc] + sweeps[arc]*step/(counts[arc] - 1)
+    points = centers[arc] + radii[arc, None]*np.column_stack([np.cos(theta), np.sin(theta)])
+    return points, counts
+
+
+def ragged_polyline_segments(points, counts):
+    """
+    :param points: Array of shape (M, 2) holding several polylines one after another
+    :param counts: Number of points of each polyline
+    :return: Array of shape (M - len(counts), 2, 2) with the consecutive segments of every polyline
+    """
+    keep = np.ones(max(len(points) - 1, 0), dtype=bool)
+    keep[np.cumsum(counts)[:-1] - 1] = False  # no segment from the last point of one polyline to the next
+    return np.stack([points[:-1], points[1:]], axis=1)[keep]
+
+
+def polyline_segments(pts):
+    """
+    :param pts: Array of shape (..., n, 2) holding one or more polylines
+    :return: Array of shape (..., n - 1, 2, 2) with the consecutive segments of each polyline
+    """
+    return np.stack([pts[..., :-1, :], pts[..., 1:, :]], axis=-2)
+
+
+def kerf_slots(p1, p2, kerf, n=4):
+    """
+    Expands centerline segments into rounded kerf slots: two straight sides offset by the kerf radius, joined by a
+    half-circle at each end. All slots are computed in one broadcasted pass.
+    :param p1: Array of shape (N, 2) with the start of each slot (on the outer radius of the kerf)
+    :param p2: Array of shape (N, 2) with the end of each slot (on the outer radius of the kerf)
+    :param kerf: Kerf radius (mm), scalar or one value per slot
+    :param n: The number of points used to discretize each round end
+    :return: (segments, dxf_lines, arcs)
+             segments: (N*2n, 2, 2) discretized outline of each slot, in cutting order (top side, far end, bottom side,
+                       near end)
+             dxf_lines: (N*2, 2, 2) straight sides of each slot
+             arcs: (centers, radii, start_angles, end_angles) of the 2N round ends, far end first for each slot
+    """
+    p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 2)
+    p2 = np.asarray(p2, dtype=np.float64).reshape(-1, 2)
+    count = len(p1)
+    kerf = np.broadcast_to(np.asarray(kerf, dtype=np.float64), (count,))[:, None]
+
+    theta = np.arctan2(p2[:, 1] - p1[:, 1], p2[:, 0] - p1[:, 0])
+    along = np.column_stack([np.cos(theta), np.sin(theta)])*kerf
+    normal = np.column_stack([-along[:, 1], along[:, 0]])
+    p1mid = p1 + along
+    p2mid = p2 - along
+    top = np.stack([p1mid + normal, p2mid + normal], axis=1)
+    bot = np.stack([p2mid - normal, p1mid - normal], axis=1)
+
+    centers = np.stack([p2mid, p1mid], axis=1).reshape(-1, 2)
+    radii = np.repeat(kerf[:, 0], 2)
+    start_angles = np.column_stack([theta + np.pi/2, theta - np.pi/2]).ravel()
+    end_angles = np.column_stack([theta - np.pi/2, theta - 3*np.pi/2]).ravel()
+    caps = polyline_segments(arc_points(centers, radii, start_angles, end_angles, n)).reshape(count, 2, n - 1, 2, 2)
+
+    segments = np.concatenate([top[:, None], caps[:, 0], bot[:, None], caps[:, 1]], axis=1).reshape(-1, 2, 2)
+    dxf_lines = np.stack([top, bot], axis=1).reshape(-1, 2, 2)
+    return segments, dxf_lines, (centers, radii, start_angles, end_angles)
+
+
+def as_affine(transforms):
+    """
+    :param transforms: Either an array of shape (K, 2) of translations, or an array of shape (K, 2, 3) of affine
+                       transforms [[a, b, tx], [c, d, ty]]
+    :return: Array of shape (K, 2, 3) of affine transforms
+    """
+    transforms = np.asarray(transforms, dtype=np.float64)
+    if transforms.shape[-2:] == (2, 3):
+        return transforms.reshape(-1, 2, 3)
+    offsets = transforms.reshape(-1, 2)
+    affine = np.zeros((len(offsets), 2, 3))
+    affine[:, 0, 0] = affine[:, 1, 1] = 1.
+    affine[:, :, 2] = offsets
+    return affine
+
+
+def transform_points(points, transforms):
+    """
+    Applies every transform to every point with a single broadcasted matmul
+    :param points: Array of shape (..., 2)
+    :param transforms: Array of shape (K, 2, 3) of affine transforms
+    :return: Array of shape (K, ..., 2), the points mapped by each transform
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count = len(transforms)
+    moved = points.reshape(1, -1, 2) @ transforms[:, :, :2].transpose(0, 2, 1) + transforms[:, None, :, 2]
+    return moved.reshape((count,) + points.shape)
+
+
+def transform_arcs(centers, radii, start_angles, end_angles, transforms):
+    """
+    Applies every transform to every arc. Only similarity transforms (rotation, reflection, uniform scaling and
+    translation) map arcs onto arcs. Full circles keep their 0 to 2*pi angles.
+    :param centers: Array of shape (N, 2) with the center of each arc
+    :param radii: Radius of each arc, shape (N,)
+    :param start_angles: Start angle of each arc (radians, CCW from +x axis), shape (N,)
+    :param end_angles: End angle of each arc (radians, CCW from +x axis), shape (N,)
+    :param transforms: Array of shape (K, 2, 3) of affine transforms
+    :return: (centers, radii, start_angles, end_angles) with shapes (K, N, 2), (K, N), (K, N), (K, N)
+    """
+    linear = transforms[:, :, :2]
+    det = linear[:, 0, 0]*linear[:, 1, 1] - linear[:, 0, 1]*linear[:, 1, 0]
+    scale = np.sqrt(np.abs(det))
+    gram = linear.transpose(0, 2, 1) @ linear
+    similar = np.allclose(gram, scale[:, None, None]**2*np.eye(2), atol=1e-9*max(1., scale.max(initial=0.)**2))
+    if len(centers) and not similar:
+        raise ValueError("Arcs can only be transformed by rotations, reflections, uniform scaling and translations")
+    phi = np.arctan2(linear[:, 1, 0], linear[:, 0, 0])[:, None]
+    mirrored = (det < 0)[:, None]
+    # A reflection maps the angle theta to phi - theta, which also reverses the arc's direction
+    new_start = np.where(mirrored, phi - start_angles, phi + start_angles)
+    new_end = np.where(mirrored, phi - end_angles, phi + end_angles)
+    full = np.abs(end_angles - start_angles) == 2*np.pi
+    new_start = np.where(full, start_angles, new_start)
+    new_end = np.where(full, end_angles, new_end)
+    return transform_points(centers, transforms), scale[:, None]*radii, new_start, new_end
+
+
+def decompose_affine(transforms):
+    """
+    Splits affine transforms into translation, rotation and per-axis scale, applied as scale -> rotate -> translate
+    (the placement model of DXF INSERT entities). Negative scales express reflections.
+    :param transforms: Array of shape (K, 2, 3) of affine transforms
+    :return: (translations, rotations, x_scales, y_scales, valid), where rotations are in radians and valid is False for
+             transforms with shear, which cannot be written that way
+    """
+    a, b, c, d = transforms[:, 0, 0], transforms[:, 0, 1], transforms[:, 1, 0], transforms[:, 1, 1]
+    rotations = np.arctan2(c, a)
+    x_scales = np.hypot(a, c)
+    cos, sin = np.cos(rotations), np.sin(rotations)
+    y_scales = cos*d - sin*b
+    shear = cos*b + sin*d  # the off-diagonal entry of R(-rotation) @ linear
+    valid = (x_scales > 0) & np.isclose(shear, 0., atol=1e-9*np.maximum(x_scales, 1.))
+    return transforms[:, :, 2], rotations, x_scales, y_scales, valid
+
+
+def translation_matrix(dx, dy):
+    return np.array([[1., 0., dx], [0., 1., dy], [0., 0., 1.]])
+
+
+def rotation_matrix(angle, origin=(0, 0)):
+    """
+    :param angle: Rotation angle (radians, CCW)
+    :param origin: Point to rotate about
+    :return: 3x3 affine matrix
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    rotation = np.array([[c, -s, 0.], [s, c, 0.], [0., 0., 1.]])
+    return translation_matrix(*origin) @ rotation @ translation_matrix(-origin[0], -origin[1])
+
+
+def scale_matrix(sx, sy=None, origin=(0, 0)):
+    """
+    :param sx: Scale factor along x
+    :param sy: Scale factor along y (defaults to sx)
+    :param origin: Point that stays fixed
+    :return: 3x3 affine matrix
+    """
+    sy = sx if sy is None else sy
+    scale = np.diag([sx, sy, 1.])
+    return translation_matrix(*origin) @ scale @ translation_matrix(-origin[0], -origin[1])
+
+
+def mirror_matrix(axis='y', origin=(0, 0)):
+    """
+    :param axis: 'y' mirrors left-right across the vertical line through origin, 'x' mirrors top-bottom across the
+                 horizontal line through origin
+    :param origin: Point on the mirror line
+    :return: 3x3 affine matrix
+    """
+    if axis not in ('x', 'y'):
+        raise ValueError("axis must be 'x' or 'y', not {!r}".format(axis))
+    return scale_matrix(-1., 1., origin) if axis == 'y' else scale_matrix(1., -1., origin)
+
+
+def compose_affine(matrix, transforms):
+    """
+    :param matrix: 3x3 affine matrix applied after the transforms
+    :param transforms: Array of shape (K, 2, 3) of affine transforms
+    :return: Array of shape (K, 2, 3) of the composed transforms (matrix @ transform)
+    """
+    return matrix[:2, :2] @ transforms + np.concatenate([np.zeros((2, 2)), matrix[:2, 2:]], axis=1)
+
+
+class Transformable:
+    """
+    Mixin for patterns that carry a pending affine transform. The methods below only compose a 3x3 matrix onto
+    self.transform (each one is applied after the earlier ones, and they chain); the geometry itself is transformed in
+    one vectorized pass at export time. Classes using it start from self.transform = np.eye(3).
+    """
+
+    @property
+    def has_transform(self):
+        return not np.array_equal(self.transform, np.eye(3))
+
+    def apply_transform(self, matrix):
+        """
+        :param matrix: 3x3 affine matrix, or its top 2x3 part [[a, b, tx], [c, d, ty]]
+        :return: self
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.shape == (2, 3):
+            matrix = np.vstack([matrix, [0., 0., 1.]])
+        self.transform = matrix @ self.transform
+        return self
+
+    def translate(self, dx, dy):
+        return self.apply_transform(translation_matrix(dx, dy))
+
+    def rotate(self, angle, origin=(0, 0)):
+        """
+        :param angle: Rotation angle (radians, CCW)
+        :param origin: Point to rotate about
+        :return: self
+        """
+        return self.apply_transform(rotation_matrix(angle, origin))
+
+    def scale(self, sx, sy=None, origin=(0, 0)):
+        return self.apply_transform(scale_matrix(sx, sy, origin))
+
+    def mirror(self, axis='y', origin=(0, 0)):
+        return self.apply_transform(mirror_matrix(axis, origin))
+
+    def reset_transform(self):
+        self.transform = np.eye(3)
+        return self
@@ -0,0 +1,308 @@
+import re
+import numpy as np
+from pattern import Pattern
+
+# Parentheses, quoted strings (with backslash escapes) and bare atoms of a KiCad s-expression file
+TOKEN = re.compile(r'[()]|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+# Top-level items that describe the board setup rather than geometry
+HEADER_ITEMS = {'version', 'host', 'generator', 'generator_version', 'general', 'page', 'paper', 'title_block',
+                'layers', 'setup', 'net_class', 'property'}
+BARE = re.compile(r'[^\s()"\\]+')  # atoms that KiCad 5 writes without quotes
+PIN_HEADER = re.compile(r'PinHeader_(\d+)x(\d+)_P([\d.]+)mm_Vertical$')
+# One-line track segment as KiCad 5 and 6 write it: x1, y1, x2, y2, width, layer, net
+SEGMENT = re.compile(r'\(segment \(start ([^\s()]+) ([^\s()]+)\) \(end ([^\s()]+) ([^\s()]+)\) \(width ([^\s()]+)\) '
+                     r'\(layer "?([^\s()"]+)"?\) \(net (\d+)\)(?: \((?:tstamp|uuid) [^\s()]+\))?\)')
+
+
+def parse_sexpr(text):
+    """
+    Parses s-expressions into nested lists of atoms, e.g. '(at 1 2)' gives [['at', '1', '2']]. The whole text is split
+    with one regular expression and the lists are built in a single pass with a stack. Atoms are kept as written
+    (quoted strings keep their quotes, see unquote).
+    :param text: S-expression text
+    :return: List of the top-level expressions
+    """
+    stack = [[]]
+    append = stack[-1].append
+    for token in TOKEN.findall(text):
+        if token == '(':
+            item = []
+            append(item)
+            stack.append(item)
+            append = item.append
+        elif token == ')':
+            stack.pop()
+            append = stack[-1].append
+        else:
+            append(token)
+    return stack[0]
+
+
+def unquote(atom):
+    """
+    :return: The text of an atom, without the quotes and escapes of quoted strings
+    """
+    if atom.startswith('"'):
+        return atom[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return atom
+
+
+def symbol(atom):
+    """
+    :return: An atom in the form the add_* functions write it: quoted only if it needs quotes (KiCad 6 quotes every
+             name, KiCad 5 only the ones with spaces, parentheses or quotes)
+    """
+    text = unquote(atom)
+    return text if text and BARE.fullmatch(text) else atom
+
+
+def to_sexpr(item):
+    """
+    :return: The s-expression text of a parsed item, on one line
+    """
+    return '(' + ' '.join(to_sexpr(child) if isinstance(child, list) else child for child in item) + ')'
+
+
+def children(item):
+    """
+    :return: Dictionary of {head: sub-expression} for the sub-expressions of a parsed item (the first of each kind)
+    """
+    fields = {}
+    for child in item[1:]:
+        if isinstance(child, list) and child and child[0] not in fields:
+            fields[child[0]] = child
+    return fields
+
+
+def point(expression):
+    """
+    :return: (x, y) of an (at x y ...), (start x y), (xy x y), ... expression
+    """
+    return float(expression[1]), float(expression[2])
+
+
+def layer_of(fields):
+    """
+    :return: Layer of an item, from its (layer ...) or, for multi-layer items, the first of its (layers ...)
+    """
+    layer = fields.get('layer') or fields.get('layers')
+    return unquote(layer[1])
+
+
+def copper_layers(fields):
+    """
+    :return: Layers of an item that may span several (zones), with F&B.Cu and *.Cu expanded to F.Cu and B.Cu
+    """
+    layers = []
+    for layer in (fields.get('layer') or fields.get('layers'))[1:]:
+        layer = unquote(layer)
+        layers += ['F.Cu', 'B.Cu'] if layer in ('F&B.Cu', '*.Cu') else [layer]
+    return layers
+
+
+def width_of(fields, default=0.):
+    """
+    :return: Line width of an item, from (width w) (KiCad 5 and 6) or (stroke (width w)) (KiCad 7)
+    """
+    if 'width' in fields:
+        return float(fields['width'][1])
+    if 'stroke' in fields and 'width' in children(fields['stroke']):
+        return float(children(fields['stroke'])['width'][1])
+    return default
+
+
+def arc_from_points(start, mid, end):
+    """
+    Finds the circle through three points of an arc (KiCad 6 describes arcs by their start, middle and end points)
+    :return: (center, radius, start angle, end angle), angles in radians and counterclockwise from start to end if the
+             end angle is larger
+    """
+    (x1, y1), (x2, y2), (x3, y3) = start, mid, end
+    d = 2*(x1*(y2 - y3) + x2*(y3 - y1) + x3*(y1 - y2))
+    cx = ((x1**2 + y1**2)*(y2 - y3) + (x2**2 + y2**2)*(y3 - y1) + (x3**2 + y3**2)*(y1 - y2))/d
+    cy = ((x1**2 + y1**2)*(x3 - x2) + (x2**2 + y2**2)*(x1 - x3) + (x3**2 + y3**2)*(x2 - x1))/d
+    a1, a2, a3 = [np.arctan2(y - cy, x - cx) for x, y in (start, mid, end)]
+    sweep = (a3 - a1)%(2*np.pi)
+    if (a2 - a1)%(2*np.pi) > sweep:  # the middle point is not on the counterclockwise path, so the arc turns clockwise
+        sweep -= 2*np.pi
+    return (cx, cy), float(np.hypot(x1 - cx, y1 - cy)), float(a1), float(a1 + sweep)
+
+
+def graphic_arc(fields):
+    """
+    :return: (center, radius, start angle, end angle) of a gr_arc, written either as (start center) (end start point)
+             (angle degrees) (KiCad 5) or as (start) (mid) (end) points (KiCad 6)
+    """
+    if 'mid' in fields:
+        return arc_from_points(point(fields['start']), point(fields['mid']), point(fields['end']))
+    (cx, cy), (x, y) = point(fields['start']), point(fields['end'])
+    start_angle = float(np.arctan2(y - cy, x - cx))
+    return (cx, cy), float(np.hypot(x - cx, y - cy)), start_angle, start_angle + np.deg2rad(float(fields['angle'][1]))
+
+
+def pad_net(fields):
+    """
+    :return: Net of a pad as the add_* functions take it ("1 main"), or "" if the pad has none
+    """
+    net = fields.get('net')
+    return ' '.join([net[1]] + [symbol(name) for name in net[2:3]]) if net else ""
+
+
+def join_segments(segments, tolerance=1e-9):
+    """
+    Joins segments that continue the previous one (start at its end, with the same key) into polylines
+    :param segments: List of (start, end, key)
+    :param tolerance: Distance (mm) below which points are treated as the same point
+    :return: List of (points, key)
+    """
+    joined = []
+    for start, end, key in segments:
+        if joined and joined[-1][1] == key:
+            x, y = joined[-1][0][-1]
+            if abs(x - start[0]) <= tolerance and abs(y - start[1]) <= tolerance:
+                joined[-1][0].append(end)
+                continue
+        joined.append(([start, end], key))
+    return joined
+
+
+def read_kicad_pcb(infile, board, footprint_holes=True, tolerance=1e-9):
+    """
+    Reads the items of a .kicad_pcb file (KiCad 5 or 6) into a board:
+        segment, arc        -> traces (segments that continue each other are joined into one trace)
+        zone                -> polygons (the zone outline, not its fill)
+        via                 -> vias
+        gr_line             -> graphic lines (joined like segments)
+        gr_arc, gr_circle   -> graphic arcs
+        gr_poly, gr_text    -> graphic polygons, text
+        module, footprint   -> M2 drills and pin headers; other footprints are kept in board.extras, so generate_kicad
+                               writes them back
+    :param infile: File path
+    :param board: PCBPattern to add the items to
+    :param footprint_holes: If True, the drill holes and round copper pads of the footprints kept in extras are added
+                            to the board's DXF arcs (graphic_arcs_dxf), so generate_dxf cuts and etches them
+    :param tolerance: Distance (mm) below which a segment is treated as continuing the previous one (see join_segments)
+    :return: Dictionary of {kind of item: count} for the items that were not read
+    """
+    with open(infile, 'r', encoding='utf-8') as f:
+        text = f.read()
+    # tracks are most of a large board, so the usual one-line segments are read with a single regular expression and
+    # only the rest of the file is parsed
+    segments = [((float(x1), float(y1)), (float(x2), float(y2)), (float(width), int(net), layer))
+                for x1, y1, x2, y2, width, layer, net in SEGMENT.findall(text)]
+    items = parse_sexpr(SEGMENT.sub('', text))
+    if not items or items[0][0] != 'kicad_pcb':
+        raise ValueError("{} is not a KiCad board".format(infile))
+
+    skipped = {}
+    lines = []
+    for item in items[0][1:]:
+        if not isinstance(item, list):
+            continue
+        kind = item[0]
+        fields = children(item)
+        if kind == 'segment':
+            segments.append((point(fields['start']), point(fields['end']),
+                             (float(fields['width'][1]), int(fields['net'][1]), layer_of(fields))))
+        elif kind == 'gr_line':
+            lines.append((point(fields['start']), point(fields['end']), layer_of(fields)))
+        elif kind == 'arc':
+            center, radius, start_angle, end_angle = arc_from_points(point(fields['start']), point(fields['mid']),
+                                                                     point(fields['end']))
+            pts = Pattern.generate_discretized_arc(center, radius, start_angle, end_angle,
+                                                   tolerance=board.arc_tolerance)
+            board.traces += [([(float(x), float(y)) for x, y in pts], float(fields['width'][1]), int(fields['net'][1]),
+                              layer_of(fields), False, False)]
+        elif kind == 'via':
+            layers = [unquote(layer) for layer in fields['layers'][1:3]]
+            board.add_via(point(fields['at']), float(fields['size'][1]), float(fields['drill'][1]),
+                          net=fields['net'][1], layers=tuple(layers))
+        elif kind == 'zone':
+            outline = children(fields['polygon'])['pts']
+            pts = [point(xy) for xy in outline[1:] if xy[0] == 'xy']
+            min_thickness = float(fields['min_thickness'][1]) if 'min_thickness' in fields else 0.0254
+            net_name = symbol(fields['net_name'][1]) if 'net_name' in fields else '""'
+            for layer in copper_layers(fields):  # a KiCad 6 zone may cover several layers, PCBPattern keeps one each
+                board.polygons += [(pts, min_thickness, layer, int(fields['net'][1]), net_name, False, True)]
+        elif kind == 'gr_arc':
+            center, radius, start_angle, end_angle = graphic_arc(fields)
+            board.add_graphic_arc(center, radius, start_angle, end_angle, layer_of(fields))
+        elif kind == 'gr_circle':
+            (cx, cy), (x, y) = point(fields['center']), point(fields['end'])
+            board.add_graphic_arc((cx, cy), float(np.hypot(x - cx, y - cy)), 0, 2*np.pi, layer_of(fields))
+        elif kind == 'gr_poly':
+            pts = [point(xy) for xy in fields['pts'][1:] if xy[0] == 'xy']
+            board.add_graphic_polygon(pts, width_of(fields, 0.1), layer_of(fields))
+        elif kind == 'gr_text':
+            at = fields['at']
+            font = children(children(fields['effects'])['font'])
+            board.add_text(unquote(item[1]), point(at), float(at[3]) if len(at) > 3 else 0,
+                           float(font['size'][1]), float(font['thickness'][1]) if 'thickness' in font else 0.15,
+                           layer_of(fields))
+        elif kind in ('module', 'footprint'):
+            read_footprint(item, fields, board, footprint_holes)
+        elif kind not in HEADER_ITEMS and kind != 'net':
+            skipped[kind] = skipped.get(kind, 0) + 1
+    for pts, (width, net, layer) in join_segments(segments, tolerance):
+        board.traces += [(pts, width, net, layer, False, False)]
+    for pts, layer in join_segments(lines, tolerance):
+        board.add_graphic_line(pts, layer)
+    return skipped
+
+
+def read_footprint(item, fields, board, holes=True):
+    """
+    Adds a footprint to the board: the M2 mounting holes and pin headers made by PCBPattern become records again, and
+    any other footprint goes into board.extras as written
+    :param item: Parsed footprint
+    :param fields: children(item)
+    :param holes: If True, the drill holes and round copper pads of footprints kept in extras are added to the board's
+                  DXF arcs
+    """
+    name = unquote(item[1])
+    at = fields['at']
+    x, y = point(at)
+    angle = float(at[3]) if len(at) > 3 else 0.
+    pads = [(child, children(child)) for child in item[2:] if isinstance(child, list) and child[0] == 'pad']
+    header = PIN_HEADER.search(name)
+    if name.endswith('MountingHole_2.2mm_M2'):
+        board.add_M2_drill((x, y), plated=any(pad[2] == 'thru_hole' for pad, pad_fields in pads))
+    elif name.endswith('Pin_D1.0mm_L10.0mm') and len(pads) == 1:
+        reference = [child for child in item[2:] if isinstance(child, list) and child[:2] == ['fp_text', 'reference']]
+        board.add_pin_header((x, y), net_names=(pad_net(pads[0][1]),),
+                             references=(symbol(reference[0][2]),) if reference else ("REF**",),
+                             ref_loc=point(children(reference[0])['at']) if reference else (0, 2.25))
+    elif header and angle in (0, 90) and len(pads) == int(header.group(1))*int(header.group(2)):
+        nx, ny = int(header.group(1)), int(header.group(2))
+        if angle == 90:  # add_pin_header turns rows of pins into a vertical header rotated by 90 degrees
+            nx, ny = ny, nx
+        nets = {unquote(pad[1]): pad_net(pad_fields) for pad, pad_fields in pads}
+        net_names = [nets.get(str(n), "") for n in range(1, nx*ny + 1)]
+        board.add_pin_header((x, y), nx, ny, float(header.group(3)), net_names=net_names if any(net_names) else ())
+    else:
+        board.extras += '  ' + to_sexpr(item) + '\n'
+        if holes:
+            add_footprint_holes(board, x, y, angle, pads)
+
+
+def add_footprint_holes(board, x, y, angle, pads):
+    """
+    Adds the drill hole (Edge.Cuts) and, for round plated pads, the copper ring (F.Cu and B.Cu) of every through-hole
+    pad of a footprint to the board's DXF arcs
+    :param x: Footprint position
+    :param y: Footprint position
+    :param angle: Footprint rotation (degrees, counterclockwise as shown in KiCad)
+    :param pads: (parsed pad, children(pad)) of each pad
+    """
+    c, s = np.cos(np.deg2rad(angle)), np.sin(np.deg2rad(angle))
+    for pad, fields in pads:
+        drill = [value for value in fields.get('drill', [])[1:] if not isinstance(value, list) and value != 'oval']
+        if not drill:
+            continue
+        px, py = point(fields['at'])
+        center = (x + px*c + py*s, y - px*s + py*c)  # the y axis points down in KiCad, so the rotation is mirrored
+        board.graphic_arcs_dxf += [(center, float(drill[0])/2, 0, 2*np.pi, "Edge.Cuts", True, False)]
+        if pad[2] == 'thru_hole' and pad[3] == 'circle':
+            radius = float(fields['size'][1])/2
+            board.graphic_arcs_dxf += [(center, radius, 0, 2*np.pi, "F.Cu", False, True)]
+            board.graphic_arcs_dxf += [(center, radius, 0, 2*np.pi, "B.Cu", False, True)]
@@ -1,19 +1,61 @@
 from settings import *
+import settings
 from math import cos, sin, pi
+import functools
 import numpy as np
-import svgwrite
-import ezdxf
-import ezdxf.units
+from geometry import SegmentBuffer, ArcBuffer, PolygonBuffer, PointBuffer, arc_points, polyline_segments, kerf_slots, \
+    as_affine, transform_points, transform_arcs, decompose_affine, compose_affine, translation_matrix, Transformable, \
+    arc_segment_counts, adaptive_arc_points, ragged_polyline_segments
+from svg_writer import SVGStreamWriter
+from toolpath import chain_segments, is_closed, add_dxf_polyline, merge_overlapping_segments, unique_arcs, \
+    order_chains, order_dxf_entities
 
 
-class Pattern:
+def resolves_geometry(method):
+    """
+    Decorator for exporters: the method runs on a copy of the pattern with its pending transform applied and, unless
+    it is called with instancing=True (for exporters that can write cells natively), every cell instance expanded. The
+    pattern itself is left untouched.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        pattern = self.transformed() if self.has_transform else self
+        if pattern.instances and not kwargs.get('instancing', False):
+            pattern = pattern.expand()
+        return method(pattern, *args, **kwargs)
+    return wrapper
+
+
+def run_exporters(exporters, threads=True):
+    """
+    Calls several exporters, either one after the other or concurrently on a thread pool (most of their time goes
+    into formatting and writing files, and they only read the pattern they export)
+    :param exporters: Dictionary of {format: function taking no arguments}
+    :param threads: If True, the exporters run concurrently
+    :return: Dictionary of {format: value returned by its exporter}
+    """
+    if not threads or len(exporters) < 2:
+        return {fmt: exporter() for fmt, exporter in exporters.items()}
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(exporters)) as pool:
+        futures = {fmt: pool.submit(exporter) for fmt, exporter in exporters.items()}
+        return {fmt: future.result() for fmt, future in futures.items()}
+
+
+class Pattern(Transformable):
+    BUFFERS = {'lines': SegmentBuffer, 'lines_dxf': SegmentBuffer, 'circles_dxf': ArcBuffer}  # saved by save()
+    EXPORTERS = {'svg': 'write_svg', 'dxf': 'generate_dxf', 'png': 'generate_png', 'stl': 'generate_stl'}  # export()
+
     def __init__(self, setting=LaserCutter):
         self.setting = setting
-        self.lines = []
-        self.lines_dxf = []
-        self.circles_dxf = []
-        self.polygons = []
+        self.lines = SegmentBuffer()  # discretized segments, used for SVG
+        self.lines_dxf = SegmentBuffer()  # straight segments only, arcs are exported natively from circles_dxf
+        self.circles_dxf = ArcBuffer()
+        self.polygons = PolygonBuffer()
         self.text = []
+        self.instances = []  # (cell Pattern, (K, 2, 3) affine transforms), expanded on export
+        self.transform = np.eye(3)  # pending transform (see Transformable), applied on export
+        self.parameters = {}  # generator parameters, kept as metadata by save()
 
     def add_line(self, p1, p2, kerf=None, n=4, mode=LaserCutter.CUT, update_dxf=True):
         """
@@ -25,70 +67,316 @@ class Pattern:
         :param mode: The drawing mode
         :return: None
         """
-        color = self.setting.COLOR[mode]
-        linewidth = self.setting.LINEWIDTH[mode]
         if kerf is None:
-            self.lines.append((p1, p2, color, linewidth))
+            self.lines.append(p1, p2, mode)
             if update_dxf:
-                self.lines_dxf.append((p1, p2, color, linewidth))
+                self.lines_dxf.append(p1, p2, mode)
         else:
-            theta = np.arctan2(p2[1] - p1[1], p2[0] - p1[0])
-            R = np.array([[np.cos(theta), -np.sin(theta)],
-                          [np.sin(theta), np.cos(theta)]])
-            p1top = p1 + R@[kerf, kerf]
-            p2top = p2 + R@[-kerf, kerf]
-            p1bot = p1 + R@[kerf, -kerf]
-            p2bot = p2 + R@[-kerf, -kerf]
-            p1mid = p1 + R@[kerf, 0]
-            p2mid = p2 + R@[-kerf, 0]
-            self.lines.append((p1top, p2top, color, linewidth))
-            self.lines_dxf.append((p1top, p2top, color, linewidth))
-            self.add_arc(center=p2mid, radius=kerf, n=n, start_angle=theta + np.pi/2, end_angle=theta - np.pi/2,
-                         mode=mode)
-            self.lines.append((p2bot, p1bot, color, linewidth))
-            self.lines_dxf.append((p2bot, p1bot, color, linewidth))
-            self.add_arc(center=p1mid, radius=kerf, n=n, start_angle=theta - np.pi/2, end_angle=theta - 3*np.pi/2,
-                         mode=mode)
+            self._add_kerf_slots([p1], [p2], kerf, n, np.asarray([mode]))
 
     def add_lines(self, points, kerf=None, n=4, mode=LaserCutter.CUT, update_dxf=True):
-        for i in range(len(points) - 1):
-            self.add_line(points[i], points[i + 1], kerf, n, mode, update_dxf)
+        points = np.asarray(points, dtype=np.float64)
+        self.add_segments(points[:-1], points[1:], kerf, n, mode, update_dxf)
+
+    def add_segments(self, p1, p2, kerf=None, n=4, mode=LaserCutter.CUT, update_dxf=True) -> None:
+        """
+        Add many lines to the pattern in one call
+        :param p1: Array of shape (N, 2) with the starting point of each line
+        :param p2: Array of shape (N, 2) with the ending point of each line
+        :param kerf: None for straight lines, or the kerf radius (mm) as a single number or one value per line. Lines
+                     whose kerf is NaN are added as straight lines.
+        :param n: The number of cuts to make in the kerf's round edges. Only used for kerfed lines.
+        :param mode: The drawing mode, as a single value or one value per line
+        :param update_dxf: Whether to also add the straight lines to the DXF output
+        :return: None
+        """
+        p1 = np.asarray(p1, dtype=np.float64).reshape(-1, 2)
+        p2 = np.asarray(p2, dtype=np.float64).reshape(-1, 2)
+        count = len(p1)
+        modes = np.broadcast_to(np.asarray(mode, dtype=np.uint8), (count,))
+        if kerf is None:
+            straight = np.ones(count, dtype=bool)
+        else:
+            kerfs = np.broadcast_to(np.asarray(kerf, dtype=np.float64), (count,))
+            straight = np.isnan(kerfs)
+
+        segments = np.stack([p1[straight], p2[straight]], axis=1)
+        self.lines.extend(segments, modes[straight])
+        if update_dxf:
+            self.lines_dxf.extend(segments, modes[straight])
+        if not straight.all():
+            kerfed = ~straight
+            self._add_kerf_slots(p1[kerfed], p2[kerfed], kerfs[kerfed], n, modes[kerfed])
+
+    def _add_kerf_slots(self, p1, p2, kerf, n, modes):
+        segments, dxf_lines, (centers, radii, start_angles, end_angles) = kerf_slots(p1, p2, kerf, n)
+        self.lines.extend(segments, np.repeat(modes, 2*n))
+        self.lines_dxf.extend(dxf_lines, np.repeat(modes, 2))
+        self.circles_dxf.extend(centers, radii, start_angles, end_angles, np.repeat(modes, 2))
 
-    def add_circle(self, center, radius, n=6, mode=LaserCutter.CUT) -> None:
+    def add_circle(self, center, radius, n=None, mode=LaserCutter.CUT) -> None:
         self.add_arc(center, radius, n, start_angle=0, end_angle=2*np.pi, mode=mode)
 
-    def add_arc(self, center, radius, n=6, start_angle=0, end_angle=2*np.pi, mode=LaserCutter.CUT) -> None:
-        theta_range = np.linspace(start_angle, end_angle, n)
-        for i in range(n - 1):
-            theta = theta_range[i]
-            theta_next = theta_range[i + 1]
-            p1 = (center[0] + radius*np.cos(theta), center[1] + radius*np.sin(theta))
-            p2 = (center[0] + radius*np.cos(theta_next), center[1] + radius*np.sin(theta_next))
-            self.add_line(p1, p2, mode=mode, update_dxf=False)
-        self.circles_dxf.append((center, radius, start_angle, end_angle))
+    def add_circles(self, centers, radii, n=None, mode=LaserCutter.CUT) -> None:
+        """
+        Add many circles to the pattern in one call
+        :param centers: Array of shape (N, 2) with the center of each circle
+        :param radii: Radius of the circles, as a single number or one value per circle
+        :param n: The number of points used to discretize each circle (for SVG). If None, it is chosen per circle so
+                  the chords stay within the setting's ARC_TOLERANCE.
+        :param mode: The drawing mode, as a single value or one value per circle
+        :return: None
+        """
+        self.add_arcs(centers, radii, start_angles=0, end_angles=2*np.pi, n=n, mode=mode)
+
+    def add_arc(self, center, radius, n=None, start_angle=0, end_angle=2*np.pi, mode=LaserCutter.CUT) -> None:
+        self.add_arcs([center], radius, start_angle, end_angle, n, mode)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, n=None, mode=LaserCutter.CUT) -> None:
+        """
+        Add many arcs to the pattern in one call
+        :param centers: Array of shape (N, 2) with the center of each arc
+        :param radii: Radius of the arcs, as a single number or one value per arc
+        :param start_angles: Start angle of the arcs (radians, CCW from +x axis), single number or one value per arc
+        :param end_angles: End angle of the arcs (radians, CCW from +x axis), single number or one value per arc
+        :param n: The number of points used to discretize each arc (for SVG). If None, it is chosen per arc so the
+                  chords stay within the setting's ARC_TOLERANCE.
+        :param mode: The drawing mode, as a single value or one value per arc
+        :return: None
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        count = len(centers)
+        radii, start_angles, end_angles = [np.broadcast_to(np.asarray(x, dtype=np.float64), (count,))
+                                           for x in (radii, start_angles, end_angles)]
+        modes = np.broadcast_to(np.asarray(mode, dtype=np.uint8), (count,))
+
+        if n is None:
+            points, counts = adaptive_arc_points(centers, radii, start_angles, end_angles, self.arc_tolerance)
+            self.lines.extend(ragged_polyline_segments(points, counts), np.repeat(modes, counts - 1))
+        else:
+            segments = polyline_segments(arc_points(centers, radii, start_angles, end_angles, n))
+            self.lines.extend(segments, np.repeat(modes, n - 1))
+        self.circles_dxf.extend(centers, radii, start_angles, end_angles, modes)
+
+    @property
+    def arc_tolerance(self):
+        """
+        :return: Maximum chord deviation (mm) used to discretize arcs, from the setting (or LaserCutter's default)
+        """
+        return getattr(self.setting, 'ARC_TOLERANCE', LaserCutter.ARC_TOLERANCE)
 
     def add_rectangle(self, topleft, bottomright, mode=LaserCutter.CUT) -> None:
         x1, y1 = topleft
         x2, y2 = bottomright
-        color = self.setting.COLOR[mode]
-        linewidth = self.setting.LINEWIDTH[mode]
-        self.polygons.append([[(x1, y1), (x1, y2), (x2, y2), (x2, y1)], color, linewidth])
+        self.polygons.append([(x1, y1), (x1, y2), (x2, y2), (x2, y1)], mode)
 
     def add_text(self, pos, text, font_size=10, align="MIDDLE_CENTER"):
         self.text.append((pos, text, font_size, align))
 
+    def add_instances(self, cell, transforms) -> None:
+        """
+        Places copies of a cell. The cell's geometry is stored once and the copies stay symbolic until export, so
+        building a lattice costs O(cell + instances) instead of recomputing the cell at every grid position.
+        :param cell: Pattern holding the geometry of one cell, in cell coordinates (it may have instances of its own)
+        :param transforms: Array of shape (K, 2) with the offset of each copy, or of shape (K, 2, 3) with the affine
+                           transform [[a, b, tx], [c, d, ty]] that maps cell coordinates onto each copy. Cells with
+                           arcs only allow rotations, reflections and uniform scaling.
+        :return: None
+        """
+        self.instances.append((cell, as_affine(transforms)))
+
+    def flatten(self) -> None:
+        """
+        Expands every cell instance into plain geometry, in place. Each buffer of each cell is transformed for all of
+        its copies at once. The pattern's own pending transform stays pending.
+        :return: None
+        """
+        instances, self.instances = self.instances, []
+        for cell, transforms in instances:
+            if cell.instances or cell.has_transform:
+                cell = cell.expand()
+            self._extend_transformed(cell, transforms)
+
+    def transformed(self):
+        """
+        :return: A copy of the pattern with its pending transform applied to the geometry in one vectorized pass, and
+                 composed into the transforms of its cell instances (which stay symbolic)
+        """
+        result = Pattern(setting=self.setting)
+        result._extend_transformed(self, self.transform[None, :2])
+        result.instances = [(cell, compose_affine(self.transform, transforms)) for cell, transforms in self.instances]
+        return result
+
+    def expand(self):
+        """
+        :return: A copy of the pattern with its pending transform applied and every cell instance expanded into plain
+                 geometry
+        """
+        flat = self.transformed()
+        flat.flatten()
+        return flat
+
+    def _extend_transformed(self, cell, transforms):
+        """
+        Appends a copy of the cell's own geometry (not its instances) for every transform
+        """
+        count = len(transforms)
+        self.lines.extend(transform_points(cell.lines.segments, transforms), np.tile(cell.lines.mode, count))
+        self.lines_dxf.extend(transform_points(cell.lines_dxf.segments, transforms),
+                              np.tile(cell.lines_dxf.mode, count))
+        arcs = cell.circles_dxf
+        centers, radii, start_angles, end_angles = transform_arcs(arcs.center, arcs.radius, arcs.start_angle,
+                                                                  arcs.end_angle, transforms)
+        self.circles_dxf.extend(centers, radii.ravel(), start_angles.ravel(), end_angles.ravel(),
+                                np.tile(arcs.mode, count))
+        polygons = cell.polygons
+        self.polygons.extend(transform_points(polygons.vertices.points, transforms), np.tile(polygons.count, count),
+                             np.tile(polygons.mode, count))
+        if cell.text:
+            positions = transform_points([pos for pos, _, _, _ in cell.text], transforms)
+            for k in range(count):
+                for pos, (_, text, font_size, align) in zip(positions[k].tolist(), cell.text):
+                    self.text.append((tuple(pos), text, font_size, align))
+
+    def remove_duplicates(self, tol=1e-6):
+        """
+        Removes duplicate lines, merges collinear lines that overlap, and removes duplicate arcs, so that the laser
+        never cuts the same line twice (e.g. along cell boundaries shared by neighboring cells)
+        :param tol: Distance (mm) below which points are treated as the same point
+        :return: Dictionary with the cut length (mm) removed from 'lines' (SVG), 'lines_dxf' and 'circles_dxf'
+        """
+        self.flatten()  # copies of a cell usually overlap along the shared cell boundaries
+        removed = {}
+        for name in ('lines', 'lines_dxf'):
+            buf = getattr(self, name)
+            segments, modes, removed[name] = merge_overlapping_segments(buf.segments, buf.mode, tol)
+            buf.clear()
+            buf.extend(segments, modes)
+        arcs = self.circles_dxf
+        keep = unique_arcs(arcs.center, arcs.radius, arcs.start_angle, arcs.end_angle, arcs.mode, tol)
+        dropped = np.ones(len(arcs), dtype=bool)
+        dropped[keep] = False
+        removed['circles_dxf'] = float((arcs.radius*np.abs(arcs.end_angle - arcs.start_angle))[dropped].sum())
+        self.circles_dxf = arcs.take(keep)
+        return removed
+
+    def save(self, outfile) -> None:
+        """
+        Saves the pattern to a compact binary .npz file (see storage.py): every geometry buffer as raw arrays, plus a
+        JSON header with the setting, text, cell instances and self.parameters. Cells used several times are stored
+        once. Pattern.load can memory-map the file.
+        :param outfile: File path (conventionally ending in .npz)
+        :return: None
+        """
+        from storage import save_arrays
+        arrays, patterns, index = {}, [], {}
+
+        def add(pattern):
+            if id(pattern) in index:
+                return index[id(pattern)]
+            i = index[id(pattern)] = len(patterns)
+            patterns.append(None)
+            prefix = '{}/'.format(i)
+            for name in self.BUFFERS:
+                for field, column in getattr(pattern, name).columns().items():
+                    arrays[prefix + name + '/' + field] = column
+            for field, column in pattern.polygons.columns().items():
+                arrays[prefix + 'polygons/' + field] = column
+            arrays[prefix + 'polygons/vertices'] = pattern.polygons.vertices.points
+            arrays[prefix + 'transform'] = pattern.transform
+            cells = []
+            for k, (cell, transforms) in enumerate(pattern.instances):
+                arrays[prefix + 'instances/{}'.format(k)] = transforms
+                cells.append(add(cell))
+            patterns[i] = {'setting': pattern.setting.__name__, 'text': pattern.text, 'cells': cells,
+                           'parameters': pattern.parameters}
+            return i
+
+        add(self)
+        save_arrays(outfile, arrays, {'class': 'Pattern', 'patterns': patterns})
+
+    @staticmethod
+    def load(infile, mmap=True):
+        """
+        Loads a pattern written by Pattern.save
+        :param infile: File path
+        :param mmap: If True, the geometry is memory-mapped (copy-on-write) instead of read, so loading takes about
+                     the same time whatever the size of the pattern
+        :return: Pattern
+        """
+        from storage import load_arrays
+        arrays, metadata = load_arrays(infile, mmap)
+        if metadata.get('class') != 'Pattern':
+            raise ValueError("{} does not hold a Pattern".format(infile))
+        patterns = [None]*len(metadata['patterns'])
+
+        def build(i):
+            if patterns[i] is not None:
+                return patterns[i]
+            info = metadata['patterns'][i]
+            prefix = '{}/'.format(i)
+            pattern = patterns[i] = Pattern(setting=getattr(settings, info['setting'], LaserCutter))
+            for name, buffer_class in Pattern.BUFFERS.items():
+                setattr(pattern, name, buffer_class.from_columns(**{field: arrays[prefix + name + '/' + field]
+                                                                    for field in buffer_class.FIELDS}))
+            pattern.polygons = PolygonBuffer.from_columns(**{field: arrays[prefix + 'polygons/' + field]
+                                                             for field in PolygonBuffer.FIELDS})
+            pattern.polygons.vertices = PointBuffer.from_columns(points=arrays[prefix + 'polygons/vertices'])
+            pattern.transform = np.array(arrays[prefix + 'transform'])
+            pattern.text = [(tuple(pos), text, font_size, align) for pos, text, font_size, align in info['text']]
+            pattern.parameters = info['parameters']
+            pattern.instances = [(build(j), arrays[prefix + 'instances/{}'.format(k)])
+                                 for k, j in enumerate(info['cells'])]
+            return pattern
+
+        return build(0)
+
+    @staticmethod
+    def read_dxf(infile, setting=LaserCutter, mode=LaserCutter.CUT, layer_modes=None, n=None):
+        """
+        Imports the LINE, ARC, CIRCLE, LWPOLYLINE and POLYLINE entities of an ASCII DXF file into a new pattern. The
+        file is streamed (see dxf_reader.py) instead of being loaded as an ezdxf document. Lines and straight polyline
+        segments become lines, arcs, circles and bulged polyline segments become arcs.
+        :param infile: File path
+        :param setting: Machine settings class of the new pattern
+        :param mode: Drawing mode of the imported entities
+        :param layer_modes: Dictionary of {DXF layer name: drawing mode} for layers that use a different mode
+        :param n: The number of points used to discretize each arc (for SVG). If None, it is chosen per arc so the
+                  chords stay within the setting's ARC_TOLERANCE.
+        :return: Pattern
+        """
+        from dxf_reader import read_dxf_geometry
+        geometry = read_dxf_geometry(infile)
+        layer_modes = layer_modes or {}
+        p = Pattern(setting=setting)
+        if geometry.segments:
+            segments = np.array(geometry.segments, dtype=np.float64).reshape(-1, 2, 2)
+            p.add_segments(segments[:, 0], segments[:, 1], mode=[layer_modes.get(layer, mode)
+                                                                 for layer in geometry.segment_layers])
+        if geometry.arcs:
+            arcs = np.array(geometry.arcs, dtype=np.float64)
+            p.add_arcs(arcs[:, :2], arcs[:, 2], arcs[:, 3], arcs[:, 4], n,
+                       mode=[layer_modes.get(layer, mode) for layer in geometry.arc_layers])
+        if geometry.skipped:
+            print("Skipped unsupported entities: {}".format(
+                ', '.join('{} {}'.format(count, kind) for kind, count in sorted(geometry.skipped.items()))))
+        return p
+
     ################## Helper Functions ######################
     @staticmethod
-    def generate_discretized_arc(center, radius, start_angle, end_angle, n=4):
+    def generate_discretized_arc(center, radius, start_angle, end_angle, n=None, tolerance=LaserCutter.ARC_TOLERANCE):
         """
         Generates the points (ends inclusive) for an discretized arc to a non-graphic layer.
         :param center: Center of arc
         :param radius: Radius of arc
         :param start_angle: Start angle of arc (radians, CCW from +x axis)
         :param end_angle: End angle of arc (radians, CCW from +y axis)
-        :param n: The number of straight line segments to cut the arc into. 1 implies a straight line.
+        :param n: The number of points (ends inclusive). If None, it is chosen so the chords stay within tolerance.
+        :param tolerance: Maximum chord deviation (mm), only used if n is None
         :return: None
         """
+        if n is None:
+            n = int(arc_segment_counts(radius, end_angle - start_angle, tolerance)) + 1
         theta_range = np.linspace(start_angle, end_angle, n)
         pts = [(center[0] + radius*np.cos(theta), center[1] + radius*np.sin(theta)) for theta in theta_range]
         return pts
@@ -203,24 +491,80 @@ class Pattern:
         return left_pts + endcap2 + list(reversed(right_pts)) + endcap1
 
     ################## Generate Files ########################
-    def generate_svg(self, outfile: str, save=True, offset_x=0, offset_y=0, default_linewidth=None):
+    def export(self, outfiles, offset_x=0, offset_y=0, options=None, threads=False, instancing=False):
+        """
+        Writes several formats at once. The pending transform and the offset are applied in a single pass (and cell
+        instances expanded once) into one prepared copy of the pattern, which every exporter then reads as is.
+        e.g. p.export({'svg': 'a.svg', 'dxf': 'a.dxf', 'stl': 'a.stl'}, offset_x=10, options={'stl': {'thickness': 2}})
+        :param outfiles: Dictionary of {format: file path}, with formats from Pattern.EXPORTERS
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param options: Dictionary of {format: extra keyword arguments for its exporter}
+        :param threads: If True, the exporters run concurrently on a thread pool
+        :param instancing: If True, the SVG and DXF files keep instanced cells as <defs> groups/blocks (see write_svg)
+        :return: Dictionary of {format: value returned by its exporter}
+        """
+        options = options or {}
+        matrix = translation_matrix(offset_x, offset_y) @ self.transform
+        prepared = Pattern(setting=self.setting)
+        prepared._extend_transformed(self, matrix[None, :2])
+        prepared.instances = [(cell, compose_affine(matrix, transforms)) for cell, transforms in self.instances]
+        flat = prepared
+        if prepared.instances and (not instancing or {'png', 'stl'} & set(outfiles)):
+            flat = prepared.expand()
+            if not instancing:
+                prepared = flat
+
+        exporters = {}
+        for fmt, outfile in outfiles.items():
+            kwargs = dict(options.get(fmt, {}))
+            if fmt in ('svg', 'dxf'):
+                kwargs['instancing'] = instancing
+            source = prepared if fmt in ('svg', 'dxf') else flat
+            exporters[fmt] = functools.partial(getattr(source, self.EXPORTERS[fmt]), outfile, **kwargs)
+        return run_exporters(exporters, threads)
+
+    @resolves_geometry
+    def generate_svg(self, outfile: str, save=True, offset_x=0, offset_y=0, default_linewidth=None, join_paths=False,
+                     path_tolerance=1e-6):
+        """
+        Generates an svgwrite Drawing of the pattern
+        :param outfile: File location to save the SVG to
+        :param save: True if you want to overwrite the SVG file
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param default_linewidth: If not None, overrides the line width of every mode
+        :param join_paths: If True, segments that share endpoints are joined into <polyline>/<polygon> elements
+        :param path_tolerance: Endpoints closer than this (mm) are joined when join_paths is True
+        :return: svgwrite Drawing
+        """
+        import svgwrite
         dwg = svgwrite.Drawing(outfile, profile='tiny')
-        for p1, p2, color, linewidth in self.lines:
-            p1mod = (p1[0] + offset_x, p1[1] + offset_y)
-            p2mod = (p2[0] + offset_x, p2[1] + offset_y)
-            if default_linewidth is not None:
-                linewidth = default_linewidth
-            dwg.add(dwg.line(p1mod, p2mod,
-                             stroke=svgwrite.rgb(color[0], color[1], color[2]),
-                             stroke_width=linewidth))
-        for pts, color, linewidth in self.polygons:
-            if default_linewidth is not None:
-                linewidth = default_linewidth
+        offset = np.array([offset_x, offset_y])
+        if join_paths:
+            for pts, mode in chain_segments(self.lines.segments + offset, self.lines.mode, path_tolerance):
+                color = self.setting.COLOR[mode]
+                linewidth = self.setting.LINEWIDTH[mode] if default_linewidth is None else default_linewidth
+                stroke = dict(stroke=svgwrite.rgb(color[0], color[1], color[2]), stroke_width=linewidth, fill='none')
+                if is_closed(pts):
+                    dwg.add(dwg.polygon(pts[:-1].tolist(), **stroke))
+                else:
+                    dwg.add(dwg.polyline(pts.tolist(), **stroke))
+        else:
+            for (p1, p2), mode in zip(self.lines.segments + offset, self.lines.mode):
+                color = self.setting.COLOR[mode]
+                linewidth = self.setting.LINEWIDTH[mode] if default_linewidth is None else default_linewidth
+                dwg.add(dwg.line(tuple(p1), tuple(p2),
+                                 stroke=svgwrite.rgb(color[0], color[1], color[2]),
+                                 stroke_width=linewidth))
+        for pts, mode in self.polygons:
+            color = self.setting.COLOR[mode]
+            linewidth = self.setting.LINEWIDTH[mode] if default_linewidth is None else default_linewidth
+            pts = pts + offset
             for i in range(len(pts)):
-                p1mod = (pts[i][0] + offset_x, pts[i][1] + offset_y)
+                p1mod = tuple(pts[i])
                 nxt = 0 if i == len(pts) - 1 else i + 1
-                p2mod = (pts[nxt][0] + offset_x, pts[nxt][1] + offset_y)
-                print(p1mod, p2mod)
+                p2mod = tuple(pts[nxt])
                 dwg.add(dwg.line(p1mod, p2mod,
                                  stroke=svgwrite.rgb(color[0], color[1], color[2]),
                                  stroke_width=linewidth))
@@ -228,7 +572,86 @@ class Pattern:
             dwg.save()
         return dwg
 
-    def generate_dxf(self, outfile: str, version='R2010', save=True, offset_x=0, offset_y=0):
+    @resolves_geometry
+    def write_svg(self, outfile, offset_x=0, offset_y=0, default_linewidth=None, chunk_size=8192, join_paths=False,
+                  path_tolerance=1e-6, optimize_order=False, start_point=(0, 0), instancing=False) -> None:
+        """
+        Streams the pattern to an SVG file without building an svgwrite Drawing. Produces the same geometry as
+        generate_svg, but memory use stays flat regardless of the number of segments.
+        :param outfile: File path or a writable text file object
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param default_linewidth: If not None, overrides the line width of every mode
+        :param chunk_size: Number of entities formatted per write
+        :param join_paths: If True, segments that share endpoints are joined into <polyline>/<polygon> elements
+        :param path_tolerance: Endpoints closer than this (mm) are joined when join_paths is True
+        :param optimize_order: If True, paths are reordered (and flipped) to cut down the laser's rapid travel
+        :param start_point: Where the laser head starts, in output coordinates (only used if optimize_order is True)
+        :param instancing: If True (keyword only), each instanced cell is written once as a <g> in <defs> and placed
+                           with <use> elements instead of being expanded. optimize_order then only applies to the
+                           geometry outside the cells.
+        :return: (travel_before, travel_after), the estimated rapid-travel distances (mm) if optimize_order is True,
+                 else None
+        """
+        offset = np.array([offset_x, offset_y])
+        with SVGStreamWriter(outfile, self.setting, default_linewidth, chunk_size) as svg:
+            travel = self._write_svg_geometry(svg, offset, join_paths, path_tolerance, optimize_order, start_point)
+            self._write_svg_instances(svg, offset, join_paths, path_tolerance, {})
+        return travel
+
+    def _write_svg_geometry(self, svg, offset, join_paths, path_tolerance, optimize_order=False, start_point=(0, 0)):
+        if optimize_order:
+            segments = self.lines.segments + offset
+            if join_paths:
+                chains = chain_segments(segments, self.lines.mode, path_tolerance)
+            else:
+                chains = list(zip(segments, self.lines.mode))
+            chains += [(np.vstack([pts, pts[:1]]) + offset, mode) for pts, mode in self.polygons]
+            chains, travel_before, travel_after = order_chains(chains, start_point)
+            svg.write_polylines(chains)
+            return travel_before, travel_after
+        if join_paths:
+            svg.write_polylines(chain_segments(self.lines.segments, self.lines.mode, path_tolerance), offset)
+        else:
+            svg.write_segments(self.lines.segments, self.lines.mode, offset)
+        svg.write_polygons(self.polygons, offset)
+
+    def _write_svg_instances(self, svg, offset, join_paths, path_tolerance, symbols):
+        """
+        Writes a <defs> group for every cell that does not have one yet (symbols maps id(cell) to its group id), then a
+        <use> for every instance
+        """
+        for cell, transforms in self.instances:
+            name = symbols.get(id(cell))
+            if name is None:
+                name = symbols[id(cell)] = 'cell{}'.format(len(symbols))
+                svg.begin_definition(name)
+                cell = cell.transformed() if cell.has_transform else cell
+                cell._write_svg_geometry(svg, np.zeros(2), join_paths, path_tolerance)
+                cell._write_svg_instances(svg, np.zeros(2), join_paths, path_tolerance, symbols)
+                svg.end_definition()
+            svg.write_uses(name, transforms, offset)
+
+    @resolves_geometry
+    def generate_dxf(self, outfile: str, version='R2010', save=True, offset_x=0, offset_y=0, join_paths=False,
+                     path_tolerance=1e-6, optimize_order=False, start_point=(0, 0), instancing=False):
+        """
+        Generates a DXF document of the pattern. Arcs and circles are written natively.
+        :param outfile: File location to save the DXF to
+        :param version: DXF file version. R2010 tends to work well with SolidWorks.
+        :param save: True if you want to overwrite the DXF file
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param join_paths: If True, lines that share endpoints are joined into LWPOLYLINE entities
+        :param path_tolerance: Endpoints closer than this (mm) are joined when join_paths is True
+        :param optimize_order: If True, entities are reordered (and flipped) to cut down the laser's rapid travel
+        :param start_point: Where the laser head starts, in output coordinates (only used if optimize_order is True)
+        :param instancing: If True (keyword only), each instanced cell is written once as a BLOCK and placed with INSERT
+                           entities instead of being expanded. Instances whose transform has shear are expanded.
+        :return: ezdxf document, or (document, travel_before, travel_after) if optimize_order is True, with the
+                 estimated rapid-travel distances (mm) before and after reordering
+        """
+        import ezdxf
         doc = ezdxf.new(version)
         msp = doc.modelspace()  # add new entities to the modelspace
         doc.layers.new(name='TOP', dxfattribs={'lineweight': 0.0254, 'color': 1})
@@ -238,24 +661,105 @@ class Pattern:
         #     line = msp.add_line(p1, p2, dxfattribs={'layer': 'TOP'})
         #     # line.rgb = color
 
-        for p1, p2, color, linewidth in self.lines_dxf:
-            p1mod = (p1[0] + offset_x, p1[1] + offset_y)
-            p2mod = (p2[0] + offset_x, p2[1] + offset_y)
-            line = msp.add_line(p1mod, p2mod, dxfattribs={'layer': 'TOP'})
-        for center, radius, start_angle, end_angle in self.circles_dxf:
-            centermod = (center[0] + offset_x, center[1] + offset_y)
-            if start_angle != 0 or end_angle != 2*np.pi:
-                circle = msp.add_arc(center=centermod, radius=radius,
-                                     start_angle=np.rad2deg(start_angle), end_angle=np.rad2deg(end_angle),
-                                     is_counter_clockwise=end_angle >= start_angle, dxfattribs={'layer': 'TOP'})
-            else:
-                circle = msp.add_circle(center=centermod, radius=radius, dxfattribs={'layer': 'TOP'})
-        for pts, color, linewidth in self.polygons:
-            poly = msp.add_polyline2d(pts, close=True, dxfattribs={'layer': 'TOP'})
+        offset = np.array([offset_x, offset_y])
+        self._add_dxf_entities(msp, offset, join_paths, path_tolerance)
+        self._add_dxf_inserts(doc, msp, offset, join_paths, path_tolerance, optimize_order, {})
+
+        if optimize_order:
+            travel_before, travel_after = order_dxf_entities(msp, start_point)
 
         if save:
             doc.saveas(outfile)
-        return doc
+        return (doc, travel_before, travel_after) if optimize_order else doc
 
-    def generate_stl(self, outfile: str, save=True):
-        pass
+    def _add_dxf_entities(self, layout, offset, join_paths, path_tolerance):
+        if join_paths:
+            for pts, mode in chain_segments(self.lines_dxf.segments + offset, tol=path_tolerance):
+                add_dxf_polyline(layout, pts, dxfattribs={'layer': 'TOP'})
+        else:
+            for p1mod, p2mod in self.lines_dxf.segments + offset:
+                line = layout.add_line(tuple(p1mod), tuple(p2mod), dxfattribs={'layer': 'TOP'})
+        arcs = self.circles_dxf
+        for centermod, radius, start_angle, end_angle in zip(arcs.center + offset, arcs.radius, arcs.start_angle,
+                                                             arcs.end_angle):
+            centermod = tuple(centermod)
+            if start_angle != 0 or end_angle != 2*np.pi:
+                circle = layout.add_arc(center=centermod, radius=radius,
+                                        start_angle=np.rad2deg(start_angle), end_angle=np.rad2deg(end_angle),
+                                        is_counter_clockwise=end_angle >= start_angle, dxfattribs={'layer': 'TOP'})
+            else:
+                circle = layout.add_circle(center=centermod, radius=radius, dxfattribs={'layer': 'TOP'})
+        for pts, mode in self.polygons:
+            poly = layout.add_polyline2d(pts + offset, close=True, dxfattribs={'layer': 'TOP'})
+
+    def _add_dxf_inserts(self, doc, layout, offset, join_paths, path_tolerance, optimize_order, blocks):
+        """
+        Writes a BLOCK for every cell that does not have one yet (blocks maps id(cell) to its block name), then an
+        INSERT for every instance
+        """
+        for cell, transforms in self.instances:
+            name = blocks.get(id(cell))
+            if name is None:
+                name = blocks[id(cell)] = 'CELL{}'.format(len(blocks))
+                block = doc.blocks.new(name=name)
+                cell = cell.transformed() if cell.has_transform else cell
+                cell._add_dxf_entities(block, np.zeros(2), join_paths, path_tolerance)
+                cell._add_dxf_inserts(doc, block, np.zeros(2), join_paths, path_tolerance, optimize_order, blocks)
+                if optimize_order:
+                    order_dxf_entities(block)
+            translations, rotations, x_scales, y_scales, valid = decompose_affine(transforms)
+            for insert, rotation, x_scale, y_scale in zip((translations + offset)[valid].tolist(),
+                                                          np.rad2deg(rotations[valid]).tolist(),
+                                                          x_scales[valid].tolist(), y_scales[valid].tolist()):
+                layout.add_blockref(name, insert, dxfattribs={'layer': 'TOP', 'xscale': x_scale, 'yscale': y_scale,
+                                                              'rotation': rotation})
+            if not valid.all():
+                sheared = Pattern(setting=self.setting)
+                sheared.add_instances(cell, transforms[~valid])
+                sheared.expand()._add_dxf_entities(layout, offset, join_paths, path_tolerance)
+
+    @resolves_geometry
+    def generate_png(self, outfile: str, dpi=96, default_linewidth=None, background=(255, 255, 255)):
+        """
+        Renders a PNG preview of the pattern, with each mode drawn in its color from the settings
+        :param outfile: File location to save the PNG to
+        :param dpi: Resolution (pixels per inch)
+        :param default_linewidth: If not None, overrides the line width (mm) of every mode. Lines are always drawn at
+                                  least one pixel wide.
+        :param background: Background color (RGB)
+        :return: (width, height) of the image in pixels
+        """
+        import preview
+        polygon_edges, polygon_modes = self.polygons.edges()
+        items = []
+        for mode in range(len(self.setting.COLOR)):
+            linewidth = self.setting.LINEWIDTH[mode] if default_linewidth is None else default_linewidth
+            segments = np.concatenate([self.lines.segments[self.lines.mode == mode],
+                                       polygon_edges[polygon_modes == mode]])
+            items.append(preview.Lines(segments, self.setting.COLOR[mode], linewidth))
+        return preview.render(items, outfile, dpi, background=background)
+
+    @resolves_geometry
+    def generate_stl(self, outfile: str, save=True, thickness=1., mode=LaserCutter.CUT, path_tolerance=1e-6):
+        """
+        Generates a 3D model of the sheet after cutting. The closed regions formed by the cut lines are triangulated and
+        extruded into a watertight solid, which is streamed to a binary STL file. Raises a ValueError instead of
+        writing an empty file if the cuts enclose no material.
+        :param outfile: File location to save the STL to
+        :param save: True if you want to overwrite the STL file
+        :param thickness: Sheet thickness (mm)
+        :param mode: Only lines and polygons drawn in this mode count as cuts
+        :param path_tolerance: Grid size (mm) that cut endpoints are snapped to before finding the regions
+        :return: Array of shapely Polygons, one per piece of material
+        """
+        from stl_writer import cut_regions, extrude, write_binary_stl
+        polygon_edges, polygon_modes = self.polygons.edges()
+        segments = np.concatenate([self.lines.segments[self.lines.mode == mode], polygon_edges[polygon_modes == mode]])
+        regions = cut_regions(segments, path_tolerance)
+        if save and len(regions) == 0:
+            raise ValueError("The cut lines do not enclose any material (e.g. the sheet has no closed outline), so "
+                             "there is no solid to write to {}".format(outfile))
+        if save:
+            count, chunks = extrude(regions, thickness)
+            write_binary_stl(outfile, count, chunks)
+        return regions
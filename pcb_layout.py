@@ -1,3 +1,7 @@
+import hashlib
+import re
+import string
+import uuid
 import numpy as np
 from utils import *
 
@@ -15,6 +19,129 @@ PIN_HEADER_DIAMETER = 1.7
 
 NET_NAME = "main"
 
+KICAD6_VERSION = 20211014  # board file version written by KiCad 6
+# (number, name, type, user name) of the layers of a two-layer KiCad 6 board
+KICAD6_LAYERS = [(0, "F.Cu", "signal", None), (31, "B.Cu", "signal", None), (32, "B.Adhes", "user", "B.Adhesive"),
+                 (33, "F.Adhes", "user", "F.Adhesive"), (34, "B.Paste", "user", None), (35, "F.Paste", "user", None),
+                 (36, "B.SilkS", "user", "B.Silkscreen"), (37, "F.SilkS", "user", "F.Silkscreen"),
+                 (38, "B.Mask", "user", None), (39, "F.Mask", "user", None), (40, "Dwgs.User", "user", "User.Drawings"),
+                 (41, "Cmts.User", "user", "User.Comments"), (42, "Eco1.User", "user", "User.Eco1"),
+                 (43, "Eco2.User", "user", "User.Eco2"), (44, "Edge.Cuts", "user", None), (45, "Margin", "user", None),
+                 (46, "B.CrtYd", "user", "B.Courtyard"), (47, "F.CrtYd", "user", "F.Courtyard"),
+                 (48, "B.Fab", "user", None), (49, "F.Fab", "user", None)]
+KICAD_UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'dxf_stl_renderer/kicad_pcb')
+
+
+def indent(block, linestart='  '):
+    """
+    Indents every line of a multi-line KiCAD description
+    :param block: Description without a trailing newline
+    :param linestart: Line start
+    :return: The description with linestart before and a newline after every line
+    """
+    return linestart + block.replace('\n', '\n' + linestart) + '\n'
+
+
+class FootprintTemplate:
+    """
+    A footprint description in str.format syntax, parsed once into its literal text and its fields. The fields that
+    never change between placements (e.g. ${KISYS3DMOD} paths) are folded into the literal text, which is indented
+    once per linestart and kept, so placing the footprint only formats its variable fields (position, angle, nets,
+    reference) and joins them with the cached text.
+    render(linestart, ...) gives the same text as indent(template.format(..., **constants), linestart).
+    """
+
+    def __init__(self, template, **constants):
+        """
+        :param template: Footprint description, with {} or {name} fields
+        :param constants: Values of the fields that are the same for every placement
+        """
+        self.template = template
+        self.constants = constants
+        self.literals = []  # text between the fields, with the constants folded in
+        self.fields = []  # (argument index or name, conversion, format spec) of every variable field
+        literal = ""
+        auto_number = 0
+        for text, field, spec, conversion in string.Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if field == "":
+                field, auto_number = auto_number, auto_number + 1
+            elif field.isdigit():
+                field = int(field)
+            elif not field.isidentifier():
+                raise ValueError("Unsupported footprint field {{{}}}".format(field))
+            if field in constants:
+                literal += format(self._convert(constants[field], conversion), spec)
+                continue
+            self.literals.append(literal)
+            self.fields.append((field, conversion, spec))
+            literal = ""
+        self.literals.append(literal)
+        self.compiled = {}  # linestart: literals indented with it
+
+    @staticmethod
+    def _convert(value, conversion):
+        return repr(value) if conversion == 'r' else str(value) if conversion == 's' else ascii(value) \
+            if conversion == 'a' else value
+
+    def compile(self, linestart='  '):
+        """
+        :return: The literal text between the fields, indented with linestart (cached)
+        """
+        if linestart not in self.compiled:
+            literals = [literal.replace('\n', '\n' + linestart) for literal in self.literals]
+            literals[0] = linestart + literals[0]
+            literals[-1] += '\n'
+            self.compiled[linestart] = literals
+        return self.compiled[linestart]
+
+    def render(self, linestart='  ', *args, **fields):
+        """
+        :param linestart: Line start
+        :param args: Values of the {} fields, in order
+        :param fields: Values of the {name} fields. Values that span several lines are indented as well.
+        :return: KiCAD description
+        """
+        literals = self.compile(linestart)
+        parts = [None]*(2*len(literals) - 1)
+        parts[::2] = literals
+        values = []
+        for field, conversion, spec in self.fields:
+            value = format(self._convert(args[field] if type(field) == int else fields[field], conversion), spec)
+            values.append(value.replace('\n', '\n' + linestart) if '\n' in value else value)
+        parts[1::2] = values
+        return "".join(parts)
+
+
+FOOTPRINTS = {}  # name: FootprintTemplate, for the footprints placed by the add_* functions below
+
+
+def register_footprint(name, template, **constants):
+    """
+    Parses a footprint description once and keeps it under a name, so that it can be placed with add_footprint(name,
+    x=..., y=..., ...). The add_* functions below place the footprints registered this way.
+    :param name: Footprint name
+    :param template: Footprint description, with {} or {name} fields
+    :param constants: Values of the fields that are the same for every placement
+    :return: FootprintTemplate
+    """
+    FOOTPRINTS[name] = FootprintTemplate(template, **constants)
+    return FOOTPRINTS[name]
+
+
+def add_footprint(name, *args, linestart='  ', **fields):
+    """
+    Places a registered footprint
+    :param name: Footprint name (see register_footprint)
+    :param args: Values of the {} fields, in order
+    :param fields: Values of the {name} fields
+    :param linestart: Line start
+    :return: KiCAD description
+    """
+    return FOOTPRINTS[name].render(linestart, *args, **fields)
+
 
 def add_fill_zone_rectangle(topleft, bottomright, min_thickness=0.01, layer="F.Cu", net_number=1, net_name="main", linestart='  '):
     """
@@ -40,11 +167,7 @@ def add_fill_zone_rectangle(topleft, bottomright, min_thickness=0.01, layer="F.C
   )
 )""".format(net_number, net_name, layer, BOARD_EDGE_SPACING, LINESPACE/4, x2, y2, x1, y2, x1, y1, x2, y1)
     # print(zone, end='')
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-        # print(linestart + line)
-    return out
+    return indent(zone, linestart)
 
 
 def add_fill_zone_rounded_rectangle(topleft, bottomright, corner_radius, N=10, layer="F.Cu", linestart='  '):
@@ -100,25 +223,19 @@ def add_fill_zone_polygon(pts, min_thickness=0.0254, layer="F.Cu", net_number=1,
   )
 )""".format(net_number, net_name, layer, max(BOARD_EDGE_SPACING_EFF, min_thickness), LINESPACE/4, pts_str)
     # print(zone, end='')
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-        # print(linestart + line)
-    return out
+    return indent(zone, linestart)
 
 
 def add_boundary(pts, layer="Edge.Cuts", linestart='  '):
-    out = ""
+    out = []
     for i in range(len(pts) - 1):
         start = pts[i]
         end = pts[i + 1]
         zone = "(gr_line (start {} {}) (end {} {}) (layer {}) (width 0.05))".format(start[0], start[1],
                                                                                            end[0], end[1],
                                                                                     layer)
-        # print(line, end='')
-        # print(linestart + zone)
-        out += linestart + zone + '\n'
-    return out
+        out.append(linestart + zone + '\n')
+    return "".join(out)
 
 
 def add_text(txt, center_loc, angleCCW=0, scale=0.5, thickness=0.125, layer="F.SilkS", linestart='  '):
@@ -126,24 +243,19 @@ def add_text(txt, center_loc, angleCCW=0, scale=0.5, thickness=0.125, layer="F.S
 """(gr_text "{}" (at {} {} {}) (layer {})
   (effects (font (size {} {}) (thickness {})))
 )""".format(txt, center_loc[0], center_loc[1], angleCCW, layer, scale, scale, thickness)
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-        # print(linestart + line)
-    return out
+    return indent(zone, linestart)
 
 
 def add_trace(pts, width=LINESPACE, layer="F.Cu", net_number=1, linestart='  '):
-    out = ''
+    out = []
     for i in range(len(pts) - 1):
         start = pts[i]
         end = pts[i + 1]
         zone = "(segment (start {} {}) (end {} {}) (width {}) (layer {}) (net {}))".format(start[0], start[1],
                                                                                           end[0], end[1], width,
                                                                                           layer, net_number)
-        # print(linestart + zone)
-        out += linestart + zone + '\n'
-    return out
+        out.append(linestart + zone + '\n')
+    return "".join(out)
 
 
 def add_arc(center, radius, start_angle, end_angle, layer="Edge.Cuts", linestart='  '):
@@ -170,8 +282,8 @@ def add_via(pt, size=0.8, drill=0.4, layers=("F.Cu", "B.Cu"), net_number=1, line
                                                                                             net_number)
     return linestart + zone + '\n'
 
-def add_M2_drill_nonplated(pt, linestart='  '):
-    zone = \
+
+register_footprint('M2_drill_nonplated',
 """(module MountingHole:MountingHole_2.2mm_M2 (layer F.Cu) (tedit 56D1B4CB) (tstamp 61566CFB)
   (at {} {})
   (descr "Mounting Hole 2.2mm, no annular, M2")
@@ -180,14 +292,14 @@ def add_M2_drill_nonplated(pt, linestart='  '):
   (fp_circle (center 0 0) (end 2.2 0) (layer Cmts.User) (width 0.15))
   (fp_circle (center 0 0) (end 2.45 0) (layer F.CrtYd) (width 0.05))
   (pad 1 np_thru_hole circle (at 0 0) (size 2.2 2.2) (drill 2.2) (layers *.Cu *.Mask))
-)""".format(pt[0], pt[1])
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+)""")
 
-def add_M2_drill_plated(pt, linestart='  '):
-    zone = \
+
+def add_M2_drill_nonplated(pt, linestart='  '):
+    return add_footprint('M2_drill_nonplated', pt[0], pt[1], linestart=linestart)
+
+
+register_footprint('M2_drill_plated',
 """(module MountingHole:MountingHole_2.2mm_M2 (layer F.Cu) (tedit 56D1B4CB) (tstamp 61566CFB)
   (at {} {})
   (descr "Mounting Hole 2.2mm, no annular, M2")
@@ -195,18 +307,39 @@ def add_M2_drill_plated(pt, linestart='  '):
   (attr virtual)
   (fp_circle (center 0 0) (end 2.2 0) (layer Cmts.User) (width 0.15))
   (fp_circle (center 0 0) (end 2.45 0) (layer F.CrtYd) (width 0.05))
-  (pad 1 thru_hole circle (at 0 0) (size 3.8 3.8) (drill 2.2) (layers *.Cu *.Mask) (net 1 {}))
-)""".format(pt[0], pt[1], NET_NAME)
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+  (pad 1 thru_hole circle (at 0 0) (size 3.8 3.8) (drill 2.2) (layers *.Cu *.Mask) (net 1 {NET_NAME}))
+)""", NET_NAME=NET_NAME)
+
+
+def add_M2_drill_plated(pt, linestart='  '):
+    return add_footprint('M2_drill_plated', pt[0], pt[1], linestart=linestart)
+
+
 # """
 # fp_circle (center 0 0) (end 1.9 0) (layer Cmts.User) (width 0.15))
 #     (fp_circle (center 0 0) (end 2.15 0) (layer F.CrtYd) (width 0.05))
 #     (pad 1 thru_hole circle (at 0 0) (size 3.8 3.8) (drill 2.2) (layers *.Cu *.Mask))
 #     """
 
+
+register_footprint('pin_header_start',
+"""(module Connector_PinHeader_{:0>1.2f}mm:PinHeader_{}x{:0>2d}_P{:0>1.2f}mm_Vertical (layer F.Cu) (tedit 59FED5CC) (tstamp 61BABEFE)
+  (at {} {} {})
+  (descr "Through hole straight pin header, {}x{:0>2d}, {:0>1.2f}mm pitch, single row")
+  (tags "Through hole pin header THT {}x{:0>2d} {:0>1.2f}mm single row")
+""")
+register_footprint('pin_header_end',
+"""(model ${KISYS3DMOD}/Connector_PinHeader_{:0>1.2f}mm.3dshapes/PinHeader_{}x{:0>2d}_P{:0>1.2f}mm_Vertical.wrl
+    (at (xyz 0 0 0))
+    (scale (xyz 1 1 1))
+    (rotate (xyz 0 0 0))
+  )
+)""", KISYS3DMOD="{KISYS3DMOD}")
+PIN_HEADER_PAD = "  (pad {} thru_hole {} (at {} {} {}) (size 1.7 1.7) (drill 1) (layers *.Cu *.Mask))"
+PIN_HEADER_PAD_WITH_NET_NAME = "  (pad {} thru_hole {} (at {} {} {}) (size 1.7 1.7) (drill 1) (layers *.Cu *.Mask) " \
+                               "(net {}))"
+
+
 def add_pin_header(top_left_pt, nx, ny, spacing=2.54, net_names=(), linestart='  '):
     """
     Add a pin header to the layout
@@ -219,48 +352,23 @@ def add_pin_header(top_left_pt, nx, ny, spacing=2.54, net_names=(), linestart='
     """
     angle = 90 if (nx > ny) else 0
     nx, ny = min(nx, ny), max(nx, ny)
-    zone_start = \
-"""(module Connector_PinHeader_{:0>1.2f}mm:PinHeader_{}x{:0>2d}_P{:0>1.2f}mm_Vertical (layer F.Cu) (tedit 59FED5CC) (tstamp 61BABEFE)
-  (at {} {} {})
-  (descr "Through hole straight pin header, {}x{:0>2d}, {:0>1.2f}mm pitch, single row")
-  (tags "Through hole pin header THT {}x{:0>2d} {:0>1.2f}mm single row")
-""".format(spacing, nx, ny, spacing, top_left_pt[0], top_left_pt[1], angle, nx, ny, spacing, nx, ny, spacing)
-    zone_end = \
-"""(model ${KISYS3DMOD}/Connector_PinHeader_{:0>1.2f}mm.3dshapes/PinHeader_{}x{:0>2d}_P{:0>1.2f}mm_Vertical.wrl
-    (at (xyz 0 0 0))
-    (scale (xyz 1 1 1))
-    (rotate (xyz 0 0 0))
-  )
-)""".format(spacing, nx, ny, spacing, KISYS3DMOD="{KISYS3DMOD}")
-    def pad(n):
-        shape = "rect" if n == 1 else "oval"
-        return "  (pad {} thru_hole {} (at {} {} {}) (size 1.7 1.7) (drill 1) (layers *.Cu *.Mask))".format(n, shape,
-                                                                                                            spacing*((n-1)%nx),
-                                                                                                   spacing*((n-1)//nx),
-                                                                                                   angle)
-    def pad_with_net_name(n, name):
-        shape = "rect" if n == 1 else "oval"
-        return "  (pad {} thru_hole {} (at {} {} {}) (size 1.7 1.7) (drill 1) (layers *.Cu *.Mask) (net {}))".format(n, shape,
-                                                                                                            spacing*((n - 1)%nx),
-                                                                                                            spacing*((n - 1)//nx),
-                                                                                                            angle, name)
-    out = ""
-    for line in zone_start.split('\n'):
-        out += linestart + line + '\n'
+    out = [add_footprint('pin_header_start', spacing, nx, ny, spacing, top_left_pt[0], top_left_pt[1], angle, nx, ny,
+                         spacing, nx, ny, spacing, linestart=linestart)]
+    # one line per pad, so these are formatted directly rather than rendered as footprints
+    pad = linestart + PIN_HEADER_PAD + '\n'
+    pad_with_net_name = linestart + PIN_HEADER_PAD_WITH_NET_NAME + '\n'
     if len(net_names) == 0:
-        for n in reversed(range(1, nx*ny + 1)):
-            out += linestart + pad(n) + '\n'
+        out += [pad.format(n, "rect" if n == 1 else "oval", spacing*((n - 1)%nx), spacing*((n - 1)//nx), angle)
+                for n in reversed(range(1, nx*ny + 1))]
     else:
-        for n, name in zip(reversed(range(1, nx*ny + 1)), reversed(net_names)):
-            out += linestart + pad_with_net_name(n, name) + '\n'
-    for line in zone_end.split('\n'):
-        out += linestart + line + '\n'
-    return out
+        out += [pad_with_net_name.format(n, "rect" if n == 1 else "oval", spacing*((n - 1)%nx),
+                                         spacing*((n - 1)//nx), angle, name)
+                for n, name in zip(reversed(range(1, nx*ny + 1)), reversed(net_names))]
+    out.append(add_footprint('pin_header_end', spacing, nx, ny, spacing, linestart=linestart))
+    return "".join(out)
 
 
-def add_pin_header_single(center_pt, net_name="", reference="REF**", ref_loc=(0, 2.25), linestart = '  '):
-    net = "\n    (net {})".format(net_name) if net_name != "" else ""
-    zone = \
+register_footprint('pin_header_single',
 """(module Connector_Pin:Pin_D1.0mm_L10.0mm (layer F.Cu) (tedit 61D25885) (tstamp 61D25884)
   (at {x} {y})
   (descr "solder Pin_ diameter 1.0mm, hole diameter 1.0mm (press fit), length 10.0mm")
@@ -284,25 +392,16 @@ def add_pin_header_single(center_pt, net_name="", reference="REF**", ref_loc=(0,
     (scale (xyz 1 1 1))
     (rotate (xyz 0 0 0))
   )
-)""".format(x=center_pt[0], y=center_pt[1], net=net, reference=reference, ref_loc_x=ref_loc[0], ref_loc_y=ref_loc[1],
-            KISYS3DMOD="{KISYS3DMOD}")
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+)""", KISYS3DMOD="{KISYS3DMOD}")
 
 
-def add_STB12NM60N(center_pt, angle, net_drain, net_source, net_gate, reference, linestart='  '):
-    """
-    Adds a STB12NM60N high-voltage transistor to the board layout
-    :param center_pt: Center of transistor layout
-    :param angle: Angle (CCW from +x axis, degrees)
-    :param net_drain: Net description of the drain (pad 2). Usually "6 "Net-(Q1-Pad2)""
-    :param net_source: Net description of the source (pad 3). Usually "2 /GND"
-    :param net_gate: Net description of the gate (pad 1). Usually "5 "Net-(Q1-Pad1)""
-    :return: KiCAD description (string)
-    """
-    zone = \
+def add_pin_header_single(center_pt, net_name="", reference="REF**", ref_loc=(0, 2.25), linestart = '  '):
+    net = "\n    (net {})".format(net_name) if net_name != "" else ""
+    return add_footprint('pin_header_single', x=center_pt[0], y=center_pt[1], net=net, reference=reference,
+                         ref_loc_x=ref_loc[0], ref_loc_y=ref_loc[1], linestart=linestart)
+
+
+register_footprint('STB12NM60N',
 """(module Custom:TO-263-2-D2PAK (layer F.Cu) (tedit 61C8FCDD) (tstamp 61CA4E48)
   (at {x} {y} {angle})
   (descr "TO-263 / D2PAK / DDPAK SMD package, http://www.infineon.com/cms/en/product/packages/PG-TO263/PG-TO263-3-1/")
@@ -352,23 +451,24 @@ def add_STB12NM60N(center_pt, angle, net_drain, net_source, net_gate, reference,
     (scale (xyz 1 1 1))
     (rotate (xyz 0 0 0))
   )
-)""".format(x=center_pt[0], y=center_pt[1], angle=angle, net_drain=net_drain, net_source=net_source, net_gate=net_gate,
-            reference=reference, KISYS3DMOD="{KISYS3DMOD}")
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+)""", KISYS3DMOD="{KISYS3DMOD}")
 
 
-def add_resistor_1206(center_pt, angle, reference, net1, net2, value, linestart='  '):
+def add_STB12NM60N(center_pt, angle, net_drain, net_source, net_gate, reference, linestart='  '):
     """
-    Add resistor with 1206 layout (12mm x 6 mm)
-    :param center_pt: Center of resistor
-    :param angle: Angle of component (CCW from +x axis, degrees)
-    :param linestart: Formatting start of line
-    :return: KiCAD description
+    Adds a STB12NM60N high-voltage transistor to the board layout
+    :param center_pt: Center of transistor layout
+    :param angle: Angle (CCW from +x axis, degrees)
+    :param net_drain: Net description of the drain (pad 2). Usually "6 "Net-(Q1-Pad2)""
+    :param net_source: Net description of the source (pad 3). Usually "2 /GND"
+    :param net_gate: Net description of the gate (pad 1). Usually "5 "Net-(Q1-Pad1)""
+    :return: KiCAD description (string)
     """
-    zone = \
+    return add_footprint('STB12NM60N', x=center_pt[0], y=center_pt[1], angle=angle, net_drain=net_drain,
+                         net_source=net_source, net_gate=net_gate, reference=reference, linestart=linestart)
+
+
+register_footprint('resistor_1206',
 """(module Resistor_SMD:R_1206_3216Metric_Pad1.30x1.75mm_HandSolder (layer F.Cu) (tedit 5F68FEEE) (tstamp 61CA5312)
   (at {x} {y} {angle})
   (descr "Resistor SMD 1206 (3216 Metric), square (rectangular) end terminal, IPC_7351 nominal with elongated pad for handsoldering. (Body size source: IPC-SM-782 page 72, https://www.pcb-3d.com/wordpress/wp-content/uploads/ipc-sm-782a_amendment_1_and_2.pdf), generated with kicad-footprint-generator")
@@ -403,31 +503,22 @@ def add_resistor_1206(center_pt, angle, reference, net1, net2, value, linestart=
     (scale (xyz 1 1 1))
     (rotate (xyz 0 0 0))
   )
-)""".format(x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, net1=net1, net2=net2, value=value,
-            KISYS3DMOD="{KISYS3DMOD}")
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+)""", KISYS3DMOD="{KISYS3DMOD}")
 
 
-def add_A05P5(center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctrl, net_Vout_plus, net_Vout_minus,
-              value="A05P-5", linestart='  '):
+def add_resistor_1206(center_pt, angle, reference, net1, net2, value, linestart='  '):
     """
-    Adds the A05P-5 DC-DC converter
-    :param center_pt:
-    :param angle:
-    :param reference: Usually PSx (PS1)
-    :param net_Vin_plus: Net description of the Vin+ pin (pin 1). Usually 0-5V. Formatted as "4 /Vin_HV1"
-    :param net_Vin_minus: Net description of the Vin- pin (pin 2). Usually GND. Formatted as "2 /GND"
-    :param net_Vctrl: Net description of the Vctrl pin (pin 5). 0-Vin_plus. Formatted as "1 /CTRL_HV1"
-    :param net_Vout_plus: Net description of the Vout+ pin (pin 3). 0-500V. Formatted as "3 /HV1"
-    :param net_Vout_minus: Net description of the Vout- pin (pin 4). Usually GND. Formatted as "2 /GND"
-    :param value: Usually A05P-5
-    :param linestart:
+    Add resistor with 1206 layout (12mm x 6 mm)
+    :param center_pt: Center of resistor
+    :param angle: Angle of component (CCW from +x axis, degrees)
+    :param linestart: Formatting start of line
     :return: KiCAD description
     """
-    zone = \
+    return add_footprint('resistor_1206', x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, net1=net1,
+                         net2=net2, value=value, linestart=linestart)
+
+
+register_footprint('A05P5',
 """(module Custom:Converter_DCDC_XP_POWER_A05P-5_THT (layer F.Cu) (tedit 61C9B5D0) (tstamp 61CA4DF0)
  (at {x} {y} {angle})
  (descr "XP Power JTD Series DC-DC Converter")
@@ -473,34 +564,31 @@ def add_A05P5(center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctr
     (rotate (xyz 90 180 0))
   )
 )
-""".format(x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, value=value, net_Vin_plus=net_Vin_plus,
-           net_Vin_minus=net_Vin_minus, net_Vctrl=net_Vctrl, net_Vout_plus=net_Vout_plus, net_Vout_minus=net_Vout_minus,
-           KISYS3DMOD="{KISYS3DMOD}", KIPRJMOD="{KIPRJMOD}")
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+""", KISYS3DMOD="{KISYS3DMOD}", KIPRJMOD="{KIPRJMOD}")
 
 
-def add_teensy41(center_pt, angle, reference, net_names, value="Teensy4.1", linestart='  '):
+def add_A05P5(center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctrl, net_Vout_plus, net_Vout_minus,
+              value="A05P-5", linestart='  '):
     """
-    Adds a Teensy 4.1 to the layout
+    Adds the A05P-5 DC-DC converter
     :param center_pt:
-    :param angle: Angle (CCW from +x axis, degrees) (default = horizontal, USB to left)
-    :param reference:
-    :param value:
+    :param angle:
+    :param reference: Usually PSx (PS1)
+    :param net_Vin_plus: Net description of the Vin+ pin (pin 1). Usually 0-5V. Formatted as "4 /Vin_HV1"
+    :param net_Vin_minus: Net description of the Vin- pin (pin 2). Usually GND. Formatted as "2 /GND"
+    :param net_Vctrl: Net description of the Vctrl pin (pin 5). 0-Vin_plus. Formatted as "1 /CTRL_HV1"
+    :param net_Vout_plus: Net description of the Vout+ pin (pin 3). 0-500V. Formatted as "3 /HV1"
+    :param net_Vout_minus: Net description of the Vout- pin (pin 4). Usually GND. Formatted as "2 /GND"
+    :param value: Usually A05P-5
     :param linestart:
-    :return:
+    :return: KiCAD description
     """
-    nets = []
-    for i in range(1, 68):
-        net_name = "\n     (net {})".format(net_names[i-1])
-        nets.append(net_name)
-    angleleftturn = (angle - 90) % 360
-    anglerightturn = (angle + 90) % 360
-    angle180 = (angle + 180) % 360
+    return add_footprint('A05P5', x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, value=value,
+                         net_Vin_plus=net_Vin_plus, net_Vin_minus=net_Vin_minus, net_Vctrl=net_Vctrl,
+                         net_Vout_plus=net_Vout_plus, net_Vout_minus=net_Vout_minus, linestart=linestart)
 
-    zone = \
+
+register_footprint('teensy41',
 """(module Custom:Teensy41 (layer F.Cu) (tedit 5FD6DEAD) (tstamp 61CA5666)
    (at {x} {y} {angle})
    (path /61CA0929)
@@ -572,97 +660,101 @@ def add_teensy41(center_pt, angle, reference, net_names, value="Teensy4.1", line
    (fp_text user DVJ6A (at -2.54 -0.18 {anglerightturn}) (layer F.SilkS)
      (effects (font (size 0.7 0.7) (thickness 0.15)))
    )
-   (pad 66 thru_hole circle (at -28.48 -1.27 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net66})
-   (pad 67 thru_hole circle (at -28.48 1.27 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net67})
-   (pad 54 thru_hole circle (at 16.51 -5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net54})
-   (pad 53 thru_hole circle (at 16.51 -2.54 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net53})
-   (pad 52 thru_hole circle (at 16.51 0 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net52})
-   (pad 51 thru_hole circle (at 16.51 2.54 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net51})
-   (pad 50 thru_hole circle (at 16.51 5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net50})
-   (pad 62 thru_hole circle (at -16.24 -1.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net62})
-   (pad 63 thru_hole circle (at -14.24 -1.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net63})
-   (pad 64 thru_hole circle (at -14.24 -3.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net64})
-   (pad 61 thru_hole circle (at -16.24 -3.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net61})
-   (pad 65 thru_hole circle (at -14.24 -5.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net65})
-   (pad 60 thru_hole rect (at -16.24 -5.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) {net60})
-   (pad 17 thru_hole circle (at 11.43 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net17})
-   (pad 18 thru_hole circle (at 13.97 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net18})
-   (pad 19 thru_hole circle (at 16.51 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net19})
-   (pad 20 thru_hole circle (at 19.05 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net20})
-   (pad 16 thru_hole circle (at 8.89 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net16})
-   (pad 15 thru_hole circle (at 6.35 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net15})
-   (pad 14 thru_hole circle (at 3.81 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net14})
-   (pad 21 thru_hole circle (at 21.59 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net21})
-   (pad 22 thru_hole circle (at 24.13 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net22})
-   (pad 23 thru_hole circle (at 26.67 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net23})
-   (pad 24 thru_hole circle (at 29.21 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net24})
-   (pad 25 thru_hole circle (at 29.21 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net25})
-   (pad 26 thru_hole circle (at 26.67 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net26})
-   (pad 27 thru_hole circle (at 24.13 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net27})
-   (pad 28 thru_hole circle (at 21.59 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net28})
-   (pad 29 thru_hole circle (at 19.05 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net29})
-   (pad 30 thru_hole circle (at 16.51 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net30})
-   (pad 31 thru_hole circle (at 13.97 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net31})
-   (pad 32 thru_hole circle (at 11.43 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net32})
-   (pad 33 thru_hole circle (at 8.89 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net33})
-   (pad 34 thru_hole circle (at 6.35 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net34})
-   (pad 13 thru_hole circle (at 1.27 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net13})
-   (pad 12 thru_hole circle (at -1.27 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net12})
-   (pad 11 thru_hole circle (at -3.81 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net11})
-   (pad 10 thru_hole circle (at -6.35 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net10})
-   (pad 9 thru_hole circle (at -8.89 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net9})
-   (pad 8 thru_hole circle (at -11.43 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net8})
-   (pad 7 thru_hole circle (at -13.97 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net7})
-   (pad 6 thru_hole circle (at -16.51 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net6})
-   (pad 5 thru_hole circle (at -19.05 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net5})
-   (pad 4 thru_hole circle (at -21.59 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net4})
-   (pad 3 thru_hole circle (at -24.13 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net3})
-   (pad 2 thru_hole circle (at -26.67 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net2})
-   (pad 1 thru_hole rect (at -29.21 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net1})
-   (pad 35 thru_hole circle (at 3.81 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net35})
-   (pad 36 thru_hole circle (at 1.27 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net36})
-   (pad 37 thru_hole circle (at -1.27 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net37})
-   (pad 38 thru_hole circle (at -3.81 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net38})
-   (pad 39 thru_hole circle (at -6.35 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net39})
-   (pad 40 thru_hole circle (at -8.89 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net40})
-   (pad 41 thru_hole circle (at -11.43 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net41})
-   (pad 42 thru_hole circle (at -13.97 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net42})
-   (pad 43 thru_hole circle (at -16.51 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net43})
-   (pad 44 thru_hole circle (at -19.05 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net44})
-   (pad 45 thru_hole circle (at -21.59 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net45})
-   (pad 46 thru_hole circle (at -24.13 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net46})
-   (pad 47 thru_hole circle (at -26.67 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net47})
-   (pad 48 thru_hole circle (at -29.21 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net48})
-   (pad 55 thru_hole rect (at -22.9108 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net55})
-   (pad 56 thru_hole circle (at -20.3708 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net56})
-   (pad 57 thru_hole circle (at -17.8308 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net57})
-   (pad 58 thru_hole circle (at -15.2908 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net58})
-   (pad 59 thru_hole circle (at -12.7508 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net59})
-   (pad 49 thru_hole circle (at -26.67 -5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) {net49})
+   (pad 66 thru_hole circle (at -28.48 -1.27 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net66}))
+   (pad 67 thru_hole circle (at -28.48 1.27 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net67}))
+   (pad 54 thru_hole circle (at 16.51 -5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net54}))
+   (pad 53 thru_hole circle (at 16.51 -2.54 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net53}))
+   (pad 52 thru_hole circle (at 16.51 0 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net52}))
+   (pad 51 thru_hole circle (at 16.51 2.54 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net51}))
+   (pad 50 thru_hole circle (at 16.51 5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net50}))
+   (pad 62 thru_hole circle (at -16.24 -1.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net62}))
+   (pad 63 thru_hole circle (at -14.24 -1.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net63}))
+   (pad 64 thru_hole circle (at -14.24 -3.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net64}))
+   (pad 61 thru_hole circle (at -16.24 -3.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net61}))
+   (pad 65 thru_hole circle (at -14.24 -5.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net65}))
+   (pad 60 thru_hole rect (at -16.24 -5.1816 {angle}) (size 1.3 1.3) (drill 0.8) (layers *.Cu *.Mask) \n     (net {net60}))
+   (pad 17 thru_hole circle (at 11.43 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net17}))
+   (pad 18 thru_hole circle (at 13.97 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net18}))
+   (pad 19 thru_hole circle (at 16.51 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net19}))
+   (pad 20 thru_hole circle (at 19.05 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net20}))
+   (pad 16 thru_hole circle (at 8.89 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net16}))
+   (pad 15 thru_hole circle (at 6.35 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net15}))
+   (pad 14 thru_hole circle (at 3.81 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net14}))
+   (pad 21 thru_hole circle (at 21.59 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net21}))
+   (pad 22 thru_hole circle (at 24.13 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net22}))
+   (pad 23 thru_hole circle (at 26.67 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net23}))
+   (pad 24 thru_hole circle (at 29.21 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net24}))
+   (pad 25 thru_hole circle (at 29.21 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net25}))
+   (pad 26 thru_hole circle (at 26.67 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net26}))
+   (pad 27 thru_hole circle (at 24.13 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net27}))
+   (pad 28 thru_hole circle (at 21.59 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net28}))
+   (pad 29 thru_hole circle (at 19.05 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net29}))
+   (pad 30 thru_hole circle (at 16.51 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net30}))
+   (pad 31 thru_hole circle (at 13.97 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net31}))
+   (pad 32 thru_hole circle (at 11.43 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net32}))
+   (pad 33 thru_hole circle (at 8.89 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net33}))
+   (pad 34 thru_hole circle (at 6.35 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net34}))
+   (pad 13 thru_hole circle (at 1.27 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net13}))
+   (pad 12 thru_hole circle (at -1.27 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net12}))
+   (pad 11 thru_hole circle (at -3.81 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net11}))
+   (pad 10 thru_hole circle (at -6.35 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net10}))
+   (pad 9 thru_hole circle (at -8.89 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net9}))
+   (pad 8 thru_hole circle (at -11.43 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net8}))
+   (pad 7 thru_hole circle (at -13.97 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net7}))
+   (pad 6 thru_hole circle (at -16.51 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net6}))
+   (pad 5 thru_hole circle (at -19.05 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net5}))
+   (pad 4 thru_hole circle (at -21.59 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net4}))
+   (pad 3 thru_hole circle (at -24.13 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net3}))
+   (pad 2 thru_hole circle (at -26.67 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net2}))
+   (pad 1 thru_hole rect (at -29.21 7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net1}))
+   (pad 35 thru_hole circle (at 3.81 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net35}))
+   (pad 36 thru_hole circle (at 1.27 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net36}))
+   (pad 37 thru_hole circle (at -1.27 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net37}))
+   (pad 38 thru_hole circle (at -3.81 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net38}))
+   (pad 39 thru_hole circle (at -6.35 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net39}))
+   (pad 40 thru_hole circle (at -8.89 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net40}))
+   (pad 41 thru_hole circle (at -11.43 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net41}))
+   (pad 42 thru_hole circle (at -13.97 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net42}))
+   (pad 43 thru_hole circle (at -16.51 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net43}))
+   (pad 44 thru_hole circle (at -19.05 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net44}))
+   (pad 45 thru_hole circle (at -21.59 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net45}))
+   (pad 46 thru_hole circle (at -24.13 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net46}))
+   (pad 47 thru_hole circle (at -26.67 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net47}))
+   (pad 48 thru_hole circle (at -29.21 -7.62 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net48}))
+   (pad 55 thru_hole rect (at -22.9108 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net55}))
+   (pad 56 thru_hole circle (at -20.3708 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net56}))
+   (pad 57 thru_hole circle (at -17.8308 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net57}))
+   (pad 58 thru_hole circle (at -15.2908 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net58}))
+   (pad 59 thru_hole circle (at -12.7508 4.5692 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net59}))
+   (pad 49 thru_hole circle (at -26.67 -5.08 {angle}) (size 1.6 1.6) (drill 1.1) (layers *.Cu *.Mask) \n     (net {net49}))
    (model ${KICAD_USER_DIR}/teensy.pretty/Teensy_4.1_Assembly.STEP
      (offset (xyz 0 0 0.762))
      (scale (xyz 1 1 1))
      (rotate (xyz 0 0 0))
    )
-)""".format(x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, value=value,
-            KICAD_USER_DIR="{KICAD_USER_DIR}", angleleftturn=angleleftturn, anglerightturn=anglerightturn,
-            angle180=angle180,
-            net1=nets[0], net2=nets[1], net3=nets[2], net4=nets[3], net5=nets[4], net6=nets[5],
-            net7=nets[6], net8=nets[7], net9=nets[8], net10=nets[9], net11=nets[10], net12=nets[11],
-            net13=nets[12], net14=nets[13], net15=nets[14], net16=nets[15], net17=nets[16], net18=nets[17],
-            net19=nets[18], net20=nets[19], net21=nets[20], net22=nets[21], net23=nets[22], net24=nets[23],
-            net25=nets[24], net26=nets[25], net27=nets[26], net28=nets[27], net29=nets[28], net30=nets[29],
-            net31=nets[30], net32=nets[31], net33=nets[32], net34=nets[33], net35=nets[34], net36=nets[35],
-            net37=nets[36], net38=nets[37], net39=nets[38], net40=nets[39], net41=nets[40], net42=nets[41],
-            net43=nets[42], net44=nets[43], net45=nets[44], net46=nets[45], net47=nets[46], net48=nets[47],
-            net49=nets[48], net50=nets[49], net51=nets[50], net52=nets[51], net53=nets[52], net54=nets[53],
-            net55=nets[54], net56=nets[55], net57=nets[56], net58=nets[57], net59=nets[58], net60=nets[59],
-            net61=nets[60], net62=nets[61], net63=nets[62], net64=nets[63], net65=nets[64], net66=nets[65],
-            net67=nets[66])
-    out = ""
-    for line in zone.split('\n'):
-        out += linestart + line + '\n'
-    return out
+)""", KICAD_USER_DIR="{KICAD_USER_DIR}")
+
+
+def add_teensy41(center_pt, angle, reference, net_names, value="Teensy4.1", linestart='  '):
+    """
+    Adds a Teensy 4.1 to the layout
+    :param center_pt:
+    :param angle: Angle (CCW from +x axis, degrees) (default = horizontal, USB to left)
+    :param reference:
+    :param value:
+    :param linestart:
+    :return:
+    """
+    nets = {}
+    for i in range(1, 68):
+        nets["net{}".format(i)] = net_names[i-1]
+    angleleftturn = (angle - 90) % 360
+    anglerightturn = (angle + 90) % 360
+    angle180 = (angle + 180) % 360
+
+    return add_footprint('teensy41', x=center_pt[0], y=center_pt[1], angle=angle, reference=reference, value=value,
+                         angleleftturn=angleleftturn, anglerightturn=anglerightturn, angle180=angle180, **nets,
+                         linestart=linestart)
 
 
 def add_header(net_names=("main",), net_classes=(0,), default_clearance=BOARD_EDGE_SPACING_EFF,
@@ -673,18 +765,19 @@ def add_header(net_names=("main",), net_classes=(0,), default_clearance=BOARD_ED
     :param net_classes: A list of the net classes of each net. 0 = Default net, 1 = Power net.
     :return: KiCAD header
     """
-    net_desc = ""
-    default_desc = ""
-    power_desc = ""
+    net_desc = []
+    default_desc = []
+    power_desc = []
     for i, zipped in enumerate(zip(net_names, net_classes)):
         net_name, net_class = zipped
-        net_desc += "\n  (net " + str(i+1) + " " + net_name + ")"
+        net_desc.append("\n  (net " + str(i+1) + " " + net_name + ")")
         if net_class == 0:
-            default_desc += "\n    (add_net " + net_name + ")"
+            default_desc.append("\n    (add_net " + net_name + ")")
         elif net_class == 1:
-            power_desc += "\n    (add_net " + net_name + ")"
+            power_desc.append("\n    (add_net " + net_name + ")")
     if len(net_names) != 0:
-        net_desc += "\n\n"
+        net_desc.append("\n\n")
+    net_desc, default_desc, power_desc = "".join(net_desc), "".join(default_desc), "".join(power_desc)
 
 
     start = \
@@ -811,3 +904,211 @@ def add_footer():
     # print(zone)
     return zone
 
+
+def add_header_kicad6(net_names=("main",)):
+    """
+    Defines the header of a KiCad 6 board (file version KICAD6_VERSION, which KiCad 6 and later open without
+    converting). Net classes and design rules are not part of KiCad 6 board files (they live in the .kicad_pro project
+    file), so only the nets are written.
+    :param net_names: A list of the names of all nets, in the order they should appear in the file
+    :return: KiCAD header
+    """
+    net_desc = ["\n  (net {} {})".format(i + 1, quote(net_name)) for i, net_name in enumerate(net_names)]
+    layers = ["\n    ({} \"{}\" {}{})".format(number, name, kind, ' "{}"'.format(user_name) if user_name else "")
+              for number, name, kind, user_name in KICAD6_LAYERS]
+    return """(kicad_pcb (version {version}) (generator pcbnew)
+
+  (general
+    (thickness 1.6)
+  )
+
+  (paper "A4")
+  (layers{layers}
+  )
+
+  (setup
+    (pad_to_mask_clearance 0)
+    (aux_axis_origin 0 0)
+  )
+
+  (net 0 ""){net_desc}
+
+""".format(version=KICAD6_VERSION, layers="".join(layers), net_desc="".join(net_desc))
+
+
+class KiCadWriter:
+    """
+    Collects a KiCAD layout as it is generated, either streaming it to a buffered file or keeping the pieces in a list
+    that is joined once when the text is first needed, so writing a board is linear in its number of entities.
+    Usage:
+        with KiCadWriter('out.kicad_pcb') as kicad:
+            kicad.write(add_header())
+            kicad.write(add_via((0, 0)))
+            kicad.write(add_footer())
+    """
+
+    def __init__(self, outfile=None, buffering=1 << 20):
+        """
+        :param outfile: File path, a writable text file object, or None to keep the layout in memory (see getvalue)
+        :param buffering: Buffer size (bytes) of the file opened for a file path
+        """
+        self._owns_file = isinstance(outfile, str)
+        self.f = open(outfile, 'w', buffering=buffering) if self._owns_file else outfile
+        self.chunks = []  # pieces written so far, when the layout is kept in memory
+        self._value = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __str__(self):
+        return self.getvalue()
+
+    def write(self, text):
+        if self.f is not None:
+            self.f.write(text)
+        else:
+            self.chunks.append(text)
+            self._value = None
+
+    def write_block(self, block, linestart='  '):
+        """
+        Writes a multi-line description, indented with linestart (see indent)
+        """
+        self.write(indent(block, linestart))
+
+    def getvalue(self):
+        """
+        :return: The layout written so far, for a writer kept in memory. The pieces are joined on the first call only.
+        """
+        if self._value is None:
+            self._value = "".join(self.chunks)
+            self.chunks = [self._value]
+        return self._value
+
+    def close(self):
+        if self._owns_file and self.f is not None:
+            self.f.close()
+        self.f = None
+
+    def write_header(self, **kwargs):
+        """
+        Writes the board header, see add_header
+        """
+        self.write(add_header(**kwargs))
+
+
+def quote(name):
+    """
+    :return: name as a quoted KiCad string (unchanged if it is already quoted)
+    """
+    return name if name.startswith('"') else '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def format_number(value):
+    """
+    :return: value with at most 6 decimals and no trailing zeros, as KiCad writes coordinates
+    """
+    text = '{:.6f}'.format(value).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def _arc_start_mid_end(match):
+    """
+    KiCad 6 arcs are given by their start, middle and end points instead of a center, a start point and an angle.
+    Full circles, whose three points would not define the circle, become circles.
+    """
+    kind, cx, cy, x, y, angle = match.groups()
+    if abs(float(angle)) >= 360:
+        return '({} (center {} {}) (end {} {})'.format(kind.replace('_arc', '_circle'), cx, cy, x, y)
+    cx, cy, x, y, angle = float(cx), float(cy), float(x), float(y), np.deg2rad(float(angle))
+    points = [(x, y)]
+    for theta in (angle/2, angle):
+        points.append((cx + (x - cx)*np.cos(theta) - (y - cy)*np.sin(theta),
+                       cy + (x - cx)*np.sin(theta) + (y - cy)*np.cos(theta)))
+    return '({} {}'.format(kind, ' '.join('({} {} {})'.format(name, format_number(px), format_number(py))
+                                          for name, (px, py) in zip(('start', 'mid', 'end'), points)))
+
+
+SYMBOL = r'([^\s()"]+)'  # unquoted KiCad 5 string
+# (text the rule needs, pattern, replacement) rules turning KiCad 5 descriptions into KiCad 6 ones, applied in order.
+# A rule is skipped when its text is not in the description, which saves most regular expression passes.
+KICAD6_RULES = [('(module ', re.compile(r'\(module '), '(footprint '),
+                ('(', re.compile(r'\((footprint|layer|net_name|path|model|pad) ' + SYMBOL), r'(\1 "\2"'),
+                ('(net ', re.compile(r'\(net (\d+) ' + SYMBOL + r'\)'), r'(net \1 "\2")'),
+                ('(layers ', re.compile(r'\(layers ([^()"]*)\)'), lambda m: '(layers {})'.format(
+                    ' '.join('"' + layer + '"' for layer in m.group(1).split()))),
+                (' %R ', re.compile(r'\(fp_text (reference|value|user) %R '), r'(fp_text \1 "${REFERENCE}" '),
+                (' %V ', re.compile(r'\(fp_text (reference|value|user) %V '), r'(fp_text \1 "${VALUE}" '),
+                ('(fp_text ', re.compile(r'\(fp_text (reference|value|user) ' + SYMBOL), r'(fp_text \1 "\2"'),
+                ('(attr virtual)', re.compile(r'\(attr virtual\)'), '(attr exclude_from_pos_files exclude_from_bom)'),
+                ('${KISYS3DMOD}', re.compile(r'\$\{KISYS3DMOD\}'), '${KICAD6_3DMODEL_DIR}'),
+                ('(arc_segments ', re.compile(r'\(arc_segments \d+\) '), ''),
+                ('_arc ', re.compile(r'\((gr_arc|fp_arc) \(start (\S+) (\S+)\) \(end (\S+) (\S+)\) '
+                                     r'\(angle ([^\s()]+)\)'), _arc_start_mid_end)]
+# existing tstamps, single-line items without one, and the first line of texts
+TSTAMP = re.compile(r'\(tstamp [^\s()]*\)'
+                    r'|^(\s*\((?:segment|via|gr_line|gr_arc|gr_circle|gr_poly) .*)\)$'
+                    r'|^(\s*\(gr_text .*)$', re.MULTILINE)
+
+
+def content_uuid(name):
+    """
+    :return: uuid.uuid5(KICAD_UUID_NAMESPACE, name) as a string, without building UUID objects
+    """
+    h = hashlib.sha1(KICAD_UUID_NAMESPACE.bytes + name.encode('utf-8')).hexdigest()
+    return '{}-{}-5{}-{}{}-{}'.format(h[:8], h[8:12], h[13:16], '89ab'[int(h[16], 16) & 3], h[17:20], h[20:32])
+
+
+def convert_to_kicad6(text, occurrences=None):
+    """
+    Converts KiCAD descriptions made by the add_* functions (KiCad 5 syntax) into KiCad 6 syntax: modules become
+    footprints, names are quoted, arcs are given by three points, and every board item gets a (tstamp) UUID. The UUIDs
+    are derived from the text, so exporting the same board twice gives the same file, and changing one item only
+    changes that item's UUIDs.
+    :param text: KiCAD description of one or more items
+    :param occurrences: Dictionary counting the descriptions converted so far (filled in by this function), so that
+                        identical items placed more than once still get different UUIDs
+    :return: KiCAD 6 description
+    """
+    for trigger, pattern, replacement in KICAD6_RULES:
+        if trigger in text:
+            text = pattern.sub(replacement, text)
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    occurrence = 0
+    if occurrences is not None:
+        occurrence = occurrences.get(digest, 0)
+        occurrences[digest] = occurrence + 1
+    count = [0]
+
+    def tstamp(match):
+        count[0] += 1
+        stamp = '(tstamp ' + content_uuid('{}:{}:{}'.format(digest, occurrence, count[0])) + ')'
+        if match.group(1) is not None:
+            return match.group(1) + ' ' + stamp + ')'
+        if match.group(2) is not None:
+            return match.group(2) + ' ' + stamp
+        return stamp
+    return TSTAMP.sub(tstamp, text)
+
+
+class KiCad6Writer(KiCadWriter):
+    """
+    KiCadWriter for KiCad 6 boards: the KiCad 5 descriptions made by the add_* functions are converted with
+    convert_to_kicad6 as they are written
+    """
+
+    def __init__(self, outfile=None, buffering=1 << 20):
+        super().__init__(outfile, buffering)
+        self.occurrences = {}
+
+    def write(self, text):
+        super().write(convert_to_kicad6(text, self.occurrences))
+
+    def write_header(self, net_names=("main",), **kwargs):
+        """
+        Writes the board header, see add_header_kicad6 (the net class arguments of add_header are ignored)
+        """
+        super().write(add_header_kicad6(net_names))
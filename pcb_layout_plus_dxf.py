@@ -1,18 +1,32 @@
 from settings import *
+import settings
 from math import cos, sin, pi
+import functools
+import os
+import subprocess
+import sys
+import time
 import numpy as np
-import svgwrite
-import ezdxf
-import ezdxf.units
 from pattern import *
 import pcb_layout
-from shapely.geometry import Polygon
-from shapely.ops import unary_union
+from toolpath import chain_segments, add_dxf_polyline, merge_overlapping_segments, order_dxf_entities
+from geometry import polyline_segments, transform_points, transform_arcs, translation_matrix, Transformable
+from storage import save_arrays, load_arrays
+import preview
 
 
-class PCBPattern:
+class PCBPattern(Transformable):
+    # Index of the point (or list of points) inside each record, for every list of records that holds positions
+    POINT_FIELDS = {'traces': 0, 'polygons': 0, 'graphic_lines': 0, 'graphic_polygons': 0, 'm2': 0, 'pin_headers': 0,
+                    'vias': 0, 'text': 1, 'STB12NM60Ns': 0, 'resistors_1206': 0, 'A05P5s': 0, 'teensys': 0}
+    # Index of the rotation angle inside each record and whether it is in degrees (True) or radians (False)
+    ANGLE_FIELDS = {'text': (2, False), 'STB12NM60Ns': (1, True), 'resistors_1206': (1, True), 'A05P5s': (1, True),
+                    'teensys': (1, True)}
+    EXPORTERS = {'kicad_pcb': 'generate_kicad', 'dxf': 'generate_dxf', 'png': 'generate_png'}  # for export()
+
     def __init__(self, setting=LaserCutter):
         self.setting = setting
+        self.transform = np.eye(3)  # pending transform (see Transformable), applied on export
         # self.lines = []
         # self.lines_dxf = []
         # self.circles_dxf = []
@@ -33,6 +47,7 @@ class PCBPattern:
         self.resistors_1206 = []
         self.STB12NM60Ns = []
         self.extras = ""  # Extra items to add to end of layout file
+        self.parameters = {}  # generator parameters, kept as metadata by save()
         # self.kicad = ""  # text that gets written into the KiCAD file
         #
         # self.kicad += pcb_layout.add_header()
@@ -162,7 +177,7 @@ class PCBPattern:
         self.graphic_lines += [(pts, layer, cut, etch)]
         self.graphic_polygons += [(pts, pcb_layout.EDGECUT_WIDTH, layer, cut, etch)]
 
-    def add_graphic_arc(self, center, radius, start_angle, end_angle, layer="Edge.Cuts", cut=True, etch=True, N=5):
+    def add_graphic_arc(self, center, radius, start_angle, end_angle, layer="Edge.Cuts", cut=True, etch=True, N=None):
         """
         Adds a graphic arc (only good for graphic layers, like Edge.Cuts)
         :param center: Center of arc
@@ -170,14 +185,22 @@ class PCBPattern:
         :param start_angle: Start angle of arc (radians, CCW from +x axis)
         :param end_angle: End angle of arc (radians, CCW from +x axis)
         :param layer: Trace layer
+        :param N: Number of points of the arc's graphic polygon. If None, it is chosen so the chords stay within the
+                  setting's ARC_TOLERANCE.
         :return: None
         """
         self.graphic_arcs += [(center, radius, start_angle, end_angle, layer, cut, etch)]
 
-        pts = [(center[0] + radius*np.cos(angle), center[1] + radius*np.sin(angle))
-               for angle in np.linspace(start_angle, end_angle, N)]
+        pts = Pattern.generate_discretized_arc(center, radius, start_angle, end_angle, N, self.arc_tolerance)
         self.graphic_polygons += [(pts, pcb_layout.EDGECUT_WIDTH, layer, cut, etch)]
 
+    @property
+    def arc_tolerance(self):
+        """
+        :return: Maximum chord deviation (mm) used to discretize arcs, from the setting (or LaserCutter's default)
+        """
+        return getattr(self.setting, 'ARC_TOLERANCE', LaserCutter.ARC_TOLERANCE)
+
     def add_graphic_polygon(self, pts, width=0.1, layer="F.Mask", cut=False, etch=False):
         """
         Adds a graphic polygon (only good for graphic layers, like F.Mask)
@@ -311,9 +334,167 @@ class PCBPattern:
         """
         self.extras += desc
 
+    def remove_duplicate_graphic_lines(self, layer="Edge.Cuts", tol=1e-6):
+        """
+        Removes duplicate graphic lines on a layer and merges collinear ones that overlap, so the laser never cuts the
+        same edge twice. Only lines with the same cut/etch flags are merged. The remaining graphic lines on the layer
+        are stored as individual two-point lines (use join_paths in generate_dxf to chain them back together).
+        :param layer: Graphic layer to clean up
+        :param tol: Distance (mm) below which points are treated as the same point
+        :return: The cut length (mm) that was removed
+        """
+        on_layer = [(pts, cut, etch) for pts, line_layer, cut, etch in self.graphic_lines if line_layer == layer]
+        if not on_layer:
+            return 0.
+        flags = sorted(set((cut, etch) for pts, cut, etch in on_layer))
+        segments = np.concatenate([polyline_segments(np.asarray(pts, dtype=np.float64)) for pts, cut, etch in on_layer])
+        modes = np.concatenate([np.full(len(pts) - 1, flags.index((cut, etch))) for pts, cut, etch in on_layer])
+        segments, modes, removed_length = merge_overlapping_segments(segments, modes, tol)
+
+        self.graphic_lines = [line for line in self.graphic_lines if line[1] != layer]
+        for (p1, p2), mode in zip(segments.tolist(), modes.tolist()):
+            cut, etch = flags[mode]
+            self.graphic_lines += [([tuple(p1), tuple(p2)], layer, cut, etch)]
+        return removed_length
+
+    def transformed(self, offset_x=0, offset_y=0):
+        """
+        Applies the pending transform, followed by an offset, to every position on the board. All points are gathered
+        into one array and mapped with a single matmul. Components and text are moved and rotated with their anchor
+        point, but keep their size (and stay on their side of the board when mirrored); pin header arrays keep their
+        axis-aligned layout. Objects added with add_object are not transformed.
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :return: A transformed copy of the board (or the board itself if there is nothing to do)
+        """
+        matrix = translation_matrix(offset_x, offset_y) @ self.transform
+        if np.array_equal(matrix, np.eye(3)):
+            return self
+        transform = matrix[None, :2]
+        board = PCBPattern(setting=self.setting)
+        board.extras = self.extras
+
+        chunks = [np.asarray(record[index], dtype=np.float64).reshape(-1, 2)
+                  for name, index in self.POINT_FIELDS.items() for record in getattr(self, name)]
+        if chunks:
+            moved = transform_points(np.concatenate(chunks), transform)[0]
+            pieces = iter(np.split(moved, np.cumsum([len(chunk) for chunk in chunks])[:-1]))
+
+        linear = matrix[:2, :2]
+        rotation = np.arctan2(linear[1, 0], linear[0, 0])
+        mirrored = np.linalg.det(linear) < 0
+        for name, index in self.POINT_FIELDS.items():
+            angle_index, degrees = self.ANGLE_FIELDS.get(name, (None, False))
+            if rotation == 0 and not mirrored:
+                angle_index = None
+            records = []
+            for record in getattr(self, name):
+                record = list(record)
+                pts = next(pieces).tolist()
+                record[index] = tuple(pts[0]) if np.ndim(record[index]) == 1 else [tuple(pt) for pt in pts]
+                if angle_index is not None:
+                    offset = float(np.rad2deg(rotation) if degrees else rotation)
+                    record[angle_index] = offset - record[angle_index] if mirrored else offset + record[angle_index]
+                records.append(tuple(record))
+            setattr(board, name, records)
+
+        for name in ('graphic_arcs', 'graphic_arcs_dxf'):
+            arcs = getattr(self, name)
+            if not arcs:
+                continue
+            centers, radii, start_angles, end_angles = [np.array([arc[i] for arc in arcs], dtype=np.float64)
+                                                        for i in range(4)]
+            centers, radii, start_angles, end_angles = [x[0].tolist() for x in transform_arcs(
+                centers.reshape(-1, 2), radii, start_angles, end_angles, transform)]
+            setattr(board, name, [(tuple(center), radius, start_angle, end_angle) + tuple(arc[4:])
+                                  for center, radius, start_angle, end_angle, arc
+                                  in zip(centers, radii, start_angles, end_angles, arcs)])
+        return board
+
+    def save(self, outfile) -> None:
+        """
+        Saves the board to a compact binary .npz file (see storage.py). Every position and graphic arc is stored in
+        raw arrays; the remaining fields of each record (nets, layers, references, ...) go into a JSON header along
+        with the setting, extras and self.parameters. Tuples inside records come back as lists.
+        :param outfile: File path (conventionally ending in .npz)
+        :return: None
+        """
+        chunks = [np.asarray(record[index], dtype=np.float64).reshape(-1, 2)
+                  for name, index in self.POINT_FIELDS.items() for record in getattr(self, name)]
+        arrays = {'points': np.concatenate(chunks) if chunks else np.zeros((0, 2)),
+                  'point_counts': np.array([len(chunk) for chunk in chunks], dtype=np.int64)}
+        records = {}
+        for name, index in self.POINT_FIELDS.items():
+            # the point field is replaced by whether it held a single point (True) or a list of points (False)
+            records[name] = [record[:index] + (np.ndim(record[index]) == 1,) + record[index + 1:]
+                             for record in getattr(self, name)]
+        for name in ('graphic_arcs', 'graphic_arcs_dxf'):
+            arcs = getattr(self, name)
+            arrays[name + '/center'] = np.array([arc[0] for arc in arcs], dtype=np.float64).reshape(-1, 2)
+            arrays[name + '/arc'] = np.array([arc[1:4] for arc in arcs], dtype=np.float64).reshape(-1, 3)
+            records[name] = [arc[4:] for arc in arcs]
+        arrays['transform'] = self.transform
+        save_arrays(outfile, arrays, {'class': 'PCBPattern', 'setting': self.setting.__name__, 'records': records,
+                                      'extras': self.extras, 'parameters': self.parameters})
+
+    @staticmethod
+    def load(infile, mmap=True):
+        """
+        Loads a board written by PCBPattern.save
+        :param infile: File path
+        :param mmap: If True, the arrays are memory-mapped (copy-on-write) instead of read
+        :return: PCBPattern
+        """
+        arrays, metadata = load_arrays(infile, mmap)
+        if metadata.get('class') != 'PCBPattern':
+            raise ValueError("{} does not hold a PCBPattern".format(infile))
+        board = PCBPattern(setting=getattr(settings, metadata['setting'], LaserCutter))
+        board.extras = metadata['extras']
+        board.parameters = metadata['parameters']
+        board.transform = np.array(arrays['transform'])
+
+        counts = arrays['point_counts']
+        pieces = iter(np.split(np.asarray(arrays['points']), np.cumsum(counts)[:-1]) if len(counts) else [])
+        records = metadata['records']
+        for name, index in PCBPattern.POINT_FIELDS.items():
+            loaded = []
+            for record in records[name]:
+                pts = next(pieces).tolist()
+                point = tuple(pts[0]) if record[index] else [tuple(pt) for pt in pts]
+                loaded.append(tuple(record[:index]) + (point,) + tuple(record[index + 1:]))
+            setattr(board, name, loaded)
+        for name in ('graphic_arcs', 'graphic_arcs_dxf'):
+            setattr(board, name, [(tuple(center), radius, start_angle, end_angle) + tuple(rest)
+                                  for center, (radius, start_angle, end_angle), rest
+                                  in zip(arrays[name + '/center'].tolist(), arrays[name + '/arc'].tolist(),
+                                         records[name])])
+        return board
+
+    @staticmethod
+    def read_kicad(infile, setting=LaserCutter, footprint_holes=True):
+        """
+        Loads a .kicad_pcb file (KiCad 5 or 6, e.g. a board written by generate_kicad and then edited in KiCad) into a
+        new board, so its cut and etch DXFs can be regenerated with generate_dxf. The file is tokenized in one pass
+        (see kicad_reader.py). Tracks, zones, vias, graphic lines, arcs, polygons and text are read into the board's
+        lists; M2 drills and pin headers become records again, and other footprints are kept in extras.
+        :param infile: File path
+        :param setting: Machine settings class of the new board
+        :param footprint_holes: If True, the drill holes of the footprints kept in extras are cut by generate_dxf
+        :return: PCBPattern
+        """
+        import kicad_reader
+        board = PCBPattern(setting=setting)
+        skipped = kicad_reader.read_kicad_pcb(infile, board, footprint_holes)
+        if skipped:
+            print("Skipped unsupported items: {}".format(
+                ', '.join('{} {}'.format(count, kind) for kind, count in sorted(skipped.items()))))
+        return board
+
     ############################################################################################################
     # Helper functions
     ############################################################################################################
+    quadratic_bezier_curve = staticmethod(Pattern.quadratic_bezier_curve)  # used by the scripts_pcb wiring generators
+
     @staticmethod
     def merge_overlapping_polygons(polygons):
         """
@@ -323,6 +504,8 @@ class PCBPattern:
         :param polygons: A list of lists of points (List[List[Tuple]]), representing a list of polygons
         :return:
         """
+        from shapely.geometry import Polygon
+        from shapely.ops import unary_union
         polygons2 = [Polygon(pts) for pts in polygons]
         union = unary_union(polygons2)
         print("Interior", list(union.interior.coords))
@@ -334,11 +517,12 @@ class PCBPattern:
     ############################################################################################################
     def generate_kicad(self, outfile: str, save=True, offset_x=0, offset_y=0, net_names=("main",), net_classes=(0,),
                        default_clearance=pcb_layout.BOARD_EDGE_SPACING_EFF, default_linewidth=pcb_layout.LINESPACE,
-                       power_clearance=pcb_layout.BOARD_EDGE_SPACING_EFF, power_linewidth=0.5):
+                       power_clearance=pcb_layout.BOARD_EDGE_SPACING_EFF, power_linewidth=0.5, kicad_version=5):
         """
         Generates the KiCAD script for the PCBPattern object
         :param outfile: File location to save the KiCAD script to (should end in .kicad_pcb)
-        :param save: True if you want to overwrite the KiCAD file
+        :param save: True if you want to overwrite the KiCAD file. If False, nothing is written and the script is
+                     only returned.
         :param offset_x: Offset_x to all points
         :param offset_y: Offset_y to all points
         :param net_names: A list of the names of all nets, in the order they should appear in the file
@@ -347,63 +531,122 @@ class PCBPattern:
         :param default_linewidth:
         :param power_clearance:
         :param power_linewidth:
-        :return: KiCAD script
+        :param kicad_version: 5 for the KiCad 5 format (module/fixed tstamp), or 6 for the KiCad 6 format
+                              (footprint/UUID), which KiCad 6 and later open without converting. UUIDs are derived
+                              from the content of each item, so repeated exports are identical. KiCad 6 keeps net
+                              classes and clearances in the project file, so they are not written.
+        :return: None if save is True. Otherwise a pcb_layout.KiCadWriter holding the KiCAD script, which is joined
+                 into a string on the first str() or getvalue().
         """
-        out = pcb_layout.add_header(net_names=net_names, net_classes=net_classes, default_clearance=default_clearance,
-                                    default_linewidth=default_linewidth, power_clearance=power_clearance,
-                                    power_linewidth=power_linewidth)
+        board = self.transformed(offset_x, offset_y)
+        writer = {5: pcb_layout.KiCadWriter, 6: pcb_layout.KiCad6Writer}[kicad_version]
+        with writer(outfile if save else None) as kicad:
+            board._write_kicad(kicad, net_names, net_classes, default_clearance, default_linewidth, power_clearance,
+                               power_linewidth)
+        return None if save else kicad
+
+    def _write_kicad(self, kicad, net_names, net_classes, default_clearance, default_linewidth, power_clearance,
+                     power_linewidth):
+        """
+        Streams the KiCAD script of the board (already transformed) to a pcb_layout.KiCadWriter, one entity at a time
+        """
+        kicad.write_header(net_names=net_names, net_classes=net_classes, default_clearance=default_clearance,
+                           default_linewidth=default_linewidth, power_clearance=power_clearance,
+                           power_linewidth=power_linewidth)
 
         for pts, width, net_number, layer, cut, etch in self.traces:
-            out += pcb_layout.add_trace(Pattern.offset_xy(pts, offset_x, offset_y), width, net_number=net_number,
-                                        layer=layer)
+            kicad.write(pcb_layout.add_trace(pts, width, net_number=net_number, layer=layer))
         for pts, min_thickness, layer, net_number, net_name, cut, etch in self.polygons:
-            out += pcb_layout.add_fill_zone_polygon(Pattern.offset_xy(pts, offset_x, offset_y), min_thickness, layer,
-                                                    net_number, net_name)
+            kicad.write(pcb_layout.add_fill_zone_polygon(pts, min_thickness, layer, net_number, net_name))
         for pts, layer, cut, etch in self.graphic_lines:
-            out += pcb_layout.add_boundary(Pattern.offset_xy(pts, offset_x, offset_y), layer)
+            kicad.write(pcb_layout.add_boundary(pts, layer))
         for center, radius, start_angle, end_angle, layer, cut, etch in self.graphic_arcs:
-            out += pcb_layout.add_arc(Pattern.offset_xy(center, offset_x, offset_y), radius, start_angle, end_angle, layer)
-        for center, plated, cut, etch in self.m2:
+            kicad.write(pcb_layout.add_arc(center, radius, start_angle, end_angle, layer))
+        for center, plated in self.m2:
             if plated:
-                out += pcb_layout.add_M2_drill_plated(Pattern.offset_xy(center, offset_x, offset_y))
+                kicad.write(pcb_layout.add_M2_drill_plated(center))
             else:
-                out += pcb_layout.add_M2_drill_nonplated(Pattern.offset_xy(center, offset_x, offset_y))
-        for top_left_pt, nx, ny, spacing, net_names, references, ref_loc, cut, etch in self.pin_headers:
+                kicad.write(pcb_layout.add_M2_drill_nonplated(center))
+        for top_left_pt, nx, ny, spacing, net_names, references, ref_loc in self.pin_headers:
             if nx == ny == 1:
                 net_name = net_names if type(net_names) == str else net_names[0]
                 reference = references if type(references) == str else references[0]
-                out += pcb_layout.add_pin_header_single(Pattern.offset_xy(top_left_pt, offset_x, offset_y),
-                                                        net_name=net_name, reference=reference, ref_loc=ref_loc)
+                kicad.write(pcb_layout.add_pin_header_single(top_left_pt, net_name=net_name, reference=reference,
+                                                             ref_loc=ref_loc))
             else:
-                out += pcb_layout.add_pin_header(Pattern.offset_xy(top_left_pt, offset_x, offset_y), nx, ny, spacing,
-                                                 net_names)
+                kicad.write(pcb_layout.add_pin_header(top_left_pt, nx, ny, spacing, net_names))
         for pt, size, drill, layers, net_number in self.vias:
-            out += pcb_layout.add_via(Pattern.offset_xy(pt, offset_x, offset_y), size, drill, layers, net_number)
+            kicad.write(pcb_layout.add_via(pt, size, drill, layers, net_number))
         for center_pt, angle, net_drain, net_source, net_gate, reference in self.STB12NM60Ns:
-            out += pcb_layout.add_STB12NM60N(Pattern.offset_xy(center_pt, offset_x, offset_y), angle, net_drain,
-                                             net_source, net_gate, reference)
+            kicad.write(pcb_layout.add_STB12NM60N(center_pt, angle, net_drain, net_source, net_gate, reference))
         for center_pt, angle, reference, net1, net2, value in self.resistors_1206:
-            out += pcb_layout.add_resistor_1206(Pattern.offset_xy(center_pt, offset_x, offset_y), angle, reference, net1,
-                                                net2, value)
-        for center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctrl, net_Vout_plus, net_Vout_minus, value in self.A05P5s:
-            out += pcb_layout.add_A05P5(Pattern.offset_xy(center_pt, offset_x, offset_y), angle, reference, net_Vin_plus,
-                                        net_Vin_minus, net_Vctrl, net_Vout_plus, net_Vout_minus, value)
+            kicad.write(pcb_layout.add_resistor_1206(center_pt, angle, reference, net1, net2, value))
+        for center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctrl, net_Vout_plus, net_Vout_minus, value \
+                in self.A05P5s:
+            kicad.write(pcb_layout.add_A05P5(center_pt, angle, reference, net_Vin_plus, net_Vin_minus, net_Vctrl,
+                                             net_Vout_plus, net_Vout_minus, value))
         for center_pt, angle, reference, net_names, value in self.teensys:
-            out += pcb_layout.add_teensy41(Pattern.offset_xy(center_pt, offset_x, offset_y), angle, reference, net_names,
-                                           value)
-        out += self.extras
+            kicad.write(pcb_layout.add_teensy41(center_pt, angle, reference, net_names, value))
+        kicad.write(self.extras)
 
-        out += pcb_layout.add_footer()
+        kicad.write(pcb_layout.add_footer())
 
-        if save:
-            with open(outfile, 'w') as f:
-                f.write(out)
-        else:
-            print(out)
+    def export(self, outfiles, offset_x=0, offset_y=0, options=None, threads=False):
+        """
+        Writes several formats at once from a single transformed copy of the board, e.g.
+        board.export({'kicad_pcb': 'a.kicad_pcb', 'dxf': ('a_cut.dxf', 'a_etch.dxf'), 'png': 'a.png'}, offset_x=10)
+        :param outfiles: Dictionary of {format: file path}, with formats from PCBPattern.EXPORTERS. The DXF entry is
+                         a (cut file, etch file) pair.
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param options: Dictionary of {format: extra keyword arguments for its exporter}
+        :param threads: If True, the exporters run concurrently on a thread pool
+        :return: Dictionary of {format: value returned by its exporter}
+        """
+        options = options or {}
+        board = self.transformed(offset_x, offset_y)
+        exporters = {}
+        for fmt, outfile in outfiles.items():
+            paths = tuple(outfile) if fmt == 'dxf' else (outfile,)
+            exporters[fmt] = functools.partial(getattr(board, self.EXPORTERS[fmt]), *paths, **options.get(fmt, {}))
+        return run_exporters(exporters, threads)
+
+    def generate_png(self, outfile: str, layers=("B.Cu", "F.Cu", "Edge.Cuts"), dpi=96, background=(255, 255, 255)):
+        """
+        Renders a PNG preview of the board. Copper layers are drawn filled (traces, zones, arcs and via/pad rings);
+        graphic layers are drawn as lines. Graphic polygons are not drawn.
+        :param outfile: File location to save the PNG to
+        :param layers: Layers to draw, bottom-most first
+        :param dpi: Resolution (pixels per inch)
+        :param background: Background color (RGB)
+        :return: (width, height) of the image in pixels
+        """
+        board = self.transformed()
+        items = []
+        for layer in layers:
+            color = preview.LAYER_COLORS.get(layer, preview.DEFAULT_LAYER_COLOR)
+            arcs = [arc for arc in board.graphic_arcs + board.graphic_arcs_dxf if arc[4] == layer]
+            if layer.endswith(".Cu"):
+                polygons = [Pattern.offset_trace(pts, width) for pts, width, net_number, trace_layer, cut, etch
+                            in board.traces if trace_layer == layer]
+                polygons += [pts for pts, min_thickness, zone_layer, net_number, net_name, cut, etch in board.polygons
+                             if zone_layer == layer]
+                polygons += [Pattern.generate_discretized_arc(center, radius, start_angle, end_angle, n=32)
+                             for center, radius, start_angle, end_angle, arc_layer, cut, etch in arcs]
+                items.append(preview.Fill(polygons, color))
+            else:
+                segments = [polyline_segments(np.asarray(pts, dtype=np.float64)) for pts, line_layer, cut, etch
+                            in board.graphic_lines if line_layer == layer]
+                segments += [preview.arc_segments(center, radius, start_angle, end_angle)
+                             for center, radius, start_angle, end_angle, arc_layer, cut, etch in arcs]
+                segments = np.concatenate(segments) if segments else np.zeros((0, 2, 2))
+                items.append(preview.Lines(segments, color, pcb_layout.EDGECUT_WIDTH))
+        return preview.render(items, outfile, dpi, background=background)
 
     def generate_dxf(self, cut_outfile: str, etch_outfile: str, cut_layers=("Edge.Cuts",), etch_layers=("F.Cu",),
                      version='R2010', save_cut=True, save_etch=True, offset_x=0, offset_y=0, include_traces_etch=False,
-                     merge_overlapping_polygons=("F.Cu", "B.Cu")):
+                     merge_overlapping_polygons=("F.Cu", "B.Cu"), join_paths=False, path_tolerance=1e-6,
+                     optimize_order=False, start_point=(0, 0), merge_processes=1):
         """
         Generates two DXF files for the PCBPattern object
         The first DXF file is for the edge cuts
@@ -416,8 +659,18 @@ class PCBPattern:
         :param save: True if you want to overwrite the KiCAD file
         :param offset_x: Offset_x to all points
         :param offset_y: Offset_y to all points
-        :return: DXF file
-        """
+        :param join_paths: If True, lines that share endpoints are joined into LWPOLYLINE entities
+        :param path_tolerance: Endpoints closer than this (mm) are joined when join_paths is True
+        :param optimize_order: If True, entities are reordered (and flipped) to cut down the laser's rapid travel
+        :param start_point: Where the laser head starts, in output coordinates (only used if optimize_order is True)
+        :param merge_processes: Number of worker processes that union the copper of merge_overlapping_polygons layers
+        :return: (cut document, etch document), plus {"cut": (travel_before, travel_after), "etch": (...)} with the
+                 estimated rapid-travel distances (mm) before and after reordering if optimize_order is True
+        """
+        import ezdxf
+        from shapely.geometry import Polygon
+        from polygon_merge import merge_polygons
+        board = self.transformed(offset_x, offset_y)
         doc_cut = ezdxf.new(version)
         msp_cut = doc_cut.modelspace()  # add new entities to the modelspace
         doc_cut.layers.new(name='TOP', dxfattribs={'lineweight': 0.0254})
@@ -426,14 +679,19 @@ class PCBPattern:
         doc_etch.layers.new(name='TOP', dxfattribs={'lineweight': 0.0254})
 
         def add_line(msp, p1, p2):
-            return msp.add_line(Pattern.offset_xy(p1, offset_x, offset_y),
-                                Pattern.offset_xy(p2, offset_x, offset_y), dxfattribs={'layer': 'TOP'})
+            return msp.add_line(tuple(p1[:2]), tuple(p2[:2]), dxfattribs={'layer': 'TOP'})
+
+        # With join_paths, lines are collected here and chained into polylines once everything has been added
+        pending_lines = {id(msp_cut): [], id(msp_etch): []}
 
         def add_lines(msp, pts):
+            if join_paths:
+                pending_lines[id(msp)].append(polyline_segments(np.asarray(pts, dtype=np.float64)[:, :2]))
+                return []
             return [add_line(msp, pts[i], pts[i + 1]) for i in range(len(pts) - 1)]
 
         def add_arc(msp, center, radius, start_angle, end_angle):
-            centermod = Pattern.offset_xy(center, offset_x, offset_y)
+            centermod = tuple(center)
             if start_angle != 0 or end_angle != 2*np.pi:
                 circle = msp.add_arc(center=centermod, radius=radius,
                                start_angle=np.rad2deg(start_angle), end_angle=np.rad2deg(end_angle),
@@ -449,7 +707,7 @@ class PCBPattern:
         merged_polygons = {layer: [[]] for layer in merge_overlapping_polygons}
 
         # Process all the other data types
-        for pts, width, net_number, layer, cut, etch in self.traces:
+        for pts, width, net_number, layer, cut, etch in board.traces:
             if layer not in merge_overlapping_polygons:
                 if layer in cut_layers and cut:
                     add_lines(msp_cut, pts)
@@ -458,7 +716,7 @@ class PCBPattern:
             else:
                 merged_polygons[layer][0] += [Polygon(Pattern.offset_trace(pts, width))]
                 merged_polygons[layer][1:] = [cut, etch]
-        for pts, min_thickness, layer, net_number, net_name, cut, etch in self.polygons:
+        for pts, min_thickness, layer, net_number, net_name, cut, etch in board.polygons:
             if layer not in merge_overlapping_polygons:
                 if layer in cut_layers and cut:
                     add_polygon(msp_cut, pts + [pts[0]], False)
@@ -468,7 +726,7 @@ class PCBPattern:
             else:
                 merged_polygons[layer][0] += [Polygon(pts)]
                 merged_polygons[layer][1:] = [cut, etch]
-        for pts, layer, cut, etch in self.graphic_lines:
+        for pts, layer, cut, etch in board.graphic_lines:
             if layer not in merge_overlapping_polygons:
                 if layer in cut_layers and cut:
                     add_lines(msp_cut, pts)
@@ -477,63 +735,42 @@ class PCBPattern:
             else:
                 merged_polygons[layer][0] += [Polygon(pts)]
                 merged_polygons[layer][1:] = [cut, etch]
-        for center, radius, start_angle, end_angle, layer, cut, etch in self.graphic_arcs:
+        for center, radius, start_angle, end_angle, layer, cut, etch in board.graphic_arcs:
             if layer not in merge_overlapping_polygons:
                 if layer in cut_layers and cut:
                     add_arc(msp_cut, center, radius, start_angle, end_angle)
                 if layer in etch_layers and etch:
                     add_arc(msp_etch, center, radius, start_angle, end_angle)
             else:
-                num_points = int(abs((end_angle - start_angle)/np.deg2rad(10))) + 4
-                pts = [(center[0] + radius*np.cos(angle), center[1] + radius*np.sin(angle)) for angle in
-                       np.linspace(start_angle, end_angle, num_points)]
+                pts = Pattern.generate_discretized_arc(center, radius, start_angle, end_angle,
+                                                       tolerance=board.arc_tolerance)
                 merged_polygons[layer][0] += [Polygon(pts)]
                 merged_polygons[layer][1:] = [cut, etch]
-        for center, radius, start_angle, end_angle, layer, cut, etch in self.graphic_arcs_dxf:
+        for center, radius, start_angle, end_angle, layer, cut, etch in board.graphic_arcs_dxf:
             if layer not in merge_overlapping_polygons:
                 if layer in cut_layers and cut:
                     add_arc(msp_cut, center, radius, start_angle, end_angle)
                 if layer in etch_layers and etch:
                     add_arc(msp_etch, center, radius, start_angle, end_angle)
             else:
-                num_points = int(abs((end_angle - start_angle)/np.deg2rad(10))) + 4
-                pts = [(center[0] + radius*np.cos(angle), center[1] + radius*np.sin(angle)) for angle in
-                       np.linspace(start_angle, end_angle, num_points)]
+                pts = Pattern.generate_discretized_arc(center, radius, start_angle, end_angle,
+                                                       tolerance=board.arc_tolerance)
                 merged_polygons[layer][0] += [Polygon(pts)]
                 merged_polygons[layer][1:] = [cut, etch]
 
-        # Handle merged polygons
-        print("Original polygons", merged_polygons)
+        # Handle merged polygons: each layer's polygons are unioned group by group (see polygon_merge.py)
         for layer in merge_overlapping_polygons:
             polygons = merged_polygons[layer]
-            if len(polygons) > 1:
-                print("Original polygons: Layer =", layer, ", Cut =", polygons[1], ", Etch =", polygons[2])
-                polygons = polygons[0]
-                # for polygon in polygons:
-                #     print("Polygon pts =", list(polygon.exterior.coords))
-                if len(polygons) != 0:
-                    print(polygons)
-                    merged = unary_union(polygons)
-                    if type(merged) == Polygon:
-                        merged_polygons[layer][0] = [merged]
-                        # Add interior points
-                        print("# Interior holes", len(merged.interiors))
-                        for interior in merged.interiors:
-                            print("Interior", interior)
-                            merged_polygons[layer][0] += [Polygon(interior.coords)]  # https://stackoverflow.com/questions/51981723/shapely-polygon-union-with-holes-result
-                    else:  # MultiplePolygon
-                        print("# Polygons", len(list(merged.geoms)))
-                        merged_polygons[layer][0] = list(merged.geoms)
-                        for geom in merged.geoms:
-                            for interior in geom.interiors:
-                                print("Interior", interior)
-                                merged_polygons[layer][0] += [Polygon(interior.coords)]
-                else:
-                    merged_polygons.pop(layer)
-            else:
+            if len(polygons) == 1 or len(polygons[0]) == 0:
                 print("No polygons on layer", layer)
                 merged_polygons.pop(layer)
-        print("---------------------")
+                continue
+            start = time.perf_counter()
+            merged, groups = merge_polygons(polygons[0], merge_processes)
+            print("Merged {} polygons on layer {} into {} ({} groups unioned) in {:.3f} s".format(
+                len(polygons[0]), layer, len(merged), groups, time.perf_counter() - start))
+            # https://stackoverflow.com/questions/51981723/shapely-polygon-union-with-holes-result
+            polygons[0] = merged + [Polygon(interior.coords) for polygon in merged for interior in polygon.interiors]
         # Add merged polygons
         for layer, info in merged_polygons.items():
             polygons, cut, etch = info
@@ -546,8 +783,62 @@ class PCBPattern:
                 if layer in etch_layers and etch:
                     add_lines(msp_etch, pts + [pts[0]])
 
+        for msp in (msp_cut, msp_etch):
+            if pending_lines[id(msp)]:
+                segments = np.concatenate(pending_lines[id(msp)])
+                for pts, mode in chain_segments(segments, tol=path_tolerance):
+                    add_dxf_polyline(msp, pts, dxfattribs={'layer': 'TOP'})
+
+        if optimize_order:
+            travel = {"cut": order_dxf_entities(msp_cut, start_point),
+                      "etch": order_dxf_entities(msp_etch, start_point)}
+
         if save_cut:
             doc_cut.saveas(cut_outfile)
         if save_etch:
             doc_etch.saveas(etch_outfile)
-        return doc_cut, doc_etch
+        return (doc_cut, doc_etch, travel) if optimize_order else (doc_cut, doc_etch)
+
+
+# Run in a fresh interpreter, since KiCad's Python module keeps state between boards
+PCBNEW_LOAD = ("import sys, time\n"
+               "import pcbnew\n"
+               "start = time.perf_counter()\n"
+               "pcbnew.LoadBoard(sys.argv[1])\n"
+               "print(time.perf_counter() - start)\n")
+
+
+def benchmark_kicad_formats(board, outstem, repeats=3, **kwargs):
+    """
+    Exports a board in the KiCad 5 and KiCad 6 formats and compares them: export time, file size and, when KiCad's
+    pcbnew Python module is installed, the time KiCad takes to load each file (KiCad 6 and later convert KiCad 5 boards
+    while loading them). Prints one line per format.
+    :param board: PCBPattern
+    :param outstem: Output path without extension; writes outstem_kicad5.kicad_pcb and outstem_kicad6.kicad_pcb
+    :param repeats: Number of exports (and loads) per format, the fastest one counts
+    :param kwargs: Extra keyword arguments for generate_kicad (net_names, offset_x, ...)
+    :return: Dictionary of {format version: {'export': s, 'size': bytes, 'load': s or None}}
+    """
+    try:
+        subprocess.run([sys.executable, '-c', 'import pcbnew'], check=True, capture_output=True)
+        has_pcbnew = True
+    except subprocess.CalledProcessError:
+        has_pcbnew = False
+        print("pcbnew is not installed, so load times are not measured")
+    results = {}
+    for version in (5, 6):
+        outfile = '{}_kicad{}.kicad_pcb'.format(outstem, version)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            board.generate_kicad(outfile, kicad_version=version, **kwargs)
+            times.append(time.perf_counter() - start)
+        load = None
+        if has_pcbnew:
+            load = min(float(subprocess.run([sys.executable, '-c', PCBNEW_LOAD, outfile], check=True,
+                                            capture_output=True, text=True).stdout.split()[-1])
+                       for _ in range(repeats))
+        results[version] = {'export': min(times), 'size': os.path.getsize(outfile), 'load': load}
+        print("KiCad {}: export {:.3f} s, {:.1f} MB, load {}".format(
+            version, min(times), os.path.getsize(outfile)/1e6, 'n/a' if load is None else '{:.3f} s'.format(load)))
+    return results
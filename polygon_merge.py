@@ -0,0 +1,90 @@
+import concurrent.futures
+import numpy as np
+import shapely
+from shapely import STRtree
+
+
+def connected_groups(polygons):
+    """
+    Splits polygons into groups that touch or overlap each other, directly or through other polygons of the group.
+    Candidate pairs come from one STRtree query, and the groups are found by hooking and pointer jumping on the pair
+    arrays, so no Python loop runs over the pairs.
+    :param polygons: Array of shapely Polygons
+    :return: Array with the group label of every polygon (the smallest index in its group)
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    a, b = STRtree(polygons).query(polygons, predicate='intersects')
+    labels = np.arange(len(polygons))
+    while True:
+        la, lb = labels[a], labels[b]
+        joined = la != lb
+        if not joined.any():
+            return labels
+        # every label is a root here, so pointing the larger root of each pair at the smaller one merges the groups
+        np.minimum.at(labels, np.maximum(la, lb)[joined], np.minimum(la, lb)[joined])
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+
+
+def repaired(polygons):
+    """
+    :param polygons: Array of shapely Polygons
+    :return: The polygons, with the invalid ones (e.g. self-crossing outlines) replaced by shapely.make_valid's version
+    """
+    invalid = ~shapely.is_valid(polygons)
+    if invalid.any():
+        polygons = polygons.copy()
+        polygons[invalid] = shapely.make_valid(polygons[invalid])
+    return polygons
+
+
+def _union_groups(groups):
+    """
+    :param groups: List of arrays of polygons
+    :return: List of the union of each group
+    """
+    return [shapely.union_all(repaired(group)) for group in groups]
+
+
+def merge_polygons(polygons, processes=1, batch_vertices=200000):
+    """
+    Unions polygons group by group instead of all at once: valid polygons that do not touch any other polygon are kept
+    as they are, and every group of touching polygons (see connected_groups) is unioned on its own. Invalid polygons
+    (e.g. self-crossing offset_trace outlines) are repaired with shapely.make_valid first, even alone, so every
+    returned polygon is valid. The groups do not touch each other, so their unions together are the union of all the
+    polygons.
+    :param polygons: List of shapely Polygons
+    :param processes: Number of worker processes to union the groups with (1 unions them in this process)
+    :param batch_vertices: Number of vertices of the groups sent to a worker at a time (only used if processes > 1)
+    :return: (list of disjoint shapely Polygons, with holes, number of groups that were unioned)
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    if len(polygons) == 0:
+        return [], 0
+    labels = connected_groups(polygons)
+    order = np.argsort(labels, kind='stable')
+    starts = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1]])
+    groups = np.split(polygons[order], starts[1:])
+    singles = [group[0] for group in groups if len(group) == 1 and shapely.is_valid(group[0])]
+    groups = [group for group in groups if len(group) > 1 or not shapely.is_valid(group[0])]
+
+    if processes > 1 and len(groups) > 1:
+        batches, batch, count = [], [], 0
+        for group in sorted(groups, key=lambda group: -shapely.get_num_coordinates(group).sum()):
+            batch.append(group)
+            count += shapely.get_num_coordinates(group).sum()
+            if count >= batch_vertices:
+                batches.append(batch)
+                batch, count = [], 0
+        batches += [batch] if batch else []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            unions = [union for result in pool.map(_union_groups, batches) for union in result]
+    else:
+        unions = _union_groups(groups)
+    parts = shapely.get_parts(unions)
+    # repaired outlines can collapse partly into lines, which are not copper
+    parts = parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON]
+    return singles + list(parts), len(groups)
@@ -0,0 +1,351 @@
+import os
+import re
+import struct
+import zlib
+import xml.etree.ElementTree as ET
+import numpy as np
+from dxf_reader import read_dxf_geometry
+
+MM_PER_INCH = 25.4
+SAMPLE_SPACING = 1.0  # px between samples along a line
+
+# Layer colors for PCB previews (RGB), loosely following KiCad's defaults but readable on a white background
+LAYER_COLORS = {"F.Cu": (200, 52, 52), "B.Cu": (77, 127, 196), "Edge.Cuts": (40, 40, 40), "Eco.User2": (120, 120, 120),
+                "F.Mask": (160, 60, 160), "B.Mask": (2, 160, 160), "F.SilkS": (0, 132, 132)}
+DEFAULT_LAYER_COLOR = (90, 90, 90)
+
+
+class Lines:
+    """
+    Anti-aliased line segments of a given width (mm), drawn at least one pixel wide
+    """
+
+    def __init__(self, segments, color, width=0.):
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+        self.color = color
+        self.width = width
+
+
+class Fill:
+    """
+    Filled closed polygons, given as their edges (nonzero winding after orienting every polygon the same way)
+    """
+
+    def __init__(self, polygons, color):
+        edges = []
+        for pts in polygons:
+            pts = np.asarray(pts, dtype=np.float64)[:, :2]
+            x, y = pts[:, 0], pts[:, 1]
+            if np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)) < 0:
+                pts = pts[::-1]
+            edges.append(np.stack([pts, np.roll(pts, -1, axis=0)], axis=1))
+        self.edges = np.concatenate(edges) if edges else np.zeros((0, 2, 2))
+        self.color = color
+
+    @property
+    def segments(self):
+        return self.edges
+
+
+def _line_coverage(segments, width_px, r0, h, w, y_range=None):
+    """
+    Rasterizes segments (in pixel coordinates) into a coverage band covering rows r0 to r0 + h. Each segment is
+    sampled every SAMPLE_SPACING pixels and every sample is splatted bilinearly onto the four nearest pixel centers, so
+    a one pixel wide line accumulates a coverage of about 1 along its length.
+    :param y_range: (lowest y, highest y) of every segment, if already known (render computes it once for all bands)
+    """
+    if len(segments) == 0:
+        return np.zeros((h, w))
+    lanes = max(1, int(round(width_px)))
+    if y_range is None:
+        y_range = _y_range(segments)
+    pad = lanes/2 + 1
+    keep = (y_range[1] >= r0 - pad) & (y_range[0] <= r0 + h + pad)
+    segments = segments[keep]
+    if len(segments) == 0:
+        return np.zeros((h, w))
+
+    delta = segments[:, 1] - segments[:, 0]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    start = segments[:, 0]
+    if lanes > 1:  # thick lines are drawn as parallel hairlines one pixel apart
+        normal = np.column_stack([-delta[:, 1], delta[:, 0]])/np.maximum(length, 1e-12)[:, None]
+        shifts = np.arange(lanes) - (lanes - 1)/2
+        start = (start[None] + shifts[:, None, None]*normal[None]).reshape(-1, 2)
+        delta, length = np.tile(delta, (lanes, 1)), np.tile(length, lanes)
+
+    # Sample positions are shifted so that pixel (row, col) of the band sits at (row + 2, col + 2) of a grid padded by
+    # two pixels on every side. Samples outside the band are clamped onto the padding, which is cropped off again.
+    count = np.ceil(length/SAMPLE_SPACING).astype(np.int64) + 1
+    steps = np.maximum(count - 1, 1)
+    first = np.cumsum(count) - count
+    t = np.arange(count.sum()) - np.repeat(first, count)
+    fx = np.repeat(start[:, 0] + 1.5, count) + t*np.repeat(delta[:, 0]/steps, count)
+    fy = np.repeat(start[:, 1] + 1.5 - r0, count) + t*np.repeat(delta[:, 1]/steps, count)
+    weight = np.repeat(length/steps, count)  # trapezoid rule, so every segment deposits exactly its length
+    weight[first] *= 0.5
+    weight[first + count - 1] *= 0.5
+    weight[first[count == 1]] = 1.  # zero-length segments still show up as a dot
+    np.clip(fx, 0, w + 2, out=fx)
+    np.clip(fy, 0, h + 2, out=fy)
+
+    ix, iy = fx.astype(np.int64), fy.astype(np.int64)  # floor, as fx and fy are not negative
+    ax, ay = fx - ix, fy - iy
+    stride, size = w + 4, (h + 4)*(w + 4)
+    index = iy*stride + ix
+    right = ax*weight
+    left = weight - right
+    lower_left, lower_right = left*ay, right*ay
+    coverage = np.bincount(index, weights=left - lower_left, minlength=size)
+    coverage += np.bincount(index + 1, weights=right - lower_right, minlength=size)
+    coverage += np.bincount(index + stride, weights=lower_left, minlength=size)
+    coverage += np.bincount(index + stride + 1, weights=lower_right, minlength=size)
+    return np.minimum(coverage.reshape(h + 4, stride)[2:h + 2, 2:w + 2], 1.)
+
+
+def _y_range(segments):
+    ys = segments[:, :, 1]
+    return np.minimum(ys[:, 0], ys[:, 1]), np.maximum(ys[:, 0], ys[:, 1])
+
+
+def _fill_coverage(edges, r0, h, w):
+    """
+    Scanline fill of polygon edges (in pixel coordinates) into a coverage band covering rows r0 to r0 + h. For every
+    pixel row the signed edge crossings at the row's center are accumulated and summed along the row to get the
+    winding number of each pixel.
+    """
+    if len(edges) == 0:
+        return np.zeros((h, w))
+    y1, y2 = edges[:, 0, 1], edges[:, 1, 1]
+    lo, hi = np.minimum(y1, y2), np.maximum(y1, y2)
+    keep = (hi > r0) & (lo < r0 + h) & (y1 != y2)
+    edges, lo, hi = edges[keep], lo[keep], hi[keep]
+    first_row = np.clip(np.ceil(lo - 0.5), r0, r0 + h).astype(np.int64)
+    last_row = np.clip(np.ceil(hi - 0.5), r0, r0 + h).astype(np.int64)  # exclusive
+    count = last_row - first_row
+    edge = np.repeat(np.arange(len(edges)), count)
+    row = np.arange(len(edge)) - np.repeat(np.cumsum(count) - count, count) + first_row[edge]
+    (x1, y1), (x2, y2) = edges[edge, 0].T, edges[edge, 1].T
+    x = x1 + (row + 0.5 - y1)*(x2 - x1)/(y2 - y1)
+    col = np.clip(np.ceil(x - 0.5), 0, w).astype(np.int64)
+    crossings = np.bincount((row - r0)*(w + 1) + col, weights=np.sign(y2 - y1), minlength=h*(w + 1))
+    winding = np.cumsum(crossings.reshape(h, w + 1), axis=1)[:, :w]
+    return (winding != 0).astype(np.float64)
+
+
+def write_png(outfile, width, height, bands, palette=None):
+    """
+    Streams an 8-bit RGB or palette PNG to disk
+    :param outfile: File path
+    :param width: Image width (px)
+    :param height: Image height (px)
+    :param bands: Iterable of (rows, width, 3) uint8 arrays that together cover the image from top to bottom, or of
+                  (rows, width) palette indices if a palette is given
+    :param palette: None, or a (colors, 3) uint8 array of at most 256 RGB colors
+    :return: None
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    compressor = zlib.compressobj(1)  # previews favour speed over file size
+    with open(outfile, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2 if palette is None else 3, 0, 0, 0)))
+        if palette is not None:
+            f.write(chunk(b'PLTE', np.asarray(palette, dtype=np.uint8).tobytes()))
+        for band in bands:
+            rows = np.concatenate([np.zeros((len(band), 1), dtype=np.uint8), band.reshape(len(band), -1)], axis=1)
+            data = compressor.compress(rows.tobytes())
+            if data:
+                f.write(chunk(b'IDAT', data))
+        f.write(chunk(b'IDAT', compressor.flush()))
+        f.write(chunk(b'IEND', b''))
+
+
+def render(items, outfile, dpi=96, margin=2., background=(255, 255, 255), tile_rows=256, flip_y=False):
+    """
+    Renders lines and fills to a PNG, painting items in order. The image is rendered and compressed in bands of
+    tile_rows pixel rows, so memory use depends on the image width, not on its height.
+    :param items: List of Lines and Fill objects (coordinates in mm, y pointing down like SVG and KiCad)
+    :param outfile: File location to save the PNG to
+    :param dpi: Resolution (pixels per inch)
+    :param margin: Empty border around the geometry (mm)
+    :param background: Background color (RGB)
+    :param tile_rows: Number of pixel rows rendered at once
+    :param flip_y: If True, y points up instead (like DXF)
+    :return: (width, height) of the image in pixels
+    """
+    items = [item for item in items if len(item.segments)]
+    scale = dpi/MM_PER_INCH
+    if items:
+        # reduced per column, as numpy is slow at reducing an (n, 2) array along its long axis
+        lo = np.array([min(item.segments[..., i].min() for item in items) for i in range(2)]) - margin
+        hi = np.array([max(item.segments[..., i].max() for item in items) for i in range(2)]) + margin
+    else:
+        lo, hi = np.zeros(2), np.full(2, 2*margin)
+    width, height = [int(x) for x in np.maximum(np.ceil((hi - lo)*scale), 1)]
+
+    def to_px(segments):
+        px = (segments - lo)*scale
+        if flip_y:
+            px[..., 1] = height - px[..., 1]
+        return px
+
+    prepared = []
+    for item in items:
+        px = to_px(item.segments)
+        color = np.asarray(item.color, dtype=np.float64)
+        lut = np.round(background + np.arange(256)[:, None]/255*(color - background)).astype(np.uint8)
+        prepared.append((item, px, None if isinstance(item, Fill) else _y_range(px), color, lut))
+
+    # A single item over the background only takes the 256 colors of its lookup table, so the image is written with
+    # that palette, which is a third of the data to compress
+    palette = prepared[0][-1] if len(prepared) == 1 else None
+
+    def bands():
+        for r0 in range(0, height, tile_rows):
+            h = min(tile_rows, height - r0)
+            rgb = None
+            for item, px, y_range, color, lut in prepared:
+                if isinstance(item, Fill):
+                    coverage = _fill_coverage(px, r0, h, width).ravel()
+                else:
+                    coverage = _line_coverage(px, item.width*scale, r0, h, width, y_range).ravel()
+                if rgb is None:  # painting over the plain background, so the blend is a lookup of the 8-bit coverage
+                    alpha = (coverage*255 + 0.5).astype(np.uint8)
+                    rgb = alpha if palette is not None else lut.take(alpha, axis=0)
+                    continue
+                # only the covered pixels change, and lines usually cover a small part of the band
+                covered = np.flatnonzero(coverage)
+                old = rgb[covered]
+                rgb[covered] = np.round(old + coverage[covered, None]*(color - old)).astype(np.uint8)
+            if rgb is None:
+                rgb = np.empty((h*width, 3), dtype=np.uint8)
+                rgb[:] = background
+            yield rgb.reshape(h, width, -1)
+
+    write_png(outfile, width, height, bands(), palette)
+    return width, height
+
+
+def arc_segments(center, radius, start_angle, end_angle, n=32):
+    """
+    :return: (n - 1, 2, 2) array of segments along an arc
+    """
+    theta = np.linspace(start_angle, end_angle, n)
+    pts = np.column_stack([center[0] + radius*np.cos(theta), center[1] + radius*np.sin(theta)])
+    return np.stack([pts[:-1], pts[1:]], axis=1)
+
+
+def _parse_color(stroke):
+    match = re.match(r'rgb\((\d+),\s*(\d+),\s*(\d+)\)', stroke or '')
+    return tuple(int(c) for c in match.groups()) if match else (0, 0, 0)
+
+
+def _parse_matrix(transform):
+    """
+    :param transform: SVG transform attribute of a <use>, as written by SVGStreamWriter.write_uses
+    :return: Affine transform [[a, c, e], [b, d, f]] of shape (2, 3)
+    """
+    match = re.fullmatch(r'\s*matrix\(([^)]*)\)\s*', transform or 'matrix(1 0 0 1 0 0)')
+    values = match.group(1).replace(',', ' ').split() if match else []
+    if len(values) != 6:
+        raise ValueError("Unsupported <use> transform {!r}, only matrix(a b c d e f) is read".format(transform))
+    a, b, c, d, e, f = (float(v) for v in values)
+    return np.array([[a, c, e], [b, d, f]])
+
+
+def load_svg(infile):
+    """
+    Reads the <line>, <polyline> and <polygon> elements of an SVG file (as written by this package). Groups defined in
+    <defs> are only drawn where a <use> places them, with the use's transform (the instanced output of write_svg).
+    :return: List of Lines, one per stroke color
+    """
+    by_color = {}
+    definitions = {}  # group id: {color: segments}, for the <g> elements in <defs>
+    targets = [by_color]  # where the elements being read go: the drawing, or the definition being read
+    parents = []  # tags of the open elements
+    for event, element in ET.iterparse(infile, events=('start', 'end')):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if tag == 'symbol':
+                raise ValueError("<symbol> is not read, instanced files must define their cells as <g> in <defs>")
+            if tag == 'g' and parents and parents[-1] == 'defs':
+                targets.append({})
+            parents.append(tag)
+            continue
+        parents.pop()
+        if tag == 'g' and parents and parents[-1] == 'defs':
+            definitions[element.get('id')] = {color: np.concatenate(segments)
+                                              for color, segments in targets.pop().items()}
+            element.clear()
+            continue
+        if tag == 'line':
+            a = element.attrib
+            segments = {_parse_color(a.get('stroke')): [[[float(a['x1']), float(a['y1'])],
+                                                          [float(a['x2']), float(a['y2'])]]]}
+        elif tag in ('polyline', 'polygon'):
+            pts = np.array([p.split(',') for p in element.attrib['points'].split()], dtype=np.float64)
+            if tag == 'polygon':
+                pts = np.vstack([pts, pts[:1]])
+            segments = {_parse_color(element.attrib.get('stroke')): np.stack([pts[:-1], pts[1:]], axis=1)}
+        elif tag == 'use':
+            href = element.get('{http://www.w3.org/1999/xlink}href', element.get('href', ''))
+            if href[1:] not in definitions:
+                raise ValueError("<use> of {!r}, which is not a <g> defined in <defs> before it".format(href))
+            matrix = _parse_matrix(element.get('transform'))
+            segments = {color: cell_segments @ matrix[:, :2].T + matrix[:, 2]
+                        for color, cell_segments in definitions[href[1:]].items()}
+        else:
+            continue
+        for color, color_segments in segments.items():
+            targets[-1].setdefault(color, []).append(np.asarray(color_segments))
+        element.clear()
+    return [Lines(np.concatenate(segments), color) for color, segments in by_color.items()]
+
+
+def load_dxf(infile, color=(255, 0, 0)):
+    """
+    Reads the LINE, ARC, CIRCLE, LWPOLYLINE and POLYLINE entities of a DXF file (streamed by dxf_reader.py)
+    :return: List with a single Lines object
+    """
+    geometry = read_dxf_geometry(infile)
+    segments = [np.array(geometry.segments, dtype=np.float64).reshape(-1, 2, 2)]
+    for cx, cy, radius, start_angle, end_angle in geometry.arcs:
+        segments.append(arc_segments((cx, cy), radius, start_angle, end_angle))
+    return [Lines(np.concatenate(segments), color)]
+
+
+def render_file(infile, outfile, dpi=96):
+    """
+    Renders an existing SVG or DXF file to a PNG preview
+    :return: (width, height) of the image in pixels
+    """
+    if infile.lower().endswith('.svg'):
+        return render(load_svg(infile), outfile, dpi)
+    return render(load_dxf(infile), outfile, dpi, flip_y=True)
+
+
+def render_directory(directory, outdir, dpi=96):
+    """
+    Renders a PNG preview for every SVG and DXF file in a directory
+    :param directory: Directory with SVG/DXF files (e.g. patterns/)
+    :param outdir: Directory to write the previews to (created if needed)
+    :param dpi: Resolution (pixels per inch)
+    :return: List of written PNG paths
+    """
+    os.makedirs(outdir, exist_ok=True)
+    written = []
+    for name in sorted(os.listdir(directory)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in ('.svg', '.dxf'):
+            continue
+        outfile = os.path.join(outdir, base + ext.lower().replace('.', '_') + '.png')
+        render_file(os.path.join(directory, name), outfile, dpi)
+        written.append(outfile)
+    return written
+
+
+if __name__ == '__main__':
+    for path in render_directory('patterns', 'previews', dpi=96):
+        print(path)
@@ -0,0 +1,164 @@
+import io
+import numpy as np
+from settings import *
+from pattern import Pattern
+from svg_writer import SVGStreamWriter, SVG_HEADER, SVG_FOOTER
+
+
+MISSING = object()  # recorded for parameters that were looked up but not given
+
+
+class TrackedParameters(dict):
+    """
+    Parameter dictionary that records which parameters are read (and the values they had), so a region's
+    dependencies are found by running it rather than by declaring them. Looking up an absent parameter (with get or
+    in) records MISSING, so the region is rebuilt once the parameter is given.
+    """
+
+    def __init__(self, parameters):
+        super().__init__(parameters)
+        self.read = {}
+
+    def __getitem__(self, name):
+        value = super().__getitem__(name)
+        self.read[name] = value
+        return value
+
+    def __contains__(self, name):
+        present = super().__contains__(name)
+        self.read[name] = super().__getitem__(name) if present else MISSING
+        return present
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+
+def _same(a, b):
+    try:
+        return bool(np.all(np.asarray(a) == np.asarray(b))) and np.shape(a) == np.shape(b)
+    except (TypeError, ValueError):
+        return a == b
+
+
+class RegionalGenerator:
+    """
+    Builds a pattern out of named regions (e.g. the cuts, the border and the seam holes of a sheet), each made by its
+    own function. The parameters each region reads are recorded when it is built, so after a parameter change only
+    the regions that read a changed parameter are rebuilt, and write_svg only re-formats those regions.
+    Usage:
+        sheet = RegionalGenerator()
+
+        @sheet.region
+        def border(p, params):
+            p.add_rectangle((0, 0), (params['width'], params['height']))
+
+        p = sheet.build(width=80., height=120.)
+        sheet.dirty(width=80., height=100.)  # {'border': ['height']}
+    """
+
+    def __init__(self, setting=LaserCutter):
+        self.setting = setting
+        self.builders = {}  # name: function(p, params) that adds the region's geometry to p
+        self.cells = {}  # name: Pattern holding the region, from the last build
+        self.dependencies = {}  # name: {parameter: value when the region was last built}
+        self.fragments = {}  # name: (SVG options, SVG elements of the region)
+        self.rebuilt = []  # regions rebuilt by the last call to build()
+
+    def region(self, builder=None, name=None):
+        """
+        Decorator registering a region function, called as builder(p, params) with a fresh Pattern p. Regions are
+        assembled in the order they are registered.
+        :param name: Region name (default: the function's name)
+        """
+        if builder is None:
+            return lambda f: self.region(f, name)
+        self.builders[name or builder.__name__] = builder
+        return builder
+
+    def dirty(self, parameters=None, **kwargs):
+        """
+        :param parameters: Dictionary of parameters (or pass them as keyword arguments)
+        :return: Dictionary of {region name: parameters it read that changed} for every region that build() would
+                 rebuild. Regions that were never built map to an empty list.
+        """
+        parameters = dict(parameters or {}, **kwargs)
+        result = {}
+        for name in self.builders:
+            if name not in self.cells:
+                result[name] = []
+                continue
+            changed = [key for key, value in self.dependencies[name].items()
+                       if (key in parameters) != (value is not MISSING)
+                       or (key in parameters and not _same(parameters[key], value))]
+            if changed:
+                result[name] = changed
+        return result
+
+    def dependency_map(self):
+        """
+        :return: Dictionary of {parameter: regions that read it}, from the last build
+        """
+        result = {}
+        for name, read in self.dependencies.items():
+            for key in read:
+                result.setdefault(key, []).append(name)
+        return result
+
+    def build(self, parameters=None, **kwargs):
+        """
+        Rebuilds the dirty regions and assembles the pattern. Every region is a cell placed once with an identity
+        transform, so unchanged regions are shared with the previous build instead of being copied. The cells belong to
+        the generator: modify the returned pattern's own geometry, not its cells.
+        :param parameters: Dictionary of parameters (or pass them as keyword arguments)
+        :return: Pattern
+        """
+        parameters = dict(parameters or {}, **kwargs)
+        self.rebuilt = list(self.dirty(parameters))
+        for name in self.rebuilt:
+            cell = Pattern(setting=self.setting)
+            tracked = TrackedParameters(parameters)
+            self.builders[name](cell, tracked)
+            self.cells[name] = cell
+            self.dependencies[name] = tracked.read
+            self.fragments.pop(name, None)
+        if self.rebuilt:
+            print("Rebuilt regions: {}".format(', '.join(self.rebuilt)))
+
+        p = Pattern(setting=self.setting)
+        p.parameters = parameters
+        for name in self.builders:
+            p.add_instances(self.cells[name], np.zeros((1, 2)))
+        return p
+
+    def write_svg(self, outfile, offset_x=0, offset_y=0, default_linewidth=None, join_paths=False,
+                  path_tolerance=1e-6):
+        """
+        Writes the last build to an SVG file, reusing the formatted elements of every region that was not rebuilt
+        since the last call with the same options. Elements are grouped by region (each region's lines, then its
+        polygons); otherwise the output matches Pattern.write_svg.
+        :param outfile: File path
+        :param offset_x: Offset_x to all points
+        :param offset_y: Offset_y to all points
+        :param default_linewidth: If not None, overrides the line width of every mode
+        :param join_paths: If True, segments that share endpoints are joined into <polyline>/<polygon> elements
+        :param path_tolerance: Endpoints closer than this (mm) are joined when join_paths is True
+        :return: Names of the regions that were re-formatted
+        """
+        options = (offset_x, offset_y, default_linewidth, join_paths, path_tolerance)
+        formatted = []
+        for name in self.builders:
+            if name in self.fragments and self.fragments[name][0] == options:
+                continue
+            cell = self.cells[name]
+            cell = cell.expand() if cell.instances or cell.has_transform else cell
+            buf = io.StringIO()
+            with SVGStreamWriter(buf, self.setting, default_linewidth, fragment=True) as svg:
+                cell._write_svg_geometry(svg, np.array([offset_x, offset_y]), join_paths, path_tolerance)
+            self.fragments[name] = (options, buf.getvalue())
+            formatted.append(name)
+        with open(outfile, 'w') as f:
+            f.write(SVG_HEADER)
+            for name in self.builders:
+                f.write(self.fragments[name][1])
+            f.write(SVG_FOOTER)
+        return formatted
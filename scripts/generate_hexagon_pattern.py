@@ -1,12 +1,15 @@
 from pattern import *
 from settings import *
+from cache import cached, default_cache
 import numpy as np
 from datetime import datetime
 
 
+@cached
 def generate_hexagon_pattern(nx, ny, s, buffer_height, seamhole_diameter, spring_radius, spring_gap, spring_thickness,
                              gap):
     p = Pattern(setting=LaserCutter)
+    cell = Pattern(setting=LaserCutter)  # one hexagon centered on the origin, placed at every grid position
     # Derived constants
     cell_width = 1.5*s
     cell_height = np.sqrt(3)*s
@@ -37,18 +40,18 @@ def generate_hexagon_pattern(nx, ny, s, buffer_height, seamhole_diameter, spring
               p3[1] + bottom_edge*np.sin(theta))
         p5 = (p4[0] - (gap/2)*np.sin(theta),
               p4[1] + (gap/2)*np.cos(theta))
-        p.add_lines([p1, p2, p3, p4, p5])
+        cell.add_lines([p1, p2, p3, p4, p5])
         spring_inner_radius = spring_radius - spring_thickness/2
         spring_outer_radius = spring_radius + spring_thickness/2
         p6 = (p5[0] - spring_inner_radius*np.cos(theta),
               p5[1] - spring_inner_radius*np.sin(theta))
-        p.add_arc(p6, spring_inner_radius, start_angle=theta, end_angle=theta + np.pi/2)
+        cell.add_arc(p6, spring_inner_radius, start_angle=theta, end_angle=theta + np.pi/2)
         p7 = (p6[0] - (2*spring_radius)*np.sin(theta),
               p6[1] + (2*spring_radius)*np.cos(theta))
-        p.add_arc(p7, spring_outer_radius, start_angle=theta - np.pi/2, end_angle=theta - np.pi)
+        cell.add_arc(p7, spring_outer_radius, start_angle=theta - np.pi/2, end_angle=theta - np.pi)
 
-        p.add_arc(p7, spring_inner_radius, start_angle=theta - np.pi/2, end_angle=theta - np.pi)
-        p.add_arc(p6, spring_outer_radius, start_angle=theta, end_angle=theta + np.pi/2)
+        cell.add_arc(p7, spring_inner_radius, start_angle=theta - np.pi/2, end_angle=theta - np.pi)
+        cell.add_arc(p6, spring_outer_radius, start_angle=theta, end_angle=theta + np.pi/2)
         p8 = (p6[0] + spring_outer_radius*np.cos(theta),
               p6[1] + spring_outer_radius*np.sin(theta))
         p9 = (p8[0] + (gap/2)*np.sin(theta),
@@ -57,7 +60,7 @@ def generate_hexagon_pattern(nx, ny, s, buffer_height, seamhole_diameter, spring
                p9[1] + spring_gap*np.sin(theta))
         p11 = (p10[0] - (gap/2)*np.sin(theta),
                p10[1] + (gap/2)*np.cos(theta))
-        p.add_lines([p8, p9, p10, p11])
+        cell.add_lines([p8, p9, p10, p11])
 
         p1 = pend
         p2 = (center[0] + cutout_width_x/2, center[1] + cutout_width_y/2)
@@ -66,43 +69,33 @@ def generate_hexagon_pattern(nx, ny, s, buffer_height, seamhole_diameter, spring
               p3[1] - bottom_edge*np.sin(theta))
         p5 = (p4[0] - (gap/2)*np.sin(theta),
               p4[1] + (gap/2)*np.cos(theta))
-        p.add_lines([p1, p2, p3, p4, p5])
+        cell.add_lines([p1, p2, p3, p4, p5])
         p6 = (p5[0] + spring_inner_radius*np.cos(theta),
               p5[1] + spring_inner_radius*np.sin(theta))
-        p.add_arc(p6, spring_inner_radius, start_angle=theta + np.pi, end_angle=theta + np.pi/2)
+        cell.add_arc(p6, spring_inner_radius, start_angle=theta + np.pi, end_angle=theta + np.pi/2)
         p7 = (p6[0] - (2*spring_radius)*np.sin(theta),
               p6[1] + (2*spring_radius)*np.cos(theta))
-        p.add_arc(p7, spring_outer_radius, start_angle=theta - np.pi/2, end_angle=theta)
-        p.add_arc(p7, spring_inner_radius, start_angle=theta - np.pi/2, end_angle=theta)
-        p.add_arc(p6, spring_outer_radius, start_angle=theta + np.pi, end_angle=theta + np.pi/2)
+        cell.add_arc(p7, spring_outer_radius, start_angle=theta - np.pi/2, end_angle=theta)
+        cell.add_arc(p7, spring_inner_radius, start_angle=theta - np.pi/2, end_angle=theta)
+        cell.add_arc(p6, spring_outer_radius, start_angle=theta + np.pi, end_angle=theta + np.pi/2)
 
-    for i in range(nx):
-        for j in range(ny):
-            if i%2 == 0:
-                center = (cell_width*i, cell_height*j)
-            else:
-                center = (cell_width*i, cell_height*j + s_long + gap/2)
-            lefttop = (center[0] - s_short, center[1] + s_long)
-            left = (center[0] - (s - gap/2), center[1])
-            leftbot = (center[0] - s_short, center[1] - s_long)
-            rightbot = (center[0] + s_short, center[1] - s_long)
-            right = (center[0] + (s - gap/2), center[1])
-            righttop = (center[0] + s_short, center[1] + s_long)
+    lefttop = (-s_short, s_long)
+    left = (-(s - gap/2), 0.)
+    leftbot = (-s_short, -s_long)
+    rightbot = (s_short, -s_long)
+    right = (s - gap/2, 0.)
+    righttop = (s_short, s_long)
 
-            add_side(lefttop, righttop)
-            add_side(righttop, right, omit_first_point=True)
-            add_side(right, rightbot, omit_first_point=True)
-            add_side(rightbot, leftbot, omit_first_point=True)
-            add_side(leftbot, left, omit_first_point=True)
-            add_side(left, lefttop, omit_first_point=True)
-            # points.append((center[0] - s_short, center[1] + s_long))  # left top
-            # points.append((center[0] - (s - gap/2), center[1]))  # left
-            # points.append((center[0] - s_short, center[1] - s_long))  # left bottom
-            # points.append((center[0] + s_short, center[1] - s_long))  # right bottom
-            # points.append((center[0] + (s - gap/2), center[1]))  # right
-            # points.append((center[0] + s_short, center[1] + s_long))  # right top
-            # points.append((center[0] - s_short, center[1] + s_long))  # left top
-            # p.add_lines(points)
+    add_side(lefttop, righttop)
+    add_side(righttop, right, omit_first_point=True)
+    add_side(right, rightbot, omit_first_point=True)
+    add_side(rightbot, leftbot, omit_first_point=True)
+    add_side(leftbot, left, omit_first_point=True)
+    add_side(left, lefttop, omit_first_point=True)
+
+    i, j = np.meshgrid(np.arange(nx), np.arange(ny), indexing='ij')
+    centers = np.stack([cell_width*i, cell_height*j + (i%2)*(s_long + gap/2)], axis=-1)
+    p.add_instances(cell, centers.reshape(-1, 2))
 
     return p
 
@@ -127,5 +120,6 @@ if __name__ == '__main__':
     p = generate_hexagon_pattern(nx, ny, s, buffer_height, seamhole_diameter, spring_radius, spring_gap,
                                  spring_thickness, gap)
 
-    p.generate_svg('../patterns/' + timestamp + '.svg', save=True, offset_x=s, offset_y=np.sqrt(3)/2*s)
+    default_cache.export(p, 'generate_svg', '../patterns/' + timestamp + '.svg', save=True, offset_x=s,
+                         offset_y=np.sqrt(3)/2*s)
     # p.generate_dxf('../patterns/' + timestamp + '.dxf', save=True, offset_x=1.5*s, offset_y=np.sqrt(3)/2*s)
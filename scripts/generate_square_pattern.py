@@ -1,17 +1,26 @@
 from pattern import *
 from settings import *
+from regions import RegionalGenerator
 import numpy as np
 from datetime import datetime
 
 
-def generate_squarelv1_pattern(width, height, nx, ny, buffer_height, seamhole_diameter, kerf, gap):
-    p = Pattern(setting=LaserCutter)
-    # Derived constants
-    cell_width = width/nx
-    cell_height = height/ny
-    gap = 2*kerf + gap
+squarelv1 = RegionalGenerator(setting=LaserCutter)  # remembers the last build, so only changed regions are rebuilt
+
+
+def derived_constants(params):
+    """
+    :return: (cell_width, cell_height, gap) of the square pattern
+    """
+    return params['width']/params['nx'], params['height']/params['ny'], 2*params['kerf'] + params['gap']
+
+
+@squarelv1.region
+def horizontal_cuts(p, params):
+    width, nx, ny = params['width'], params['nx'], params['ny']
+    buffer_height, kerf = params['buffer_height'], params['kerf']
+    cell_width, cell_height, gap = derived_constants(params)
 
-    # Define horizontal cuts
     for j in range(1, ny):
         if j%2 == 1:
             for i in range(nx//2 + 1):
@@ -38,7 +47,13 @@ def generate_squarelv1_pattern(width, height, nx, ny, buffer_height, seamhole_di
                     center = (cell_width*(2*i + 2) - gap/2, cell_height*j + buffer_height)
                     p.add_arc(center, kerf/2, start_angle=np.pi/2, end_angle=-np.pi/2)
 
-    # Define vertical cuts
+
+@squarelv1.region
+def vertical_cuts(p, params):
+    height, nx, ny = params['height'], params['nx'], params['ny']
+    buffer_height, kerf = params['buffer_height'], params['kerf']
+    cell_width, cell_height, gap = derived_constants(params)
+
     for i in range(1, nx):
         if i%2 == 0:
             for j in range(ny//2 + 1):
@@ -65,6 +80,13 @@ def generate_squarelv1_pattern(width, height, nx, ny, buffer_height, seamhole_di
                     center = (cell_width*i, cell_height*(2*j + 2) - gap/2 + buffer_height)
                     p.add_arc(center, kerf/2, start_angle=np.pi, end_angle=0)
 
+
+@squarelv1.region
+def border(p, params):
+    width, height, ny = params['width'], params['height'], params['ny']
+    buffer_height, kerf = params['buffer_height'], params['kerf']
+    cell_height = height/ny
+
     # Define seam holes
     # for i in [cell_width/2, cell_width*3/2, width - cell_width*3/2, width - cell_width/2]:
     #     for j in [cell_height/2 + cell_height*j for j in range(ny)]:
@@ -86,7 +108,11 @@ def generate_squarelv1_pattern(width, height, nx, ny, buffer_height, seamhole_di
     p.add_line(p2, p3)
     for j in range(0, len(y_edges) - 1, 2):
         p.add_line((0, y_edges[j]), (0, y_edges[j + 1]))
-    return p
+
+
+def generate_squarelv1_pattern(width, height, nx, ny, buffer_height, seamhole_diameter, kerf, gap):
+    return squarelv1.build(width=width, height=height, nx=nx, ny=ny, buffer_height=buffer_height,
+                           seamhole_diameter=seamhole_diameter, kerf=kerf, gap=gap)
 
 
 if __name__ == '__main__':
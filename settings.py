@@ -13,3 +13,4 @@ class LaserCutter:
 
     COLOR = [[255, 0, 0], [0, 0, 255], [255, 255, 255]]  # RGB
     LINEWIDTH = [0.0254, 0.0254, 1]  # mm
+    ARC_TOLERANCE = 0.0254  # mm, maximum distance between an arc and the chords that approximate it
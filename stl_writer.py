@@ -0,0 +1,107 @@
+import numpy as np
+import shapely
+from shapely import STRtree
+
+STL_RECORD = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+
+def cut_regions(segments, tol=1e-6):
+    """
+    Finds the pieces of material left over after cutting along the given segments.
+    The segments are snapped to a grid of spacing tol, noded and polygonized into faces. A face is material if it is
+    nested inside an even number of other faces (even-odd rule), so slot outlines become holes and islands inside
+    slots become material again. Dangling cuts that do not close a loop do not change the regions.
+    :param segments: Array of shape (N, 2, 2) with the cut lines (arcs already discretized)
+    :param tol: Grid size (mm) that endpoints are snapped to
+    :return: Array of shapely Polygons (with holes), one per piece of material
+    """
+    lines = shapely.linestrings(np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2))
+    noded = shapely.union_all(lines, grid_size=tol)
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(noded)))
+    if len(faces) == 0:
+        return faces
+    filled = shapely.polygons(shapely.get_exterior_ring(faces))
+    inside, _ = STRtree(filled).query(shapely.point_on_surface(faces), predicate='within')
+    depth = np.bincount(inside, minlength=len(faces)) - 1  # every face is within its own filled outline
+    return faces[depth%2 == 0]
+
+
+def _triangle_normals(triangles):
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals/np.where(length == 0, 1, length)
+
+
+def extrude(regions, thickness, chunk_size=1 << 20):
+    """
+    Extrudes planar regions into a closed solid from z = 0 to z = thickness.
+    Caps come from a constrained Delaunay triangulation of each region, so cap edges on the boundary match the side
+    walls exactly and the mesh is watertight. Regions are triangulated a batch at a time as the chunks are consumed,
+    and the triangles are read straight into coordinate arrays (no shapely object is made per triangle or per ring).
+    :param regions: Array of shapely Polygons (with holes)
+    :param thickness: Extrusion height (mm)
+    :param chunk_size: Maximum number of triangles per yielded chunk (a larger region is yielded whole)
+    :return: (count, chunks), the total number of triangles and a generator of (n, 3, 3) float arrays whose vertices
+             are ordered counter-clockwise seen from outside the solid
+    """
+    regions = shapely.orient_polygons(np.asarray(regions, dtype=object), exterior_cw=False)
+    if len(regions) == 0:
+        return 0, iter(())
+    # Exteriors run counter-clockwise and holes clockwise, so the material is always to the left of each edge
+    _, ring_pts, (ring_offsets, region_offsets) = shapely.to_ragged_array(regions)
+    ring_id = np.repeat(np.arange(len(ring_offsets) - 1), np.diff(ring_offsets))
+    edge_start = np.flatnonzero(ring_id[:-1] == ring_id[1:])
+    # A triangulation of a polygon with V vertices and h holes, without added points, has V + 2h - 2 triangles
+    vertices = np.add.reduceat(np.diff(ring_offsets) - 1, region_offsets[:-1])
+    cap_counts = vertices + 2*(np.diff(region_offsets) - 1) - 2
+    batch_ends, batch_size = [], 0
+    for i, n in enumerate(cap_counts.tolist()):
+        if batch_size and batch_size + n > chunk_size:
+            batch_ends.append(i)
+            batch_size = 0
+        batch_size += n
+    batch_ends.append(len(regions))
+    count = 2*int(cap_counts.sum()) + 2*len(edge_start)
+
+    def chunks():
+        for batch_start, batch_end in zip([0] + batch_ends[:-1], batch_ends):
+            triangles = shapely.constrained_delaunay_triangles(regions[batch_start:batch_end])
+            caps = shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+            u, v = caps[:, 1] - caps[:, 0], caps[:, 2] - caps[:, 0]
+            clockwise = u[:, 0]*v[:, 1] - u[:, 1]*v[:, 0] < 0
+            caps[clockwise] = caps[clockwise][:, ::-1]
+            z = np.zeros(caps.shape[:2] + (1,))
+            yield np.concatenate([caps, z + thickness], axis=2)
+            yield np.concatenate([caps[:, ::-1], z], axis=2)
+        for start in range(0, len(edge_start), chunk_size):
+            i = edge_start[start:start + chunk_size]
+            a, b = ring_pts[i], ring_pts[i + 1]
+            z0 = np.zeros((len(i), 1))
+            a0, b0 = np.hstack([a, z0]), np.hstack([b, z0])
+            a1, b1 = np.hstack([a, z0 + thickness]), np.hstack([b, z0 + thickness])
+            yield np.concatenate([np.stack([a0, b0, b1], axis=1), np.stack([a0, b1, a1], axis=1)])
+
+    return count, chunks()
+
+
+def write_binary_stl(outfile, count, chunks, header=b'dxf_stl_renderer'):
+    """
+    Streams triangles to a binary STL file
+    :param outfile: File path or a writable binary file object
+    :param count: Total number of triangles (written in the header before any triangle)
+    :param chunks: Iterable of (n, 3, 3) arrays of triangle vertices, counter-clockwise seen from outside
+    :param header: Up to 80 bytes of header text
+    :return: None
+    """
+    f = open(outfile, 'wb') if isinstance(outfile, str) else outfile
+    try:
+        f.write(header[:80].ljust(80, b'\0'))
+        f.write(np.uint32(count).tobytes())
+        for triangles in chunks:
+            records = np.zeros(len(triangles), dtype=STL_RECORD)
+            records['normal'] = _triangle_normals(triangles)
+            records['vertices'] = triangles
+            f.write(records.tobytes())
+    finally:
+        if isinstance(outfile, str):
+            f.close()
@@ -0,0 +1,89 @@
+import json
+import struct
+import numpy as np
+
+FORMAT_VERSION = 1
+METADATA_KEY = '__metadata__'
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError("Cannot store {!r} in the metadata".format(type(value)))
+
+
+def save_arrays(outfile, arrays, metadata):
+    """
+    Saves named arrays and a JSON metadata header to an uncompressed .npz file. The arrays are stored uncompressed so
+    that load_arrays can memory-map them straight from the file.
+    :param outfile: File path (conventionally ending in .npz)
+    :param arrays: Dictionary of {name: array}, with numeric dtypes only
+    :param metadata: JSON-serializable dictionary
+    :return: None
+    """
+    metadata = dict(metadata, format_version=FORMAT_VERSION)
+    header = np.frombuffer(json.dumps(metadata, default=_to_json).encode('utf-8'), dtype=np.uint8)
+    with open(outfile, 'wb') as f:
+        np.savez(f, **{METADATA_KEY: header}, **arrays)
+
+
+def _member_offset(f, info):
+    """
+    :return: Offset of a stored zip member's data in the file (the local header's name and extra field lengths can
+             differ from the central directory, so they are read from the local header itself)
+    """
+    f.seek(info.header_offset)
+    local = f.read(30)
+    name_length, extra_length = struct.unpack('<HH', local[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def load_arrays(infile, mmap=True):
+    """
+    Loads a file written by save_arrays
+    :param infile: File path
+    :param mmap: If True, arrays are memory-mapped copy-on-write, so loading costs no reads until the data is used and
+                 changes are never written back to the file
+    :return: (arrays, metadata)
+    """
+    if not mmap:
+        with np.load(infile) as data:
+            arrays = {name: data[name] for name in data.files}
+        return arrays, _parse_metadata(arrays.pop(METADATA_KEY))
+
+    import zipfile
+    arrays = {}
+    with open(infile, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError("{} is compressed and cannot be memory-mapped".format(info.filename))
+            f.seek(_member_offset(f, info))
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(infile, dtype=dtype, mode='c', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays, _parse_metadata(arrays.pop(METADATA_KEY))
+
+
+def _parse_metadata(header):
+    metadata = json.loads(np.asarray(header).tobytes().decode('utf-8'))
+    if metadata.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError("File format version {} is newer than this library supports ({})".format(
+            metadata['format_version'], FORMAT_VERSION))
+    return metadata
+
+
+def read_metadata(infile):
+    """
+    :return: The metadata header of a file written by save_arrays, without loading any geometry
+    """
+    with np.load(infile) as data:
+        return _parse_metadata(data[METADATA_KEY])
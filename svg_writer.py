@@ -0,0 +1,138 @@
+import numpy as np
+from toolpath import is_closed
+
+SVG_HEADER = '<?xml version="1.0" encoding="utf-8" ?>\n' \
+             '<svg baseProfile="tiny" height="100%" version="1.2" width="100%" xmlns="http://www.w3.org/2000/svg" ' \
+             'xmlns:ev="http://www.w3.org/2001/xml-events" xmlns:xlink="http://www.w3.org/1999/xlink">\n'
+SVG_FOOTER = '</svg>\n'
+LINE_FORMAT = '<line x1="%.12g" y1="%.12g" x2="%.12g" y2="%.12g" %s />\n'
+USE_FORMAT = '<use xlink:href="#%s" transform="matrix(%.12g %.12g %.12g %.12g %.12g %.12g)" />\n'
+PRECISION = 4  # decimal places kept in coordinates, same as svgwrite's tiny profile
+
+
+class SVGStreamWriter:
+    """
+    Writes SVG straight to a file handle without building a DOM. Geometry is formatted and written in fixed-size
+    chunks, so peak memory does not depend on the number of segments.
+    Usage:
+        with SVGStreamWriter('out.svg', LaserCutter) as svg:
+            svg.write_segments(segments, modes)
+    """
+
+    def __init__(self, outfile, setting, default_linewidth=None, chunk_size=8192, fragment=False):
+        """
+        :param outfile: File path or a writable text file object
+        :param setting: Machine settings class (e.g. LaserCutter) providing COLOR and LINEWIDTH per mode
+        :param default_linewidth: If not None, overrides the line width of every mode
+        :param chunk_size: Number of entities formatted per write
+        :param fragment: If True, only the elements are written, without the <svg> header and footer (for pieces of a
+                         document that are assembled later)
+        """
+        self.fragment = fragment
+        self._owns_file = isinstance(outfile, str)
+        self.f = open(outfile, 'w', buffering=1 << 20) if self._owns_file else outfile
+        self.chunk_size = chunk_size
+        self.strokes = []  # precomputed stroke attributes, indexed by mode
+        for color, linewidth in zip(setting.COLOR, setting.LINEWIDTH):
+            if default_linewidth is not None:
+                linewidth = default_linewidth
+            self.strokes.append('stroke="rgb({},{},{})" stroke-width="{}"'.format(color[0], color[1], color[2],
+                                                                                  linewidth))
+        if not fragment:
+            self.f.write(SVG_HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.f is None:
+            return
+        if not self.fragment:
+            self.f.write(SVG_FOOTER)
+        if self._owns_file:
+            self.f.close()
+        self.f = None
+
+    def write_segments(self, segments, modes, offset=(0, 0)):
+        """
+        Writes one <line> per segment
+        :param segments: Array of shape (N, 2, 2)
+        :param modes: Drawing mode of each segment
+        :param offset: (x, y) added to every point
+        :return: None
+        """
+        strokes = self.strokes
+        for start in range(0, len(segments), self.chunk_size):
+            chunk = np.round(segments[start:start + self.chunk_size].reshape(-1, 4) + np.tile(offset, 2), PRECISION)
+            chunk_modes = modes[start:start + self.chunk_size]
+            self.f.write(''.join([LINE_FORMAT % (x1, y1, x2, y2, strokes[m])
+                                  for (x1, y1, x2, y2), m in zip(chunk.tolist(), chunk_modes.tolist())]))
+
+    def write_polygons(self, polygons, offset=(0, 0)):
+        """
+        Writes one closed, unfilled <polygon> per polygon
+        :param polygons: Iterable of (vertices, mode), e.g. a geometry.PolygonBuffer
+        :param offset: (x, y) added to every point
+        :return: None
+        """
+        out = []
+        for pts, mode in polygons:
+            pts = np.round(np.asarray(pts) + offset, PRECISION)
+            out.append('<polygon points="{}" fill="none" {} />\n'.format(
+                ' '.join('%.12g,%.12g' % (x, y) for x, y in pts.tolist()), self.strokes[mode]))
+            if len(out) >= self.chunk_size:
+                self.f.write(''.join(out))
+                out = []
+        self.f.write(''.join(out))
+
+    def write_polylines(self, chains, offset=(0, 0)):
+        """
+        Writes chained segments as <polyline> elements (<polygon> when closed, <line> for a single segment)
+        :param chains: List of (points, mode), as returned by toolpath.chain_segments
+        :param offset: (x, y) added to every point
+        :return: None
+        """
+        out = []
+        for pts, mode in chains:
+            closed = is_closed(pts)
+            pts = np.round((pts[:-1] if closed else pts) + offset, PRECISION)
+            if len(pts) == 2:
+                out.append(LINE_FORMAT % (tuple(pts.ravel().tolist()) + (self.strokes[mode],)))
+            else:
+                out.append('<{} points="{}" fill="none" {} />\n'.format(
+                    'polygon' if closed else 'polyline', ' '.join('%.12g,%.12g' % (x, y) for x, y in pts.tolist()),
+                    self.strokes[mode]))
+            if len(out) >= self.chunk_size:
+                self.f.write(''.join(out))
+                out = []
+        self.f.write(''.join(out))
+
+    def begin_definition(self, name):
+        """
+        Starts a reusable group, written as a <g> inside <defs> since SVG Tiny 1.2 has no <symbol>. Everything written
+        until end_definition() belongs to the group, in its own coordinates, and is only drawn where write_uses()
+        places it.
+        :param name: Group id
+        :return: None
+        """
+        self.f.write('<defs>\n<g id="{}">\n'.format(name))
+
+    def end_definition(self):
+        self.f.write('</g>\n</defs>\n')
+
+    def write_uses(self, name, transforms, offset=(0, 0)):
+        """
+        Places copies of a group defined with begin_definition() with one <use> element each
+        :param name: Group id
+        :param transforms: Array of shape (K, 2, 3) of affine transforms [[a, b, tx], [c, d, ty]]
+        :param offset: (x, y) added to every translation
+        :return: None
+        """
+        for start in range(0, len(transforms), self.chunk_size):
+            chunk = transforms[start:start + self.chunk_size]
+            matrices = np.column_stack([chunk[:, 0, 0], chunk[:, 1, 0], chunk[:, 0, 1], chunk[:, 1, 1],
+                                        np.round(chunk[:, :, 2] + offset, PRECISION)])
+            self.f.write(''.join([USE_FORMAT % ((name,) + tuple(m)) for m in matrices.tolist()]))
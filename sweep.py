@@ -0,0 +1,190 @@
+import itertools
+import json
+import os
+import time
+import traceback
+import numpy as np
+from pattern import Pattern
+
+# Exporter method and file suffixes for each output format. SVG goes through the streaming writer, which does not need
+# svgwrite. PCBPattern has no SVG or STL exporter, and its generate_dxf writes a cut and an etch file.
+FORMATS = {'svg': ('write_svg', ('.svg',)),
+           'dxf': ('generate_dxf', ('.dxf',)),
+           'png': ('generate_png', ('.png',)),
+           'stl': ('generate_stl', ('.stl',)),
+           'npz': ('save', ('.npz',)),
+           'kicad_pcb': ('generate_kicad', ('.kicad_pcb',))}
+PCB_FORMATS = {'dxf': ('generate_dxf', ('_cut.dxf', '_etch.dxf')),
+               'png': ('generate_png', ('.png',)),
+               'npz': ('save', ('.npz',)),
+               'kicad_pcb': ('generate_kicad', ('.kicad_pcb',))}
+
+
+def _to_json(value):
+    # manifest fallback: NumPy values become Python values; anything else json cannot write (e.g. a setting class or a
+    # path object passed as a parameter) is recorded as its str
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def exporter(pattern, fmt):
+    """
+    :param pattern: Pattern or PCBPattern
+    :param fmt: Output format, a key of FORMATS (or of PCB_FORMATS for boards)
+    :return: (method name, file suffixes) of the format's exporter
+    """
+    exporters = FORMATS if isinstance(pattern, Pattern) else PCB_FORMATS
+    if fmt not in exporters:
+        raise ValueError("{} has no {} exporter (available: {})".format(type(pattern).__name__, fmt,
+                                                                         ', '.join(exporters)))
+    return exporters[fmt]
+
+
+def parameter_grid(**axes):
+    """
+    Every combination of the given parameter values, e.g. parameter_grid(gap=[2., 3.], s=[10., 12.]) gives 4 sets
+    :return: List of {parameter name: value} dictionaries
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def entity_counts(pattern):
+    """
+    :param pattern: Pattern or PCBPattern
+    :return: Dictionary of {kind of entity: number stored} (cell instances are counted once per placement)
+    """
+    if isinstance(pattern, Pattern):
+        counts = {'lines': pattern.lines.size, 'lines_dxf': pattern.lines_dxf.size,
+                  'circles_dxf': pattern.circles_dxf.size, 'polygons': pattern.polygons.size, 'text': len(pattern.text)}
+        for cell, transforms in pattern.instances:
+            for name, count in entity_counts(cell).items():
+                counts[name] += count*len(transforms)
+        return counts
+    names = list(pattern.POINT_FIELDS) + ['graphic_arcs', 'graphic_arcs_dxf']
+    return {name: len(getattr(pattern, name)) for name in names}
+
+
+def job_name(prefix, parameters, varying):
+    """
+    :return: File name stem listing the parameters that change across the sweep, in the style of the scripts'
+             name clarifiers (e.g. hexagon_gap=3.00_s=10.00)
+    """
+    parts = [prefix]
+    for name in varying:
+        value = parameters[name]
+        parts.append('{}={:.2f}'.format(name, value) if isinstance(value, float) else '{}={}'.format(name, value))
+    return '_'.join(parts)
+
+
+def _run_job(generator, parameters, stem, formats, export_kwargs, conn):
+    """
+    Runs in a worker process: generates one pattern, exports it and sends its manifest entry back through conn
+    """
+    entry = {'name': os.path.basename(stem), 'parameters': parameters, 'timings': {}, 'files': {}}
+    try:
+        start = time.perf_counter()
+        pattern = generator(**parameters)
+        entry['timings']['generate'] = time.perf_counter() - start
+        entry['counts'] = entity_counts(pattern)
+        for fmt in formats:
+            method, suffixes = exporter(pattern, fmt)
+            outfiles = [stem + suffix for suffix in suffixes]
+            start = time.perf_counter()
+            getattr(pattern, method)(*outfiles, **export_kwargs.get(fmt, {}))
+            entry['timings'][fmt] = time.perf_counter() - start
+            for outfile in outfiles:
+                entry['files'][os.path.basename(outfile)] = os.path.getsize(outfile)
+        entry['status'] = 'ok'
+    except Exception:
+        entry['status'] = 'error'
+        entry['error'] = traceback.format_exc()
+    conn.send(entry)
+    conn.close()
+
+
+def run_sweep(generator, parameter_sets, outdir, formats=('svg',), export_kwargs=None, timeout=None, processes=None,
+              prefix=None):
+    """
+    Runs a generator function once per parameter set across a pool of worker processes, exports every result and
+    writes outdir/manifest.json with the parameters, timings (s), entity counts and file sizes (bytes) of every job.
+    Each job runs in its own process, so one that exceeds the timeout is killed without holding up the others.
+    :param generator: Module-level function returning a Pattern or PCBPattern, called as generator(**parameters)
+    :param parameter_sets: List of keyword argument dictionaries (see parameter_grid)
+    :param outdir: Output directory (created if needed)
+    :param formats: Output formats, keys of FORMATS
+    :param export_kwargs: Dictionary of {format: keyword arguments for its exporter}
+    :param timeout: Maximum run time of each job (s), or None for no limit
+    :param processes: Number of jobs to run at once (default: every core)
+    :param prefix: File name prefix (default: the generator's name)
+    :return: List of manifest entries, in the order of parameter_sets
+    """
+    import multiprocessing.connection
+    os.makedirs(outdir, exist_ok=True)
+    export_kwargs = export_kwargs or {}
+    processes = processes or os.cpu_count() or 1
+    prefix = prefix or generator.__name__
+    varying = [name for name in parameter_sets[0]
+               if any(parameters.get(name) != parameter_sets[0][name] for parameters in parameter_sets)] \
+        if parameter_sets else []
+    stems = [os.path.join(outdir, job_name(prefix, parameters, varying)) for parameters in parameter_sets]
+    if len(set(stems)) < len(stems):
+        stems = [os.path.join(outdir, '{}_{:04d}'.format(prefix, i)) for i in range(len(parameter_sets))]
+
+    entries = [None]*len(parameter_sets)
+    pending = list(range(len(parameter_sets)))[::-1]
+    running = {}  # sentinel: (job index, process, receiving end of its pipe, start time)
+    sweep_start = time.perf_counter()
+    while pending or running:
+        while pending and len(running) < processes:
+            i = pending.pop()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run_job, args=(generator, parameter_sets[i], stems[i], formats,
+                                                                     export_kwargs, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[process.sentinel] = (i, process, receiver, time.perf_counter())
+
+        now = time.perf_counter()
+        wait = None if timeout is None else max(0., min(start + timeout for _, _, _, start in running.values()) - now)
+        # a worker's result is read as soon as it is sent, so large entries cannot block a worker on a full pipe
+        ready = multiprocessing.connection.wait([receiver for _, _, receiver, _ in running.values()] +
+                                                list(running), timeout=wait)
+        now = time.perf_counter()
+        for sentinel, (i, process, receiver, start) in list(running.items()):
+            if receiver in ready or sentinel in ready:
+                entry = receiver.recv() if receiver.poll() else {
+                    'name': os.path.basename(stems[i]), 'parameters': parameter_sets[i], 'status': 'error',
+                    'error': 'worker exited with code {}'.format(process.exitcode)}
+            elif timeout is not None and now - start >= timeout:
+                process.kill()
+                entry = {'name': os.path.basename(stems[i]), 'parameters': parameter_sets[i], 'status': 'timeout'}
+            else:
+                continue
+            process.join()
+            receiver.close()
+            entry['wall_time'] = now - start
+            entries[i] = entry
+            del running[sentinel]
+            print("[{}/{}] {}: {} ({:.2f} s)".format(sum(e is not None for e in entries), len(entries), entry['name'],
+                                                      entry['status'], entry['wall_time']))
+
+    with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+        json.dump({'generator': generator.__module__ + '.' + generator.__name__, 'formats': list(formats),
+                   'processes': processes, 'timeout': timeout, 'wall_time': time.perf_counter() - sweep_start,
+                   'jobs': entries}, f, indent=2, default=_to_json)
+    return entries
+
+
+if __name__ == '__main__':
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+    from generate_hexagon_pattern import generate_hexagon_pattern
+
+    base = dict(nx=6, ny=8, s=10., buffer_height=20., seamhole_diameter=3., spring_radius=0.6, spring_gap=0.7,
+                spring_thickness=0.5)
+    sweep = [dict(base, **parameters) for parameters in parameter_grid(gap=[2., 2.5, 3.], spring_thickness=[0.4, 0.5])]
+    run_sweep(generate_hexagon_pattern, sweep, 'patterns/sweep_hexagon', formats=('svg', 'dxf'), timeout=60.)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the library is a set of flat modules at the repository root, imported by name like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from geometry import arc_segment_counts
+from pattern import Pattern
+from settings import LaserCutter
+
+ARCS = [((0, 0), 0.05, 0., 2*np.pi), ((3, -2), 1., 0.2, 1.1), ((-10, 4), 12.5, -2., 3.), ((50, 50), 400., 1., 1.3),
+        ((1, 1), 5., 2., -1.5)]  # the last one runs clockwise
+
+
+class FineCutter(LaserCutter):
+    ARC_TOLERANCE = 0.001
+
+
+def chord_errors(points, center, radius):
+    """
+    :return: Largest distance between each chord and its arc, i.e. how far the chord's midpoint is inside the circle
+    """
+    midpoints = (points[:-1] + points[1:])/2
+    return radius - np.hypot(*(midpoints - center).T)
+
+
+def check_arc_points(points, center, radius, start_angle, end_angle, tolerance):
+    points, center = np.asarray(points), np.asarray(center, dtype=np.float64)
+    assert np.allclose(np.hypot(*(points - center).T), radius)
+    assert np.allclose(points[[0, -1]], center + radius*np.array([[np.cos(start_angle), np.sin(start_angle)],
+                                                                   [np.cos(end_angle), np.sin(end_angle)]]))
+    assert chord_errors(points, center, radius).max() <= tolerance*(1 + 1e-9)
+
+
+def test_arc_segment_counts_use_as_few_chords_as_the_tolerance_allows():
+    rng = np.random.default_rng(1)
+    radii = 10**rng.uniform(-2, 3, 1000)
+    sweeps = rng.uniform(-2*np.pi, 2*np.pi, 1000)
+    tolerance = LaserCutter.ARC_TOLERANCE
+    counts = arc_segment_counts(radii, sweeps, tolerance)
+    assert counts.min() >= 1
+    steps = np.abs(sweeps)/counts
+    assert np.all(radii*(1 - np.cos(steps/2)) <= tolerance*(1 + 1e-9))
+    assert np.all(steps <= 2*np.pi/3 + 1e-12)
+    # one chord less would either stray too far or span more than 120 degrees
+    fewer = np.abs(sweeps)/np.maximum(counts - 1, 1)
+    assert np.all((counts == 1) | (radii*(1 - np.cos(fewer/2)) > tolerance) | (fewer > 2*np.pi/3))
+
+
+@pytest.mark.parametrize('setting', [LaserCutter, FineCutter])
+@pytest.mark.parametrize('center, radius, start_angle, end_angle', ARCS)
+def test_add_arc_chords_stay_within_the_settings_tolerance(setting, center, radius, start_angle, end_angle):
+    p = Pattern(setting=setting)
+    p.add_arc(center, radius, start_angle=start_angle, end_angle=end_angle)
+    segments = p.lines.segments
+    assert np.array_equal(segments[1:, 0], segments[:-1, 1])
+    points = np.concatenate([segments[:, 0], segments[-1:, 1]])
+    check_arc_points(points, center, radius, start_angle, end_angle, setting.ARC_TOLERANCE)
+    assert len(segments) == arc_segment_counts(radius, end_angle - start_angle, setting.ARC_TOLERANCE)
+
+
+@pytest.mark.parametrize('tolerance', [LaserCutter.ARC_TOLERANCE, 0.001])
+@pytest.mark.parametrize('center, radius, start_angle, end_angle', ARCS)
+def test_generate_discretized_arc_stays_within_tolerance(tolerance, center, radius, start_angle, end_angle):
+    points = Pattern.generate_discretized_arc(center, radius, start_angle, end_angle, tolerance=tolerance)
+    check_arc_points(points, center, radius, start_angle, end_angle, tolerance)
+
+
+@pytest.mark.parametrize('n', [2, 3, 6, 33])
+def test_an_explicit_n_gives_the_same_points_as_before(n):
+    """
+    As before adaptive discretization, n counts the points of each arc (ends inclusive), so there are n - 1 chords
+    """
+    center, radius, start_angle, end_angle = (3, -2), 1., 0.2, 4.
+    theta = np.linspace(start_angle, end_angle, n)
+    expected = np.column_stack([center[0] + radius*np.cos(theta), center[1] + radius*np.sin(theta)])
+
+    assert np.allclose(Pattern.generate_discretized_arc(center, radius, start_angle, end_angle, n), expected)
+    p = Pattern()
+    p.add_arc(center, radius, n, start_angle, end_angle)
+    p.add_circle(center, radius, n)
+    p.add_arcs([center, center], radius, start_angle, end_angle, n=n)
+    assert len(p.lines) == 4*(n - 1)
+    segments = p.lines.segments.reshape(4, n - 1, 2, 2)
+    for arc in segments[[0, 2, 3]]:
+        assert np.allclose(arc[:, 0], expected[:-1]) and np.allclose(arc[:, 1], expected[1:])
+    assert np.allclose(segments[1, 0, 0], (4, -2)) and np.allclose(segments[1, -1, 1], (4, -2))
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from pattern import Pattern
+from settings import LaserCutter
+
+P1 = np.array([(0., 0.), (10., 2.), (-3., 4.), (5., 5.)])
+P2 = np.array([(4., 1.), (12., 9.), (-8., 4.), (5., -5.)])
+MODES = np.array([LaserCutter.CUT, LaserCutter.ENGRAVE, LaserCutter.CUT, LaserCutter.ENGRAVE])
+
+
+def assert_same_geometry(p, q):
+    for name in Pattern.BUFFERS:
+        for field, column in getattr(p, name).columns().items():
+            np.testing.assert_allclose(getattr(q, name).columns()[field], column, err_msg=name + '/' + field)
+
+
+@pytest.mark.parametrize('kerf', [None, 0.3, [0.1, 0.2, 0.3, 0.4]])
+@pytest.mark.parametrize('update_dxf', [True, False])
+def test_add_segments_matches_add_line(kerf, update_dxf):
+    p = Pattern()
+    for i in range(len(P1)):
+        p.add_line(P1[i], P2[i], kerf=None if kerf is None else np.broadcast_to(kerf, 4)[i], mode=MODES[i],
+                   update_dxf=update_dxf)
+    q = Pattern()
+    q.add_segments(P1, P2, kerf=kerf, mode=MODES, update_dxf=update_dxf)
+    assert_same_geometry(p, q)
+
+
+def test_nan_kerfs_give_straight_lines():
+    q = Pattern()
+    q.add_segments(P1, P2, kerf=[np.nan, 0.2, np.nan, 0.4], mode=MODES)
+    p = Pattern()
+    p.add_segments(P1[[0, 2]], P2[[0, 2]], mode=MODES[[0, 2]])  # straight lines come first
+    p.add_segments(P1[[1, 3]], P2[[1, 3]], kerf=[0.2, 0.4], mode=MODES[[1, 3]])
+    assert_same_geometry(p, q)
+
+
+def test_add_lines_draws_a_polyline():
+    points = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    p = Pattern()
+    p.add_lines(points, mode=LaserCutter.ENGRAVE)
+    assert np.array_equal(p.lines.segments, [[(0, 0), (1, 0)], [(1, 0), (1, 1)], [(1, 1), (0, 1)]])
+    assert np.array_equal(p.lines_dxf.segments, p.lines.segments) and np.all(p.lines.mode == LaserCutter.ENGRAVE)
+
+
+@pytest.mark.parametrize('n', [None, 7])
+def test_add_arcs_and_add_circles_match_one_call_per_arc(n):
+    centers = np.array([(0., 0.), (5., 1.), (-2., 8.)])
+    radii = np.array([1., 0.5, 12.])
+    start_angles, end_angles = np.array([0., 1., -2.]), np.array([np.pi, 4., 0.5])
+    p = Pattern()
+    for i in range(len(centers)):
+        p.add_arc(centers[i], radii[i], n, start_angles[i], end_angles[i], mode=MODES[i])
+    for i in range(len(centers)):
+        p.add_circle(centers[i], radii[i], n, mode=MODES[i])
+    q = Pattern()
+    q.add_arcs(centers, radii, start_angles, end_angles, n=n, mode=MODES[:3])
+    q.add_circles(centers, radii, n=n, mode=MODES[:3])
+    assert_same_geometry(p, q)
+    assert len(q.circles_dxf) == 6
@@ -0,0 +1,77 @@
+import numpy as np
+
+from geometry import ArcBuffer, PolygonBuffer, SegmentBuffer
+
+
+def test_appends_grow_the_capacity_by_doubling_and_keep_the_records():
+    buf = SegmentBuffer(capacity=2)
+    capacities = []
+    for i in range(9):
+        buf.append((i, 0), (i, 1), i%3)
+        capacities.append(buf.capacity)
+    assert capacities == [2, 2, 4, 4, 8, 8, 8, 8, 16]
+    assert len(buf) == 9
+    assert np.array_equal(buf.segments[:, 0, 0], np.arange(9)) and np.array_equal(buf.segments[:, 1, 1], np.ones(9))
+    assert np.array_equal(buf.mode, np.arange(9)%3)
+
+
+def test_extend_grows_to_fit_a_large_batch_at_once():
+    buf = SegmentBuffer(capacity=4)
+    buf.extend(np.zeros((3, 2, 2)), 1)
+    buf.extend(np.ones((20, 2, 2)), 2)  # more than double the capacity
+    assert buf.capacity == 23 and len(buf) == 23
+    assert np.array_equal(buf.mode, [1]*3 + [2]*20)
+    buf.extend(np.ones((1, 2, 2)), 0)
+    assert buf.capacity == 46
+
+
+def test_reserve_only_reallocates_when_needed():
+    buf = ArcBuffer(capacity=8)
+    buf.extend([(0, 0)]*5, 1., 0., np.pi, 0)
+    center = buf._data['center']
+    buf.reserve(3)
+    assert buf._data['center'] is center
+    buf.reserve(4)
+    assert buf.capacity == 16 and np.array_equal(buf.center, np.zeros((5, 2)))
+
+
+def test_columns_are_views_of_the_stored_records():
+    buf = ArcBuffer(capacity=16)
+    buf.extend([(1, 2), (3, 4)], [1., 2.], 0., [np.pi, 2*np.pi], [0, 1])
+    columns = buf.columns()
+    assert set(columns) == set(ArcBuffer.FIELDS)
+    assert all(len(column) == 2 for column in columns.values())
+    assert np.shares_memory(columns['radius'], buf._data['radius'])
+    assert np.array_equal(columns['end_angle'], [np.pi, 2*np.pi]) and np.array_equal(buf.column('mode'), [0, 1])
+    assert buf.nbytes == 2*(2*8 + 3*8 + 1)  # spare capacity is not counted
+
+
+def test_copy_take_and_clear():
+    buf = SegmentBuffer()
+    buf.extend(np.arange(24.).reshape(6, 2, 2), [0, 1, 2, 0, 1, 2])
+    other = buf.copy()
+    other.segments[0] = -1
+    assert buf.segments[0, 0, 0] == 0
+    taken = buf.take(buf.mode == 2)
+    assert np.array_equal(taken.segments, buf.segments[[2, 5]])
+    capacity = buf.capacity
+    buf.clear()
+    assert len(buf) == 0 and buf.capacity == capacity and len(other) == 6
+
+
+def test_polygons_share_one_growing_vertex_buffer():
+    polygons = PolygonBuffer(capacity=1)
+    squares = [np.array([(0, 0), (1, 0), (1, 1), (0, 1)]) + k for k in range(5)]
+    for k, square in enumerate(squares):
+        polygons.append(square, k)
+    polygons.extend(np.concatenate([[(0, 0), (2, 0), (0, 2)], [(5, 5), (6, 5), (6, 6), (5, 7), (4, 6)]]), [3, 5], 7)
+    assert len(polygons) == 7 and len(polygons.vertices) == 28
+    assert polygons.capacity >= 7 and polygons.vertices.capacity >= 28
+    assert np.array_equal(polygons.offset, [0, 4, 8, 12, 16, 20, 23])
+    assert np.array_equal(polygons.count, [4]*5 + [3, 5])
+    for (pts, mode), square, k in zip(polygons, squares, range(5)):
+        assert np.array_equal(pts, square) and mode == k
+    pts, mode = polygons.polygon(6)
+    assert len(pts) == 5 and mode == 7
+    segments, modes = polygons.edges()
+    assert len(segments) == 28 and np.array_equal(segments[3], [(0, 1), (0, 0)])  # closing edge of the first square
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('ezdxf')
+import cache
+
+
+def test_library_version_covers_every_module():
+    for name in ('pattern', 'polygon_merge', 'regions', 'dxf_reader', 'kicad_reader', 'stl_writer'):
+        assert name in cache.library_modules()
+
+
+def test_library_version_follows_module_sources(tmp_path, monkeypatch):
+    (tmp_path / 'geometry.py').write_text('x = 1\n')
+    monkeypatch.setattr(cache, 'LIBRARY_ROOT', str(tmp_path))
+    cache.library_version.cache_clear()
+    try:
+        before = cache.library_version()
+        cache.library_version.cache_clear()
+        assert cache.library_version() == before
+        (tmp_path / 'geometry.py').write_text('x = 2\n')
+        cache.library_version.cache_clear()
+        edited = cache.library_version()
+        (tmp_path / 'polygon_merge.py').write_text('')
+        cache.library_version.cache_clear()
+        assert len({before, edited, cache.library_version()}) == 3
+    finally:
+        cache.library_version.cache_clear()
+
+
+def square(size):
+    from pattern import Pattern
+    p = Pattern()
+    p.add_rectangle((0, 0), (size, size))
+    p.add_circle((size/2, size/2), size/4)
+    return p
+
+
+def test_exports_follow_changes_made_after_generation(tmp_path):
+    c = cache.GenerationCache(str(tmp_path / 'cache'))
+    gen = c.cached(square)
+    p = gen(3.)
+    c.export(p, 'generate_dxf', str(tmp_path / 'a.dxf'))
+    assert gen(3.).cache_key == p.cache_key and c.hits == 1
+    c.export(gen(3.), 'generate_dxf', str(tmp_path / 'same.dxf'))
+    assert c.hits == 3
+    assert (tmp_path / 'same.dxf').read_bytes() == (tmp_path / 'a.dxf').read_bytes()
+
+    p.add_line((0, 0), (3, 3))
+    assert c.export(p, 'generate_dxf', str(tmp_path / 'b.dxf')) is not None  # exported, not copied
+    assert (tmp_path / 'b.dxf').read_bytes() != (tmp_path / 'a.dxf').read_bytes()
+    p.translate(1, 0)
+    assert c.export(p, 'generate_dxf', str(tmp_path / 'c.dxf')) is not None
+    assert c.export(p, 'generate_dxf', str(tmp_path / 'd.dxf')) is None
+    assert (tmp_path / 'd.dxf').read_bytes() == (tmp_path / 'c.dxf').read_bytes() != (tmp_path / 'b.dxf').read_bytes()
+
+
+def test_geometry_digest_covers_cells_and_boards():
+    from pattern import Pattern
+    cell = square(1.)
+    p, q = Pattern(), Pattern()
+    p.add_instances(cell, np.array([[0., 0.], [2., 0.]]))
+    q.add_instances(cell, np.array([[0., 0.], [2., 0.]]))
+    assert cache.geometry_digest(p) == cache.geometry_digest(q)
+    cell.add_line((0, 0), (1, 1))
+    assert cache.geometry_digest(p) != cache.geometry_digest(square(1.))
+    before = cache.geometry_digest(p)
+    p.parameters['n'] = 2
+    assert cache.geometry_digest(p) == before
+
+    pytest.importorskip('shapely')
+    from pcb_layout_plus_dxf import PCBPattern
+    board = PCBPattern()
+    board.add_trace([(0, 0), (5, 5)], 0.5, "1 main")
+    before = cache.geometry_digest(board)
+    board.add_via((5, 5))
+    assert cache.geometry_digest(board) != before
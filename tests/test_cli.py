@@ -0,0 +1,14 @@
+import inspect
+
+import pytest
+
+import dxf_stl_renderer as cli
+
+
+@pytest.mark.parametrize('name', sorted(cli.GENERATORS))
+def test_registered_generators_run_with_their_defaults(name):
+    generator, defaults = cli.load_generator(name)
+    parameters = inspect.signature(generator).parameters
+    assert set(defaults) <= set(parameters)
+    assert all(parameter.default is not inspect.Parameter.empty or parameter_name in defaults
+               for parameter_name, parameter in parameters.items())
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('ezdxf')
+from pattern import Pattern
+
+
+def make_pattern():
+    p = Pattern()
+    p.add_line((0, 0), (10, 0))
+    p.add_line((10, 0), (10, 5))  # joined to the first line with join_paths
+    p.add_line((3, 3), (4, 8))
+    p.add_rectangle((20, 0), (25, 4))
+    p.add_circle((-5, -5), 2)
+    p.add_arc((0, 20), 3, start_angle=0.25, end_angle=2.)
+    return p
+
+
+def line_set(p):
+    polygon_edges, _ = p.polygons.edges()
+    segments = np.round(np.concatenate([p.lines_dxf.segments, polygon_edges]).reshape(-1, 4), 6)
+    return {min((a, b), (c, d)) + max((a, b), (c, d)) for a, b, c, d in segments.tolist()}
+
+
+def arc_set(p):
+    arcs = p.circles_dxf
+    sweep = np.abs(arcs.end_angle - arcs.start_angle)
+    start = np.where(sweep >= 2*np.pi - 1e-9, 0., np.minimum(arcs.start_angle, arcs.end_angle)%(2*np.pi))
+    return set(map(tuple, np.round(np.column_stack([arcs.center, arcs.radius, start, sweep]), 6).tolist()))
+
+
+@pytest.mark.parametrize('join_paths', [False, True])
+def test_read_dxf_returns_the_written_geometry(tmp_path, join_paths):
+    p = make_pattern()
+    p.generate_dxf(str(tmp_path / 'p.dxf'), join_paths=join_paths)
+    q = Pattern.read_dxf(str(tmp_path / 'p.dxf'))
+    assert line_set(q) == line_set(p)
+    assert arc_set(q) == arc_set(p)
+    assert len(arc_set(p)) == 2
+
+    # and the imported pattern exports the same entities again
+    q.generate_dxf(str(tmp_path / 'q.dxf'))
+    r = Pattern.read_dxf(str(tmp_path / 'q.dxf'))
+    assert line_set(r) == line_set(p) and arc_set(r) == arc_set(p)
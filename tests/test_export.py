@@ -0,0 +1,67 @@
+import re
+
+import numpy as np
+import pytest
+
+pytest.importorskip('ezdxf')
+from pattern import Pattern
+
+
+def make_pattern():
+    cell = Pattern()
+    cell.add_line((0, 0), (4, 0))
+    cell.add_circle((2, 2), 1)
+    p = Pattern()
+    p.add_line((0, 0), (10, 0))
+    p.add_arc((0, 20), 3, start_angle=0.25, end_angle=2.)
+    p.add_rectangle((20, 0), (25, 4))
+    p.add_instances(cell, np.array([[0., 30.], [10., 30.], [20., 30.]]))
+    return p.rotate(0.3, origin=(5, 5))
+
+
+def assert_same_file(path, expected_path):
+    """
+    Compares two exported files line by line. Numbers may differ in their last digits, as export() folds the offset
+    into the transform instead of adding it afterwards, and DXF files differ in the GUIDs and timestamps that ezdxf
+    writes into every file.
+    """
+    with open(path, 'rb') as f, open(expected_path, 'rb') as g:
+        lines, expected = f.read().split(b'\n'), g.read().split(b'\n')
+    assert len(lines) == len(expected), path
+    for line, expected_line in zip(lines, expected):
+        if line == expected_line or re.fullmatch(rb'\{[0-9A-F-]{36}\}|\S+ @ \S+', expected_line.strip()):
+            continue
+        assert np.isclose(float(line), float(expected_line), rtol=1e-12, atol=0), (path, line, expected_line)
+
+
+@pytest.mark.parametrize('threads', [False, True])
+def test_pattern_export_writes_the_same_files_as_the_single_exporters(tmp_path, threads):
+    p = make_pattern()
+    outfiles = {fmt: str(tmp_path/('all.' + fmt)) for fmt in ('svg', 'dxf', 'png')}
+    results = p.export(outfiles, offset_x=5, offset_y=-3, options={'png': {'dpi': 150}}, threads=threads)
+    assert set(results) == set(outfiles)
+
+    p.write_svg(str(tmp_path/'one.svg'), offset_x=5, offset_y=-3)
+    p.generate_dxf(str(tmp_path/'one.dxf'), offset_x=5, offset_y=-3)
+    assert results['png'] == p.generate_png(str(tmp_path/'one.png'), dpi=150)
+    for fmt, outfile in outfiles.items():
+        assert_same_file(outfile, str(tmp_path/('one.' + fmt)))
+    assert np.array_equal(p.transform, make_pattern().transform)  # the pattern itself is left as it was
+
+
+@pytest.mark.parametrize('threads', [False, True])
+def test_pcb_export_writes_the_same_files_as_the_single_exporters(tmp_path, threads):
+    pytest.importorskip('shapely')
+    from test_kicad import make_board
+    board = make_board()
+    names = {'kicad_pcb': 'board.kicad_pcb', 'cut': 'cut.dxf', 'etch': 'etch.dxf', 'png': 'board.png'}
+    all_files = {key: str(tmp_path/('all_' + name)) for key, name in names.items()}
+    one_files = {key: str(tmp_path/('one_' + name)) for key, name in names.items()}
+    board.export({'kicad_pcb': all_files['kicad_pcb'], 'dxf': (all_files['cut'], all_files['etch']),
+                  'png': all_files['png']}, options={'dxf': {'etch_layers': ("F.Cu", "B.Cu")}}, threads=threads)
+
+    board.generate_kicad(one_files['kicad_pcb'])
+    board.generate_dxf(one_files['cut'], one_files['etch'], etch_layers=("F.Cu", "B.Cu"))
+    board.generate_png(one_files['png'])
+    for key in names:
+        assert_same_file(all_files[key], one_files[key])
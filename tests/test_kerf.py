@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from geometry import kerf_slots
+from pattern import Pattern
+
+
+def baseline_slot(p1, p2, kerf, n):
+    """
+    The per-slot expansion of Pattern.add_line before it was vectorized, with its two add_arc calls inlined
+    :return: (lines, dxf_lines, arcs) in the order the old code appended them
+    """
+    p1, p2 = np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64)
+    theta = np.arctan2(p2[1] - p1[1], p2[0] - p1[0])
+    R = np.array([[np.cos(theta), -np.sin(theta)],
+                  [np.sin(theta), np.cos(theta)]])
+    p1top = p1 + R@[kerf, kerf]
+    p2top = p2 + R@[-kerf, kerf]
+    p1bot = p1 + R@[kerf, -kerf]
+    p2bot = p2 + R@[-kerf, -kerf]
+    p1mid = p1 + R@[kerf, 0]
+    p2mid = p2 + R@[-kerf, 0]
+
+    def arc(center, start_angle, end_angle):
+        theta_range = np.linspace(start_angle, end_angle, n)
+        pts = [(center[0] + kerf*np.cos(t), center[1] + kerf*np.sin(t)) for t in theta_range]
+        return [(pts[i], pts[i + 1]) for i in range(n - 1)], (center, kerf, start_angle, end_angle)
+
+    far_cap, far_arc = arc(p2mid, theta + np.pi/2, theta - np.pi/2)
+    near_cap, near_arc = arc(p1mid, theta - np.pi/2, theta - 3*np.pi/2)
+    lines = [(p1top, p2top)] + far_cap + [(p2bot, p1bot)] + near_cap
+    return lines, [(p1top, p2top), (p2bot, p1bot)], [far_arc, near_arc]
+
+
+P1 = np.array([(0., 0.), (10., 2.), (-3., 4.), (5., 5.), (1., 1.)])
+P2 = np.array([(4., 1.), (12., 9.), (-8., 4.), (5., -5.), (1., 3.)])
+KERFS = np.array([0.1, 0.25, 0.05, 0.5, 0.2])
+
+
+@pytest.mark.parametrize('n', [2, 4, 9])
+def test_kerf_slots_match_the_per_slot_expansion(n):
+    segments, dxf_lines, (centers, radii, start_angles, end_angles) = kerf_slots(P1, P2, KERFS, n)
+    assert segments.shape == (len(P1)*2*n, 2, 2) and dxf_lines.shape == (len(P1)*2, 2, 2)
+    for i in range(len(P1)):
+        lines, expected_dxf_lines, arcs = baseline_slot(P1[i], P2[i], KERFS[i], n)
+        np.testing.assert_allclose(segments[i*2*n:(i + 1)*2*n], np.array(lines), atol=1e-12)
+        np.testing.assert_allclose(dxf_lines[2*i:2*i + 2], np.array(expected_dxf_lines), atol=1e-12)
+        for k, (center, radius, start_angle, end_angle) in enumerate(arcs):
+            j = 2*i + k
+            np.testing.assert_allclose(centers[j], center, atol=1e-12)
+            assert np.isclose(radii[j], radius) and np.isclose(start_angles[j], start_angle) and \
+                np.isclose(end_angles[j], end_angle)
+
+
+def test_kerfed_lines_are_added_as_before():
+    n = 5
+    p = Pattern()
+    p.add_line(P1[0], P2[0], kerf=KERFS[0], n=n, mode=1)
+    p.add_segments(P1[1:], P2[1:], kerf=KERFS[1:], n=n, mode=0)
+    expected = [baseline_slot(P1[i], P2[i], KERFS[i], n) for i in range(len(P1))]
+    np.testing.assert_allclose(p.lines.segments, np.concatenate([lines for lines, _, _ in expected]), atol=1e-12)
+    np.testing.assert_allclose(p.lines_dxf.segments, np.concatenate([dxf for _, dxf, _ in expected]), atol=1e-12)
+    np.testing.assert_allclose(p.circles_dxf.radius, np.repeat(KERFS, 2))
+    assert np.array_equal(p.lines.mode, [1]*2*n + [0]*(len(P1) - 1)*2*n)
+    assert np.array_equal(p.circles_dxf.mode, [1, 1] + [0]*(len(P1) - 1)*2)
@@ -0,0 +1,74 @@
+import pytest
+from pcb_layout_plus_dxf import PCBPattern
+
+ezdxf = pytest.importorskip('ezdxf')
+pytest.importorskip('shapely')
+
+
+def make_board():
+    p = PCBPattern()
+    p.add_graphic_line([(0, 0), (50, 0), (50, 50), (0, 50), (0, 0)])
+    p.add_trace([(5, 5), (20, 5), (20, 20)], 0.5, "1 main")
+    p.add_trace([(5, 30), (20, 30)], 0.5, "2 gnd", layer="B.Cu")
+    p.add_fill_zone_rectangle((30, 30), (40, 40), "2 gnd")
+    p.add_via((20, 20), net="1 main")
+    p.add_A05P5((30, 10), 0, "PS1", "1 main", "2 gnd", "1 main", "1 main", "2 gnd")
+    return p
+
+
+def etch_segments(board, tmp_path, name):
+    """
+    :return: Set of the non-degenerate etch DXF lines of a board, as undirected rounded segments
+    """
+    cut, etch = str(tmp_path/(name + '_cut.dxf')), str(tmp_path/(name + '_etch.dxf'))
+    board.generate_dxf(cut, etch, etch_layers=("F.Cu", "B.Cu"))
+    segments = set()
+    for e in ezdxf.readfile(etch).modelspace():
+        start = (round(e.dxf.start[0], 4), round(e.dxf.start[1], 4))
+        end = (round(e.dxf.end[0], 4), round(e.dxf.end[1], 4))
+        if start != end:
+            segments.add(tuple(sorted([start, end])))
+    return segments
+
+
+@pytest.mark.parametrize('version', [5, 6])
+def test_reread_board_etches_like_original(tmp_path, version):
+    board = make_board()
+    outfile = str(tmp_path/'board.kicad_pcb')
+    board.generate_kicad(outfile, net_names=("main", "gnd"), kicad_version=version)
+    original = etch_segments(board, tmp_path, 'original')
+    assert original
+
+    assert etch_segments(PCBPattern.read_kicad(outfile, footprint_holes=False), tmp_path, 'plain') == original
+    # the footprint's pad rings add copper but must not switch etching off for the layer
+    assert len(etch_segments(PCBPattern.read_kicad(outfile), tmp_path, 'holes')) > len(original)
+
+
+@pytest.mark.parametrize('version', [5, 6])
+def test_kicad_round_trip_records(tmp_path, version):
+    board = make_board()
+    board.add_M2_drill((45, 45), True)
+    board.add_pin_header((10, 40), 4, 1, net_names=["1 main", "2 gnd", "1 main", "2 gnd"])
+    outfile = str(tmp_path/'board.kicad_pcb')
+    board.generate_kicad(outfile, net_names=("main", "gnd"), kicad_version=version)
+    loaded = PCBPattern.read_kicad(outfile)
+    assert [(pts, width, net, layer) for pts, width, net, layer, cut, etch in loaded.traces] == \
+           [([tuple(map(float, pt)) for pt in pts], width, net, layer)
+            for pts, width, net, layer, cut, etch in board.traces]
+    assert [(pts, layer) for pts, *_, layer, net, name, cut, etch in loaded.polygons] == \
+           [([tuple(map(float, pt)) for pt in pts], layer) for pts, *_, layer, net, name, cut, etch in board.polygons]
+    assert loaded.m2 == board.m2
+    assert loaded.pin_headers == board.pin_headers
+    assert [via[:2] for via in loaded.vias] == [via[:2] for via in board.vias]
+    assert 'A05P' in loaded.extras
+
+
+def test_kicad6_output_is_deterministic(tmp_path):
+    board = make_board()
+    first, second = str(tmp_path/'a.kicad_pcb'), str(tmp_path/'b.kicad_pcb')
+    board.generate_kicad(first, kicad_version=6)
+    board.generate_kicad(second, kicad_version=6)
+    text = open(first).read()
+    assert text == open(second).read()
+    assert text.count('(') == text.count(')')
+    assert '(footprint ' in text and '(module ' not in text
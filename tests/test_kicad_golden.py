@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+
+import pcb_layout
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+NETS = tuple('{} net{}'.format(k, k) for k in range(1, 68))
+# (helper, positional arguments, keyword arguments), each rendered with both line starts when the helper takes one
+CASES = [('add_fill_zone_rectangle', ((1, 2), (11, 7)), {'net_number': 2, 'net_name': 'gnd'}),
+         ('add_fill_zone_rounded_rectangle', ((0, 0), (10, 5), 1.5), {'N': 4, 'layer': 'B.Cu'}),
+         ('add_fill_zone_polygon', ([(0, 0), (5, 0), (5, 5)],), {'layer': 'B.Cu', 'net_number': 3}),
+         ('add_boundary', ([(0, 0), (30, 0), (30, 20), (0, 20), (0, 0)],), {}),
+         ('add_text', ('PS1', (3, 4)), {'angleCCW': 90}),
+         ('add_trace', ([(0, 0), (5, 5), (10, 5)], 0.5, 'B.Cu', 2), {}),
+         ('add_arc', ((5, 5), 2, 0.3, 2.), {}),
+         ('add_via', ((3, 3),), {'net_number': 2}),
+         ('add_M2_drill_nonplated', ((4, 4),), {}),
+         ('add_M2_drill_plated', ((6, 6),), {}),
+         ('add_pin_header', ((0, 0), 3, 2), {'net_names': ('a', 'b', 'c', 'd', 'e', 'f')}),
+         ('add_pin_header', ((1, 1), 2, 1), {}),
+         ('add_pin_header_single', ((2, 2),), {'net_name': 'main', 'reference': 'J1'}),
+         ('add_STB12NM60N', ((10, 10), 90, 'drain', 'source', 'gate', 'Q1'), {}),
+         ('add_resistor_1206', ((5, 5), 45, 'R1', 'a', 'b', '1k'), {}),
+         ('add_A05P5', ((30, 10), 0, 'PS1', '1 main', '2 gnd', '1 main', '1 main', '2 gnd'), {}),
+         ('add_teensy41', ((50, 50), 180, 'U1', NETS), {}),
+         ('add_header', (), {'net_names': ('main', 'gnd'), 'net_classes': (0, 1)}),
+         ('add_footer', (), {})]
+LINESTARTS = ['  ', '\t\t']
+
+
+def render_cases(module):
+    """
+    :param module: pcb_layout, or another module with the same helpers
+    :return: Dictionary of {case id: KiCad 5 text}
+    """
+    outputs = {}
+    for i, (name, args, kwargs) in enumerate(CASES):
+        if name in ('add_header', 'add_footer'):
+            outputs['{} {}'.format(i, name)] = getattr(module, name)(*args, **kwargs)
+            continue
+        for linestart in LINESTARTS:
+            outputs['{} {} {!r}'.format(i, name, linestart)] = getattr(module, name)(*args, linestart=linestart,
+                                                                                     **kwargs)
+    return outputs
+
+
+def load_golden(name):
+    with open(os.path.join(DATA, name)) as f:
+        return json.load(f)
+
+
+def test_helpers_write_the_golden_kicad5_text():
+    golden = load_golden('kicad5_helpers.json')
+    outputs = render_cases(pcb_layout)
+    assert sorted(outputs) == sorted(golden)
+    for case, text in outputs.items():
+        assert text == golden[case], case
+
+
+@pytest.mark.parametrize('to_file', [False, True])
+def test_kicad_writer_streams_the_golden_text(tmp_path, to_file):
+    golden = load_golden('kicad5_helpers.json')
+    outfile = str(tmp_path / 'board.kicad_pcb') if to_file else None
+    with pcb_layout.KiCadWriter(outfile) as kicad:
+        kicad.write_header(net_names=('main', 'gnd'), net_classes=(0, 1))
+        for name, args, kwargs in CASES[:-2]:
+            kicad.write(getattr(pcb_layout, name)(*args, **kwargs))
+        kicad.write(pcb_layout.add_footer())
+        text = None if to_file else kicad.getvalue()
+    if to_file:
+        with open(outfile) as f:
+            text = f.read()
+    header, footer = golden['{} add_header'.format(len(CASES) - 2)], golden['{} add_footer'.format(len(CASES) - 1)]
+    body = ''.join(golden['{} {} {!r}'.format(i, name, '  ')] for i, (name, _, _) in enumerate(CASES[:-2]))
+    assert text == header + body + footer
+
+
+def test_add_footprint_places_the_registered_templates():
+    assert {'M2_drill_nonplated', 'M2_drill_plated', 'pin_header_start', 'pin_header_end', 'pin_header_single',
+            'STB12NM60N', 'resistor_1206', 'A05P5', 'teensy41'} <= set(pcb_layout.FOOTPRINTS)
+    text = pcb_layout.add_footprint('resistor_1206', x=5, y=5, angle=45, reference='R1', net1='a', net2='b', value='1k',
+                                    linestart='\t\t')
+    assert text == load_golden('kicad5_helpers.json')["14 add_resistor_1206 '\\t\\t'"]
+
+
+def test_board_writes_the_golden_kicad5_file(tmp_path):
+    pytest.importorskip('shapely')
+    from pcb_layout_plus_dxf import PCBPattern
+    board = PCBPattern()
+    board.add_graphic_line([(0, 0), (60, 0), (60, 40), (0, 40), (0, 0)])
+    board.add_trace([(5, 5), (20, 5), (20, 20)], 0.5, "1 main")
+    board.add_trace([(5, 30), (20, 30)], 0.5, "2 gnd", layer="B.Cu")
+    board.add_fill_zone_rectangle((30, 30), (40, 38), "2 gnd")
+    board.add_via((20, 20), net="1 main")
+    board.add_M2_drill((50, 5), plated=True)
+    board.add_M2_drill((50, 35), plated=False)
+    board.add_pin_header((40, 10), nx=2, ny=1, net_names=("1 main", "2 gnd"))
+    board.add_pin_header((40, 20), net_names=("1 main",), references=("J2",))
+    board.add_resistor_1206((10, 15), 90, "R1", "1 main", "2 gnd", "10k")
+    board.add_A05P5((30, 10), 0, "PS1", "1 main", "2 gnd", "1 main", "1 main", "2 gnd")
+    outfile = str(tmp_path / 'board.kicad_pcb')
+    board.generate_kicad(outfile, offset_x=3.5, offset_y=-2.25, net_names=("main", "gnd"), net_classes=(0, 1))
+    with open(outfile) as f, open(os.path.join(DATA, 'board_kicad5.kicad_pcb')) as g:
+        assert f.read() == g.read()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+shapely = pytest.importorskip('shapely')
+from shapely.geometry import Polygon, box
+from polygon_merge import connected_groups, merge_polygons
+
+
+def test_groups_follow_touching_chains():
+    polygons = [box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1), box(10, 10, 11, 11), box(10.5, 10.5, 12, 12)]
+    labels = connected_groups(polygons)
+    assert labels.tolist() == [0, 0, 0, 3, 3]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_grouped_union_matches_single_union(processes):
+    rng = np.random.default_rng(0)
+    corners, sizes = rng.uniform(0, 50, (300, 2)), rng.uniform(0.5, 4, (300, 2))
+    polygons = [box(x, y, x + w, y + h) for (x, y), (w, h) in zip(corners, sizes)]
+    merged, groups = merge_polygons(polygons, processes=processes, batch_vertices=50)
+    assert groups > 1
+    assert all(shapely.is_valid(merged))
+    union = shapely.union_all(polygons)
+    assert abs(sum(polygon.area for polygon in merged) - union.area) < 1e-9
+    assert shapely.symmetric_difference(shapely.union_all(merged), union).area < 1e-9
+
+
+def test_invalid_polygons_are_repaired():
+    bowtie = Polygon([(0, 0), (2, 2), (2, 0), (0, 2)])
+    alone = Polygon([(5, 5), (6, 5), (6, 6), (5, 6)])
+    merged, groups = merge_polygons([bowtie, alone])
+    assert all(shapely.is_valid(merged))
+    assert len(merged) == 3 and abs(sum(polygon.area for polygon in merged) - 3) < 1e-12
+
+    merged, groups = merge_polygons([bowtie, alone, box(1, 1, 3, 3)])
+    assert all(shapely.is_valid(merged))
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('svgwrite')
+from regions import RegionalGenerator
+
+
+def make_sheet():
+    sheet = RegionalGenerator()
+
+    @sheet.region
+    def border(p, params):
+        p.add_rectangle((0, 0), (params.get('width', 100.), params['height']))
+
+    @sheet.region
+    def holes(p, params):
+        if 'hole' in params:
+            p.add_circle((10, 10), params['hole'])
+
+    return sheet
+
+
+def test_only_regions_reading_a_changed_parameter_are_dirty():
+    sheet = make_sheet()
+    sheet.build(width=80., height=1.)
+    assert sheet.dirty(width=80., height=1.) == {}
+    assert sheet.dirty(width=80., height=2.) == {'border': ['height']}
+
+
+def test_absent_parameters_are_dependencies():
+    sheet = make_sheet()
+    sheet.build(height=1.)
+    assert sheet.dirty(height=1.) == {}
+    assert sheet.dirty(height=1., width=200.) == {'border': ['width']}
+    assert sheet.dirty(height=1., hole=2.) == {'holes': ['hole']}
+    sheet.build(height=1., hole=2.)
+    assert sheet.rebuilt == ['holes']
+    assert sheet.dirty(height=1.) == {'holes': ['hole']}
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('shapely')
+from pattern import Pattern
+from stl_writer import STL_RECORD
+
+
+def read_stl(path):
+    with open(path, 'rb') as f:
+        f.seek(80)
+        count = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+        records = np.frombuffer(f.read(), dtype=STL_RECORD)
+    assert len(records) == count
+    return records['vertices'].astype(np.float64)
+
+
+def test_extruded_sheet_is_watertight(tmp_path):
+    p = Pattern()
+    p.add_rectangle((0, 0), (40, 30))
+    p.add_rectangle((5, 5), (15, 15))  # hole
+    p.add_circle((30, 15), 4)  # round hole
+    p.add_rectangle((50, 0), (60, 10))  # a second piece
+    regions = p.generate_stl(str(tmp_path / 'p.stl'), thickness=2.)
+    triangles = read_stl(str(tmp_path / 'p.stl'))
+
+    # every edge is shared by exactly two triangles that run along it in opposite directions
+    _, ids = np.unique(triangles.reshape(-1, 3), axis=0, return_inverse=True)
+    ids = ids.reshape(-1, 3)
+    edges = np.concatenate([ids[:, [0, 1]], ids[:, [1, 2]], ids[:, [2, 0]]])
+    directed = {tuple(e) for e in edges.tolist()}
+    assert len(directed) == len(edges)
+    assert all((b, a) in directed for a, b in directed)
+
+    # outward normals: the signed volume is the area of the pieces times the thickness
+    volume = np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum()/6
+    area = sum(region.area for region in regions)
+    assert len(regions) == 2
+    assert volume == pytest.approx(2.*area, rel=1e-6)
+    assert area == pytest.approx(40*30 - 100 - np.pi*16 + 100, rel=1e-2)
+
+
+def test_chunks_do_not_change_the_mesh():
+    from stl_writer import cut_regions, extrude
+    p = Pattern()
+    for i in range(6):
+        p.add_rectangle((10*i, 0), (10*i + 8, 8))
+        p.add_circle((10*i + 4, 4), 2)
+    regions = cut_regions(p.lines.segments)
+    count, chunks = extrude(regions, 1.)
+    whole = np.concatenate(list(chunks))
+    small_count, small_chunks = extrude(regions, 1., chunk_size=50)
+    small_chunks = list(small_chunks)
+    assert count == small_count == len(whole)
+    assert max(len(chunk) for chunk in small_chunks) <= 2*50  # one region may be yielded whole
+    assert len(small_chunks) > 4
+    key = lambda t: np.round(t, 9).reshape(-1, 9)
+    np.testing.assert_array_equal(np.unique(key(np.concatenate(small_chunks)), axis=0), np.unique(key(whole), axis=0))
+
+
+def test_open_outline_is_refused(tmp_path):
+    p = Pattern()
+    p.add_line((0, 0), (10, 0))
+    p.add_line((10, 0), (10, 10))
+    assert len(p.generate_stl(str(tmp_path / 'p.stl'), save=False)) == 0
+    with pytest.raises(ValueError, match='enclose'):
+        p.generate_stl(str(tmp_path / 'p.stl'))
+    assert not (tmp_path / 'p.stl').exists()
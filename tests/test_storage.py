@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('svgwrite')
+from geometry import SegmentBuffer
+from pattern import Pattern
+from settings import LaserCutter
+
+
+def make_pattern():
+    cell = Pattern()
+    cell.add_line((0, 0), (1, 0))
+    cell.add_arc((0, 0), 1, start_angle=0, end_angle=np.pi/2)
+    p = Pattern()
+    p.add_line((0, 0), (10, 5), mode=LaserCutter.ENGRAVE)
+    p.add_line((1, 2), (3, 4), kerf=0.2)
+    p.add_rectangle((20, 0), (25, 4))
+    p.add_circle((-5, -5), 2)
+    p.add_text((1, 1), "label", 12)
+    p.add_instances(cell, np.array([[0., 10.], [5., 10.]]))
+    p.add_instances(cell, np.array([[[0., -1., 30.], [1., 0., 0.]]]))  # the same cell, stored once
+    p.rotate(0.3)
+    p.parameters = {'width': 80., 'nx': 3, 'name': 'sheet'}
+    return p
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    p = make_pattern()
+    p.save(str(tmp_path / 'p.npz'))
+    q = Pattern.load(str(tmp_path / 'p.npz'), mmap=mmap)
+    for name in list(Pattern.BUFFERS) + ['polygons']:
+        for field, column in getattr(p, name).columns().items():
+            np.testing.assert_array_equal(getattr(q, name).columns()[field], column, err_msg=name + '/' + field)
+    np.testing.assert_array_equal(q.transform, p.transform)
+    assert q.text == p.text and q.parameters == p.parameters
+    assert len(q.instances) == 2 and q.instances[0][0] is q.instances[1][0]
+    for (_, loaded), (_, saved) in zip(q.instances, p.instances):
+        np.testing.assert_array_equal(loaded, saved)
+
+    p.write_svg(str(tmp_path / 'p.svg'))
+    q.write_svg(str(tmp_path / 'q.svg'))
+    assert (tmp_path / 'q.svg').read_text() == (tmp_path / 'p.svg').read_text()
+
+
+def test_loaded_pattern_can_be_extended(tmp_path):
+    p = make_pattern()
+    p.save(str(tmp_path / 'p.npz'))
+    q = Pattern.load(str(tmp_path / 'p.npz'))  # memory-mapped copy-on-write
+    q.add_line((0, 0), (1, 1))
+    assert len(q.lines) == len(p.lines) + 1
+    assert len(Pattern.load(str(tmp_path / 'p.npz')).lines) == len(p.lines)
+
+
+def test_boards_load_as_boards_only(tmp_path):
+    pytest.importorskip('shapely')
+    from pcb_layout_plus_dxf import PCBPattern
+    board = PCBPattern()
+    board.add_trace([(0, 0), (5, 5)], 0.5, "1 main")
+    board.save(str(tmp_path / 'b.npz'))
+    with pytest.raises(ValueError):
+        Pattern.load(str(tmp_path / 'b.npz'))
+    loaded = PCBPattern.load(str(tmp_path / 'b.npz'))
+    assert loaded.traces == board.traces
+
+
+def memory_mapped(arr):
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def test_from_columns_wraps_the_arrays_without_copying():
+    segments, mode = np.arange(24.).reshape(6, 2, 2), np.arange(6, dtype=np.uint8)
+    buf = SegmentBuffer.from_columns(segments=segments, mode=mode)
+    assert len(buf) == buf.capacity == 6
+    assert np.shares_memory(buf.segments, segments) and np.shares_memory(buf.mode, mode)
+
+    # the first append moves the records into fresh arrays and leaves the wrapped ones alone
+    buf.append((0, 0), (1, 1), 7)
+    assert len(buf) == 7 and not np.shares_memory(buf.segments, segments)
+    assert np.array_equal(buf.segments[:6], segments) and segments.shape == (6, 2, 2)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_load_maps_the_buffers_without_copying(tmp_path, mmap):
+    make_pattern().save(str(tmp_path / 'p.npz'))
+    q = Pattern.load(str(tmp_path / 'p.npz'), mmap=mmap)
+    buffers = [getattr(q, name) for name in Pattern.BUFFERS] + [q.polygons, q.polygons.vertices]
+    columns = [column for buf in buffers for column in buf.columns().values()]
+    assert all(memory_mapped(column) == mmap for column in columns)
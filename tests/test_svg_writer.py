@@ -0,0 +1,56 @@
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+
+pytest.importorskip('svgwrite')
+from pattern import Pattern
+
+SVG = '{http://www.w3.org/2000/svg}'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def nested_pattern():
+    leaf = Pattern()
+    leaf.add_line((0, 0), (1, 0))
+    leaf.add_rectangle((0, 0), (1, 1))
+    cell = Pattern()
+    cell.add_instances(leaf, np.array([[0., 0.], [2., 0.]]))
+    p = Pattern()
+    p.add_line((-5, -5), (-4, -4))
+    angles = np.array([0., 1., 2.])
+    p.add_instances(cell, np.stack([np.stack([np.cos(angles), -np.sin(angles), np.zeros(3)], axis=1),
+                                    np.stack([np.sin(angles), np.cos(angles), 3. * np.arange(3)], axis=1)], axis=1))
+    return p
+
+
+def test_instanced_svg_stays_tiny(tmp_path):
+    nested_pattern().write_svg(str(tmp_path / 'p.svg'), instancing=True)
+    root = ET.parse(str(tmp_path / 'p.svg')).getroot()
+    assert root.get('baseProfile') == 'tiny'
+    assert not list(root.iter(SVG + 'symbol'))
+    groups = {g.get('id') for defs in root.iter(SVG + 'defs') for g in defs.findall(SVG + 'g')}
+    uses = [use.get(XLINK_HREF) for use in root.iter(SVG + 'use')]
+    assert len(groups) == 2 and len(uses) == 5
+    assert {href.lstrip('#') for href in uses} == groups
+
+
+def sorted_segments(lines):
+    segments = np.concatenate([line.segments for line in lines]).reshape(-1, 4)
+    return segments[np.lexsort(np.round(segments, 2).T[::-1])]
+
+
+def test_preview_expands_instances(tmp_path):
+    from preview import load_svg
+    p = nested_pattern()
+    p.write_svg(str(tmp_path / 'flat.svg'))
+    p.write_svg(str(tmp_path / 'instanced.svg'), instancing=True)
+    flat, instanced = load_svg(str(tmp_path / 'flat.svg')), load_svg(str(tmp_path / 'instanced.svg'))
+    assert len(sorted_segments(flat)) == 1 + 2 * 3 * 5
+    np.testing.assert_allclose(sorted_segments(instanced), sorted_segments(flat), atol=1e-4)  # SVG keeps 4 decimals
+
+
+def test_preview_refuses_symbols(tmp_path):
+    from preview import load_svg
+    (tmp_path / 's.svg').write_text('<svg xmlns="http://www.w3.org/2000/svg"><symbol id="a" /></svg>')
+    with pytest.raises(ValueError, match='symbol'):
+        load_svg(str(tmp_path / 's.svg'))
@@ -0,0 +1,45 @@
+import json
+import pathlib
+import numpy as np
+import pytest
+
+from pattern import Pattern
+from settings import LaserCutter
+from sweep import PCB_FORMATS, parameter_grid, run_sweep
+
+
+def square(size, setting=LaserCutter, source=None):
+    p = Pattern(setting=setting)
+    p.add_rectangle((0, 0), (size, size))
+    return p
+
+
+def test_manifest_records_any_parameter(tmp_path):
+    parameter_sets = parameter_grid(size=[np.float64(2.), np.int64(3)], setting=[LaserCutter],
+                                    source=[pathlib.Path('in.dxf')])
+    entries = run_sweep(square, parameter_sets, str(tmp_path), formats=('svg',), processes=1)
+    assert [entry['status'] for entry in entries] == ['ok', 'ok']
+    with open(str(tmp_path / 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert [job['parameters']['size'] for job in manifest['jobs']] == [2., 3]
+    assert {job['parameters']['setting'] for job in manifest['jobs']} == {str(LaserCutter)}
+    assert {job['parameters']['source'] for job in manifest['jobs']} == {'in.dxf'}
+
+
+def board(size):
+    from pcb_layout_plus_dxf import PCBPattern
+    p = PCBPattern()
+    p.add_graphic_line([(0, 0), (size, 0), (size, size), (0, size), (0, 0)])
+    p.add_trace([(1, 1), (size - 1, 1)], 0.5, "1 main")
+    return p
+
+
+def test_boards_export_only_their_formats(tmp_path):
+    pytest.importorskip('ezdxf')
+    pytest.importorskip('shapely')
+    entries = run_sweep(board, [{'size': 10.}], str(tmp_path), formats=tuple(PCB_FORMATS), processes=1)
+    assert entries[0]['status'] == 'ok', entries[0].get('error')
+    assert sorted(entries[0]['files']) == ['board.kicad_pcb', 'board.npz', 'board.png', 'board_cut.dxf',
+                                           'board_etch.dxf']
+    entries = run_sweep(board, [{'size': 10.}], str(tmp_path), formats=('svg',), processes=1)
+    assert entries[0]['status'] == 'error' and 'PCBPattern has no svg exporter' in entries[0]['error']
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from toolpath import chain_segments, is_closed, merge_overlapping_segments, order_chains, order_paths, snap, \
+    travel_distance, unique_arcs
+
+TOL = 1e-6
+
+
+def test_snap_joins_values_across_grid_boundaries():
+    values = np.array([0.5*TOL - 1e-9, 0.5*TOL + 1e-9, 5*TOL, 5.8*TOL, 6.6*TOL])
+    labels, snapped = snap(values, TOL)
+    assert labels[0] == labels[1] and labels[1] != labels[2]
+    assert labels[2] == labels[3] == labels[4]
+    assert snapped[4] == values[2]
+    labels, _ = snap(values, TOL, groups=np.array([0, 1, 0, 0, 0]))
+    assert labels[0] != labels[1]
+
+
+def test_snap_joins_angles_across_the_period():
+    labels, snapped = snap(np.array([1e-9, np.pi - 1e-9, 1.]), 1e-6, period=np.pi)
+    assert labels[0] == labels[1] != labels[2]
+    assert snapped[0] == snapped[1] == pytest.approx(-1e-9)
+
+
+def test_duplicates_and_overlaps_are_merged():
+    segments = np.array([[[0, 0], [2, 0]],
+                         [[2, 0], [0, 0]],  # reversed duplicate
+                         [[1, 0], [3, 0]],  # overlaps the first
+                         [[3, 0], [4, 0]],  # touches the merged line
+                         [[0, 1], [1, 1]],  # parallel, not merged
+                         [[0, 0], [0, 1]]], dtype=float)
+    out, modes, removed = merge_overlapping_segments(segments)
+    assert len(out) == 3
+    np.testing.assert_allclose(np.sort(out[0], axis=0), [[0, 0], [4, 0]])
+    np.testing.assert_array_equal(out[1:], segments[4:])
+    assert removed == pytest.approx(2 + 2 + 2 + 1 + 1 + 1 - 4 - 1 - 1)
+
+
+def test_modes_are_not_merged():
+    segments = np.array([[[0, 0], [1, 0]], [[0, 0], [1, 0]]], dtype=float)
+    out, modes, removed = merge_overlapping_segments(segments, np.array([0, 1]))
+    assert len(out) == 2 and removed == 0
+
+
+def test_near_boundary_lines_are_merged():
+    # each pair is within tol, but rounding offset/tol or theta/angle_tol would put it in neighbouring buckets
+    angle_tol = TOL/40
+    theta = 0.5*angle_tol + np.array([-1e-11, 1e-11])
+    segments = np.array([[[0, 0.5*TOL - 1e-9], [10, 0.5*TOL - 1e-9]],
+                         [[5, 0.5*TOL + 1e-9], [15, 0.5*TOL + 1e-9]],
+                         [[0, 20], [10*np.cos(theta[0]), 20 + 10*np.sin(theta[0])]],
+                         [[5*np.cos(theta[1]), 20 + 5*np.sin(theta[1])],
+                          [15*np.cos(theta[1]), 20 + 15*np.sin(theta[1])]],
+                         [[20, 30], [30, 30 + 1e-10]],  # theta just above 0
+                         [[25, 30], [40, 30 - 1e-10]]])  # theta just below pi
+    out, _, removed = merge_overlapping_segments(segments)
+    assert len(out) == 3
+    assert removed == pytest.approx(5 + 5 + 5, abs=1e-6)
+
+
+def test_unique_arcs():
+    centers = np.array([[0, 0], [0, 0], [0, 0], [0, 0], [0, 0.5*TOL + 1e-9], [0, 0]])
+    radii = np.array([1, 1, 1, 1, 1, 2.])
+    start = np.array([0, np.pi/2, 2*np.pi, 0, 0, 0])
+    end = np.array([np.pi/2, 0, 2.5*np.pi, np.pi, np.pi/2, np.pi/2])
+    centers[0, 1] = 0.5*TOL - 1e-9
+    np.testing.assert_array_equal(unique_arcs(centers, radii, start, end), [0, 3, 5])
+    np.testing.assert_array_equal(unique_arcs(centers, radii, start, end, modes=[0, 1, 0, 0, 0, 0]), [0, 1, 3, 5])
+
+
+def test_chains_follow_shared_endpoints():
+    square = np.array([[[0, 0], [1, 0]], [[1, 1], [1, 0]], [[1, 1], [0, 1]], [[0, 1], [0, 0]]], dtype=float)
+    tail = np.array([[[5, 5], [6, 5]], [[6, 5], [7, 6]]], dtype=float)
+    segments = np.concatenate([square, tail])[[3, 4, 0, 2, 5, 1]]
+    chains = chain_segments(segments, np.array([0, 0, 0, 0, 0, 0]))
+    assert sorted(len(pts) for pts, _ in chains) == [3, 5]
+    closed = next(pts for pts, _ in chains if len(pts) == 5)
+    assert is_closed(closed)
+    chains = chain_segments(square, np.array([0, 0, 1, 1]))  # modes are never joined
+    assert sorted(len(pts) for pts, _ in chains) == [3, 3]
+    assert {mode for _, mode in chains} == {0, 1}
+
+
+def test_ordering_keeps_paths_and_cuts_travel():
+    rng = np.random.default_rng(1)
+    starts = rng.uniform(0, 100, (300, 2))
+    ends = starts + rng.uniform(-2, 2, (300, 2))
+    order, flipped, before, after = order_paths(starts, ends)
+    assert sorted(order) == list(range(300))
+    assert before == pytest.approx(travel_distance(starts, ends))
+    s, e = starts[order], ends[order]
+    s[flipped], e[flipped] = ends[order][flipped], starts[order][flipped]
+    assert after == pytest.approx(travel_distance(s, e))
+    assert after < before/3
+    order, flipped, _, _ = order_paths(starts, ends, reversible=False)
+    assert not np.any(flipped)
+
+
+def test_order_chains_flips_only_what_it_reports():
+    chains = [(np.array([[10., 0], [5, 0]]), 0), (np.array([[0., 0], [1, 0]]), 0), (np.array([[20., 0], [30, 0]]), 1)]
+    ordered, before, after = order_chains(chains)
+    assert after <= before
+    assert sorted(tuple(sorted(map(tuple, pts.tolist()))) for pts, _ in ordered) == \
+        sorted(tuple(sorted(map(tuple, pts.tolist()))) for pts, _ in chains)
+    ordered, _, _ = order_chains(chains, allow_reversal=False)
+    assert sorted(pts[0].tolist() for pts, _ in ordered) == sorted(pts[0].tolist() for pts, _ in chains)
+
+
+def test_exporters_return_the_travel_instead_of_printing_it(tmp_path, capsys):
+    from pattern import Pattern
+    p = Pattern()
+    for k in [3, 0, 4, 1, 2]:
+        p.add_line((10.*k, 0), (10.*k + 5, 0))
+    before, after = p.write_svg(str(tmp_path / 'p.svg'), optimize_order=True)
+    assert after < before and p.write_svg(str(tmp_path / 'q.svg')) is None
+    pytest.importorskip('ezdxf')
+    doc, dxf_before, dxf_after = p.generate_dxf(str(tmp_path / 'p.dxf'), optimize_order=True)
+    assert (dxf_before, dxf_after) == pytest.approx((before, after))
+    assert capsys.readouterr().out == ''
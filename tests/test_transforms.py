@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from geometry import arc_points, decompose_affine, mirror_matrix, rotation_matrix, scale_matrix, transform_points, \
+    translation_matrix
+from pattern import Pattern
+
+N = 9  # odd, so the middle point of each discretized arc sits at the arc's middle angle
+
+
+def make_arcs():
+    p = Pattern()
+    p.add_arc((2, 1), 3, n=N, start_angle=0.3, end_angle=2.)
+    p.add_arc((-4, 5), 1.5, n=N, start_angle=-2.5, end_angle=0.5)
+    return p
+
+
+def svg_arcs(p):
+    """
+    :return: (arcs, N, 2) array with the discretized points of every arc, in drawing order
+    """
+    segments = p.lines.segments.reshape(-1, N - 1, 2, 2)
+    return np.concatenate([segments[:, :, 0], segments[:, -1:, 1]], axis=1)
+
+
+def test_mirror_matrix():
+    points = np.array([[1., 2., 1.], [-3., 0.5, 1.]])
+    assert np.allclose((mirror_matrix('y', (2, 7)) @ points.T).T[:, :2], [[3., 2.], [7., 0.5]])
+    assert np.allclose((mirror_matrix('x', (2, 7)) @ points.T).T[:, :2], [[1., 12.], [-3., 13.5]])
+    with pytest.raises(ValueError):
+        mirror_matrix('z')
+
+
+def test_transformable_mirror_composes_after_earlier_transforms():
+    p = Pattern()
+    assert p.translate(1, 2).mirror('x', origin=(0, 3)) is p
+    assert np.allclose(p.transform, mirror_matrix('x', (0, 3)) @ translation_matrix(1, 2))
+    assert p.has_transform and not p.reset_transform().has_transform
+
+
+@pytest.mark.parametrize('axis', ['x', 'y'])
+def test_mirrored_arcs_follow_their_discretization(axis):
+    p = make_arcs()
+    q = p.mirror(axis, origin=(1, -2)).transformed()
+    arcs = q.circles_dxf
+    # the mirrored arc parameters trace the mirrored SVG points one by one, so the direction flips as well
+    assert np.allclose(arc_points(arcs.center, arcs.radius, arcs.start_angle, arcs.end_angle, N), svg_arcs(q))
+    assert np.all(arcs.end_angle < arcs.start_angle)
+    assert np.allclose(svg_arcs(q), transform_points(svg_arcs(make_arcs()), p.transform[None, :2])[0])
+
+
+def dxf_arc_points(entities):
+    """
+    :return: (arcs, 3, 2) array with the start, middle and end point of every ARC entity
+    """
+    points = [[tuple(v)[:2] for v in arc.vertices(arc.angles(3))] for arc in entities if arc.dxftype() == 'ARC']
+    return np.array(points)
+
+
+def assert_same_arcs(dxf_points, svg_points):
+    """
+    DXF arcs always run counterclockwise, so each one matches its SVG polyline either way round, but always with the
+    same middle point (which tells the two sides of the circle apart)
+    """
+    expected = svg_points[:, [0, N//2, N - 1]]
+    assert len(dxf_points) == len(expected)
+    for arc in dxf_points:
+        assert any(np.allclose(arc, e, atol=1e-6) or np.allclose(arc[::-1], e, atol=1e-6) for e in expected)
+
+
+@pytest.mark.parametrize('axis', ['x', 'y'])
+def test_mirrored_dxf_arcs_match_the_svg_discretization(tmp_path, axis):
+    ezdxf = pytest.importorskip('ezdxf')
+    p = make_arcs().mirror(axis, origin=(1, -2))
+    p.generate_dxf(str(tmp_path / 'p.dxf'))
+    assert_same_arcs(dxf_arc_points(ezdxf.readfile(str(tmp_path / 'p.dxf')).modelspace()), svg_arcs(p.transformed()))
+
+
+def test_mirrored_instances_written_as_inserts_match_the_svg_discretization(tmp_path):
+    ezdxf = pytest.importorskip('ezdxf')
+    p = Pattern()
+    transforms = np.array([translation_matrix(20, 0), mirror_matrix('y', (40, 0)), mirror_matrix('x') @
+                           rotation_matrix(0.7), scale_matrix(2., -2.)])[:, :2]
+    p.add_instances(make_arcs(), transforms)
+    p.generate_dxf(str(tmp_path / 'p.dxf'), instancing=True)
+    msp = ezdxf.readfile(str(tmp_path / 'p.dxf')).modelspace()
+    inserts = msp.query('INSERT')
+    assert len(inserts) == len(transforms)
+    dxf_points = np.concatenate([dxf_arc_points(insert.virtual_entities()) for insert in inserts])
+    assert_same_arcs(dxf_points, svg_arcs(p.expand()))
+
+
+def test_decompose_affine_round_trip():
+    rng = np.random.default_rng(0)
+    count = 50
+    translations = rng.uniform(-100, 100, (count, 2))
+    rotations = rng.uniform(-np.pi, np.pi, count)
+    x_scales = rng.uniform(0.1, 5., count)
+    y_scales = rng.uniform(0.1, 5., count)*rng.choice([-1., 1.], count)  # negative y scales are reflections
+    transforms = np.array([translation_matrix(*t) @ rotation_matrix(r) @ scale_matrix(sx, sy)
+                           for t, r, sx, sy in zip(translations, rotations, x_scales, y_scales)])[:, :2]
+
+    result = decompose_affine(transforms)
+    assert result[4].all()
+    for expected, found in zip((translations, rotations, x_scales, y_scales), result[:4]):
+        assert np.allclose(found, expected)
+
+    # and a left-right mirror comes back as a rotation by pi with a negative y scale
+    _, (rotation,), (x_scale,), (y_scale,), (valid,) = decompose_affine(mirror_matrix('y')[None, :2])
+    assert valid and np.isclose(abs(rotation), np.pi) and np.isclose(x_scale, 1.) and np.isclose(y_scale, -1.)
+
+
+def test_decompose_affine_flags_shear():
+    shear = np.array([[[1., 0.5, 3.], [0., 1., 4.]]])
+    assert not decompose_affine(shear)[4][0]
@@ -0,0 +1,478 @@
+import numpy as np
+
+
+def endpoint_ids(points, tol=1e-6):
+    """
+    Assigns the same id to points that land in the same cell of a grid with spacing tol
+    :param points: Array of shape (N, 2)
+    :param tol: Grid spacing (mm). Points closer than tol usually share a cell, but points straddling a cell boundary
+                can still be split apart.
+    :return: (ids, first), where ids[i] is the id of points[i] and first[k] is the index of the first point with id k
+    """
+    keys = np.round(np.asarray(points)/tol).astype(np.int64)
+    _, first, ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return ids.ravel(), first
+
+
+def _chain(ends, node_count):
+    """
+    Walks the graph whose edges are the rows of ends, splitting it into as few open/closed trails as it can greedily
+    :param ends: Array of shape (N, 2) with the node ids at either end of each edge
+    :param node_count: Number of nodes
+    :return: List of node id paths
+    """
+    flat = ends.ravel()
+    degree = np.bincount(flat, minlength=node_count)
+    incident = (np.argsort(flat, kind='stable')//2).tolist()  # edges touching each node, grouped by node
+    bounds = np.concatenate([[0], np.cumsum(degree)])
+    cursor = bounds[:-1].tolist()
+    stop = bounds[1:].tolist()
+    ends = ends.tolist()
+    used = [False]*len(ends)
+
+    def next_edge(u):
+        c = cursor[u]
+        while c < stop[u] and used[incident[c]]:
+            c += 1
+        cursor[u] = c
+        return incident[c] if c < stop[u] else -1
+
+    # Start from the dead ends and junctions first so open chains are not cut in the middle, then pick up the cycles
+    starts = np.concatenate([np.flatnonzero(degree != 2), np.flatnonzero(degree == 2)]).tolist()
+    paths = []
+    for start in starts:
+        e = next_edge(start)
+        while e >= 0:
+            path = [start]
+            u = start
+            while e >= 0:
+                used[e] = True
+                a, b = ends[e]
+                u = b if a == u else a
+                path.append(u)
+                e = next_edge(u)
+            paths.append(path)
+            e = next_edge(start)
+    return paths
+
+
+def chain_segments(segments, modes=None, tol=1e-6):
+    """
+    Joins segments that share endpoints into polylines, so they can be exported as a single path instead of one line
+    per segment. Segments are only joined with segments of the same mode, and may be reversed to do so.
+    :param segments: Array of shape (N, 2, 2)
+    :param modes: Drawing mode of each segment, or None if all segments share a mode
+    :param tol: Endpoints closer than this (mm) are treated as the same point
+    :return: List of (points, mode), where points is an (n, 2) array. Closed chains repeat their first point at the end.
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    if modes is None:
+        modes = np.zeros(len(segments), dtype=np.uint8)
+    chains = []
+    for mode in np.unique(modes):
+        subset = segments[modes == mode]
+        points = subset.reshape(-1, 2)
+        ids, first = endpoint_ids(points, tol)
+        node_pts = points[first]
+        for path in _chain(ids.reshape(-1, 2), len(first)):
+            chains.append((node_pts[path], mode))
+    return chains
+
+
+def is_closed(pts):
+    """
+    :param pts: Array of shape (n, 2)
+    :return: True if the polyline ends where it starts (and is more than a single back-and-forth segment)
+    """
+    return len(pts) > 3 and np.array_equal(pts[0], pts[-1])
+
+
+def add_dxf_polyline(msp, pts, dxfattribs=None):
+    """
+    Adds a chain of points to a DXF modelspace as a LINE (two points) or an LWPOLYLINE (closed if it ends where it
+    starts)
+    :param msp: ezdxf modelspace (or block layout)
+    :param pts: Array of shape (n, 2)
+    :param dxfattribs: DXF attributes of the new entity
+    :return: The new entity
+    """
+    closed = is_closed(pts)
+    if closed:
+        pts = pts[:-1]
+    if len(pts) == 2:
+        return msp.add_line(tuple(pts[0]), tuple(pts[1]), dxfattribs=dxfattribs)
+    return msp.add_lwpolyline(pts.tolist(), close=closed, dxfattribs=dxfattribs)
+
+
+def snap(values, tol, groups=None, period=None):
+    """
+    Clusters values within each group: in sorted order, a value closer than tol to the previous one joins its cluster.
+    Unlike rounding to a grid of spacing tol, values that straddle a grid boundary are never split apart.
+    :param values: Shape (N,)
+    :param tol: Scalar, or shape (N,) with the tolerance of each value
+    :param groups: Integer group of each value, or None. Values of different groups are never clustered together.
+    :param period: If not None, values are angles modulo period, so clusters meeting across the wrap are joined
+    :return: (labels, snapped), where labels are cluster ids, unique across groups (so they can be the groups of the
+             next call), and snapped[i] is the smallest value of the cluster of values[i], moved by -period if it was
+             joined across the wrap
+    """
+    values = np.array(values, dtype=np.float64)
+    tol = np.broadcast_to(tol, values.shape)
+    groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), values
+    for attempt in range(2):
+        order = np.lexsort((values, groups))
+        new_group = np.r_[True, groups[order][1:] != groups[order][:-1]]
+        starts = new_group | np.r_[True, np.diff(values[order]) > tol[order][1:]]
+        labels = np.empty(len(values), dtype=np.int64)
+        labels[order] = np.cumsum(starts) - 1
+        if period is None or attempt:
+            break
+        firsts, lasts = order[new_group], order[np.r_[new_group[1:], True]]
+        wrapped = (values[firsts] + period - values[lasts] <= tol[lasts]) & (labels[firsts] != labels[lasts])
+        moved = np.isin(labels, labels[lasts[wrapped]])
+        if not moved.any():
+            break
+        values[moved] -= period
+    return labels, values[order][starts][labels]
+
+
+def merge_overlapping_segments(segments, modes=None, tol=1e-6):
+    """
+    Removes duplicate segments and merges collinear segments that overlap or touch, so no line is cut twice.
+    Segments are bucketed by their supporting line (direction and distance from the origin, both clustered with snap)
+    and the intervals along each line are sorted and merged, so the pass is O(n log n). Segments that do not overlap
+    anything are returned unchanged, and the output keeps the order in which segments were first added.
+    :param segments: Array of shape (N, 2, 2)
+    :param modes: Drawing mode of each segment, or None if all segments share a mode. Only segments with the same
+                  mode are merged.
+    :param tol: Distance (mm) below which points are treated as the same point
+    :return: (segments, modes, removed_length), where removed_length is the cut length (mm) that was removed
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    modes = np.zeros(len(segments), dtype=np.uint8) if modes is None else np.asarray(modes)
+    if len(segments) == 0:
+        return segments, modes, 0.
+    delta = segments[:, 1] - segments[:, 0]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    total_length = length.sum()
+    nonzero = np.flatnonzero(length > tol)
+    segments, modes, delta = segments[nonzero], modes[nonzero], delta[nonzero]
+
+    # Line direction in [0, pi) so that reversed segments land on the same line
+    span = max(1., np.abs(segments).max())
+    angle_tol = tol/span
+    theta_key, theta = snap(np.arctan2(delta[:, 1], delta[:, 0])%np.pi, angle_tol, modes, period=np.pi)
+    direction = np.column_stack([np.cos(theta), np.sin(theta)])
+    normal = np.column_stack([-direction[:, 1], direction[:, 0]])
+    offset = (segments[:, 0]*normal).sum(axis=1)
+    t0 = (segments[:, 0]*direction).sum(axis=1)
+    t1 = (segments[:, 1]*direction).sum(axis=1)
+    lo, hi = np.minimum(t0, t1), np.maximum(t0, t1)
+    line_key, _ = snap(offset, tol, theta_key)  # theta_key already separates the modes
+
+    order = np.lexsort((lo, line_key))
+    groups = line_key[order].tolist()
+    lo_sorted, hi_sorted, order = lo[order].tolist(), hi[order].tolist(), order.tolist()
+    merged = []  # [first index, lo, hi, representative index, member count]
+    current, previous_group = None, None
+    for group, i, a, b in zip(groups, order, lo_sorted, hi_sorted):
+        if group == previous_group and a <= current[2] + tol:
+            current[0] = min(current[0], i)
+            current[2] = max(current[2], b)
+            current[4] += 1
+        else:
+            current = [i, a, b, i, 1]
+            merged.append(current)
+            previous_group = group
+    merged.sort()
+
+    first, lo_out, hi_out, rep, count = [np.array(x) for x in zip(*merged)]
+    out = segments[first].copy()
+    combined = count > 1
+    r = rep[combined]
+    base = offset[r, None]*normal[r]
+    out[combined, 0] = base + lo_out[combined, None]*direction[r]
+    out[combined, 1] = base + hi_out[combined, None]*direction[r]
+    removed_length = total_length - length[nonzero][first[~combined]].sum() - (hi_out - lo_out)[combined].sum()
+    return out, modes[first], max(0., float(removed_length))
+
+
+def unique_arcs(centers, radii, start_angles, end_angles, modes=None, tol=1e-6):
+    """
+    Finds arcs that trace the same curve as an earlier arc (regardless of direction or of full turns in the angles)
+    :param centers: Array of shape (N, 2)
+    :param radii: Shape (N,)
+    :param start_angles: Shape (N,) (radians)
+    :param end_angles: Shape (N,) (radians)
+    :param modes: Drawing mode of each arc, or None if all arcs share a mode
+    :param tol: Distance (mm) below which points are treated as the same point
+    :return: Sorted indices of the arcs to keep
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    modes = np.zeros(len(centers), dtype=np.uint8) if modes is None else np.asarray(modes)
+    lo = np.minimum(start_angles, end_angles)
+    sweep = np.abs(np.asarray(end_angles) - np.asarray(start_angles))
+    full = sweep >= 2*np.pi - tol
+    lo = np.where(full, 0., lo%(2*np.pi))
+    sweep = np.where(full, 2*np.pi, sweep)
+    key, _ = snap(centers[:, 0], tol, modes)
+    key, _ = snap(centers[:, 1], tol, key)
+    key, radii = snap(radii, tol, key)
+    angle_tol = tol/np.maximum(radii, tol)
+    key, _ = snap(lo, angle_tol, key, period=2*np.pi)
+    key, _ = snap(sweep, angle_tol, key)
+    _, first = np.unique(key, return_index=True)
+    return np.sort(first)
+
+
+def travel_distance(starts, ends, start_point=(0, 0)):
+    """
+    :param starts: Array of shape (N, 2) with the point where the tool starts cutting each path
+    :param ends: Array of shape (N, 2) with the point where the tool stops cutting each path
+    :param start_point: Where the tool head is before the first path
+    :return: Total rapid-travel distance (mm) between consecutive paths, in the given order
+    """
+    if len(starts) == 0:
+        return 0.
+    previous = np.concatenate([np.asarray(start_point, dtype=np.float64)[None], ends[:-1]])
+    return float(np.hypot(*(starts - previous).T).sum())
+
+
+def _greedy_order(starts, ends, reversible, start_point):
+    """
+    Greedy nearest-neighbor tour: repeatedly jumps to the closest unvisited path end. Path ends are kept in a uniform
+    grid sized to hold about one end per cell, and the grid is searched in growing rings around the tool head.
+    :return: (order, flipped)
+    """
+    n = len(starts)
+    candidates = np.flatnonzero(reversible)
+    pts = np.concatenate([starts, ends[candidates]])
+    owner = np.concatenate([np.arange(n), candidates]).tolist()
+    flips = [False]*n + [True]*len(candidates)
+
+    lo = pts.min(axis=0)
+    extent = pts.max(axis=0) - lo
+    cell = max(np.sqrt(extent[0]*extent[1]/len(pts)), extent.max()/len(pts), 1e-9)
+    keys = np.floor((pts - lo)/cell).astype(np.int64)
+    nx, ny = (keys.max(axis=0) + 1).tolist()
+    cells = [[] for _ in range(nx*ny)]
+    for k, (i, j) in enumerate(keys.tolist()):
+        cells[i*ny + j].append(k)
+    pts_list = pts.tolist()
+
+    visited = [False]*n
+    order, flipped = [], []
+    x, y = float(start_point[0]), float(start_point[1])
+    for _ in range(n):
+        ci = min(max(int((x - lo[0])//cell), 0), nx - 1)
+        cj = min(max(int((y - lo[1])//cell), 0), ny - 1)
+        best, best_d = -1, np.inf
+        r = 0
+        while True:
+            for i in range(max(ci - r, 0), min(ci + r, nx - 1) + 1):
+                edge = abs(i - ci) == r
+                for j in (range(max(cj - r, 0), min(cj + r, ny - 1) + 1) if edge else (cj - r, cj + r)):
+                    if j < 0 or j >= ny:
+                        continue
+                    bucket = cells[i*ny + j]
+                    alive = [k for k in bucket if not visited[owner[k]]]
+                    if len(alive) != len(bucket):
+                        cells[i*ny + j] = alive
+                    for k in alive:
+                        px, py = pts_list[k]
+                        d = (px - x)**2 + (py - y)**2
+                        if d < best_d:
+                            best, best_d = k, d
+            # Everything in ring r + 1 is at least r cells away from the tool head
+            if best >= 0 and np.sqrt(best_d) <= r*cell or r > max(nx, ny):
+                break
+            r += 1
+        path = owner[best]
+        visited[path] = True
+        order.append(path)
+        flipped.append(flips[best])
+        x, y = (starts[path] if flips[best] else ends[path]).tolist()
+    return np.array(order, dtype=np.int64), np.array(flipped, dtype=bool)
+
+
+def _refine_order(S, E, reversible, window, max_passes):
+    """
+    Improves a tour in place with windowed 2-opt (reversing a run of paths) and Or-opt (moving a single path) moves.
+    S, E and reversible are indexed by tour position; position 0 is the fixed tool start.
+    :return: (permutation of positions, flipped flags per position)
+    """
+    n = len(S)
+    perm = np.arange(n)
+    flipped = np.zeros(n, dtype=bool)
+
+    def dist(a, b):
+        return np.hypot(a[..., 0] - b[..., 0], a[..., 1] - b[..., 1])
+
+    for _ in range(max_passes):
+        improved = False
+        # 2-opt: reverse positions i..j
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, min(i + window, n))
+            fixed = np.cumsum(~reversible[i:j[-1] + 1])  # reversing is only allowed if every path in the run may flip
+            nxt = np.minimum(j + 1, n - 1)
+            has_next = j + 1 < n
+            delta = dist(E[i - 1], E[j]) - dist(E[i - 1], S[i]) \
+                + np.where(has_next, dist(S[i], S[nxt]) - dist(E[j], S[nxt]), 0.)
+            delta[fixed[j - i] > 0] = 0.
+            k = np.argmin(delta)
+            if delta[k] < -1e-9:
+                j = j[k]
+                S[i:j + 1], E[i:j + 1] = E[i:j + 1][::-1].copy(), S[i:j + 1][::-1].copy()
+                perm[i:j + 1] = perm[i:j + 1][::-1].copy()
+                flipped[i:j + 1] = ~flipped[i:j + 1][::-1]
+                reversible[i:j + 1] = reversible[i:j + 1][::-1].copy()
+                improved = True
+        # Or-opt: move the path at position k to sit right after position m
+        for k in range(1, n):
+            has_next = k + 1 < n
+            gain = dist(E[k - 1], S[k]) + (dist(E[k], S[k + 1]) - dist(E[k - 1], S[k + 1]) if has_next else 0.)
+            m = np.arange(max(k - window, 0), min(k + window, n))
+            m = m[(m != k) & (m != k - 1)]
+            if len(m) == 0:
+                continue
+            mn = np.minimum(m + 1, n - 1)
+            has_mn = m + 1 < n
+            cost = dist(E[m], S[k]) + np.where(has_mn, dist(E[k], S[mn]) - dist(E[m], S[mn]), 0.)
+            best = np.argmin(cost)
+            if cost[best] - gain < -1e-9:
+                m = m[best]
+                block = slice(k, m + 1) if m > k else slice(m + 1, k + 1)
+                shift = -1 if m > k else 1
+                for arr in (S, E, perm, flipped, reversible):
+                    arr[block] = np.roll(arr[block], shift, axis=0)
+                improved = True
+        if not improved:
+            break
+    return perm, flipped
+
+
+def order_paths(starts, ends, reversible=True, start_point=(0, 0), window=32, max_passes=2):
+    """
+    Computes a cutting order with little rapid travel between paths: a greedy nearest-neighbor tour, refined with
+    2-opt and Or-opt moves within a sliding window of neighboring paths.
+    :param starts: Array of shape (N, 2) with the start point of each path (equal to its end for closed paths)
+    :param ends: Array of shape (N, 2) with the end point of each path
+    :param reversible: Whether each path may be cut end-to-start (single value or one per path)
+    :param start_point: Where the tool head is before the first path
+    :param window: How many neighboring tour positions each refinement move looks at
+    :param max_passes: Maximum number of refinement passes
+    :return: (order, flipped, travel_before, travel_after), where order lists path indices in cutting order, flipped
+             says whether each path in that order is cut end-to-start, and travel_* are rapid-travel distances (mm)
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+    n = len(starts)
+    reversible = np.broadcast_to(np.asarray(reversible, dtype=bool), (n,)).copy()
+    reversible |= np.all(starts == ends, axis=1)  # closed paths look the same in both directions
+    travel_before = travel_distance(starts, ends, start_point)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), 0., 0.
+
+    order, flipped = _greedy_order(starts, ends, reversible, start_point)
+    S = np.where(flipped[:, None], ends[order], starts[order])
+    E = np.where(flipped[:, None], starts[order], ends[order])
+    origin = np.asarray(start_point, dtype=np.float64)[None]
+    S, E = np.concatenate([origin, S]), np.concatenate([origin, E])
+    perm, refined_flips = _refine_order(S, E, np.concatenate([[False], reversible[order]]), window, max_passes)
+    perm, refined_flips = perm[1:] - 1, refined_flips[1:]
+    order, flipped = order[perm], flipped[perm] ^ refined_flips
+    return order, flipped, travel_before, travel_distance(S[1:], E[1:], start_point)
+
+
+def _dxf_path_ends(entity):
+    """
+    :return: (start, end, reversible) of a DXF entity as the laser would cut it, or None for non-path entities
+    """
+    kind = entity.dxftype()
+    if kind == 'LINE':
+        return entity.dxf.start.vec2, entity.dxf.end.vec2, True
+    if kind == 'ARC':  # DXF arcs always run counter-clockwise
+        return entity.start_point.vec2, entity.end_point.vec2, False
+    if kind == 'CIRCLE':
+        pt = entity.dxf.center.vec2 + (entity.dxf.radius, 0)
+        return pt, pt, True
+    if kind == 'LWPOLYLINE':
+        pts = entity.get_points('xy')
+        bulged = any(b for (b,) in entity.get_points('b'))
+        return pts[0], pts[0] if entity.closed else pts[-1], not bulged
+    if kind == 'POLYLINE':
+        pts = [v.vec2 for v in entity.points()]
+        return pts[0], pts[0] if entity.is_closed else pts[-1], entity.is_closed
+    if kind == 'INSERT':  # a placed block is visited as a whole, starting and ending near its insertion point
+        pt = entity.dxf.insert.vec2
+        return pt, pt, True
+    return None
+
+
+def _reverse_dxf_path(entity):
+    kind = entity.dxftype()
+    if kind == 'LINE':
+        entity.dxf.start, entity.dxf.end = entity.dxf.end, entity.dxf.start
+    elif kind == 'LWPOLYLINE' and not entity.closed:
+        entity.set_points(list(reversed(entity.get_points('xy'))), format='xy')
+
+
+def order_dxf_entities(msp, start_point=(0, 0), allow_reversal=True, window=32, max_passes=2):
+    """
+    Reorders the entities of a DXF layout (and flips lines/open polylines where allowed) to cut down the rapid travel
+    of the laser head. Entities that are not cut paths (e.g. text) are moved to the end in their original order.
+    :param msp: ezdxf modelspace (or block layout)
+    :param start_point: Where the tool head is before the first path
+    :param allow_reversal: Whether lines and open polylines may be cut end-to-start
+    :param window: How many neighboring tour positions each refinement move looks at
+    :param max_passes: Maximum number of refinement passes
+    :return: (travel_before, travel_after), the estimated rapid-travel distances (mm)
+    """
+    entities = list(msp)
+    paths, others, ends = [], [], []
+    for entity in entities:
+        info = _dxf_path_ends(entity)
+        if info is None:
+            others.append(entity)
+        else:
+            paths.append(entity)
+            ends.append(info)
+    if not paths:
+        return 0., 0.
+    starts = np.array([info[0] for info in ends], dtype=np.float64)
+    stops = np.array([info[1] for info in ends], dtype=np.float64)
+    reversible = np.array([info[2] and allow_reversal for info in ends], dtype=bool)
+    order, flipped, travel_before, travel_after = order_paths(starts, stops, reversible, start_point, window,
+                                                              max_passes)
+    for entity in entities:
+        msp.unlink_entity(entity)
+    for i, flip in zip(order.tolist(), flipped.tolist()):
+        if flip:
+            _reverse_dxf_path(paths[i])
+        msp.add_entity(paths[i])
+    for entity in others:
+        msp.add_entity(entity)
+    return travel_before, travel_after
+
+
+def order_chains(chains, start_point=(0, 0), allow_reversal=True, window=32, max_passes=2):
+    """
+    Reorders (and flips where allowed) a list of polylines to cut down the rapid travel of the laser head
+    :param chains: List of (points, mode), as returned by chain_segments
+    :param start_point: Where the tool head is before the first path
+    :param allow_reversal: Whether open polylines may be cut end-to-start
+    :param window: How many neighboring tour positions each refinement move looks at
+    :param max_passes: Maximum number of refinement passes
+    :return: (chains, travel_before, travel_after)
+    """
+    if not chains:
+        return chains, 0., 0.
+    starts = np.array([pts[0] for pts, mode in chains])
+    ends = np.array([pts[-1] for pts, mode in chains])
+    order, flipped, travel_before, travel_after = order_paths(starts, ends, allow_reversal, start_point, window,
+                                                              max_passes)
+    ordered = [(chains[i][0][::-1] if flip else chains[i][0], chains[i][1])
+               for i, flip in zip(order.tolist(), flipped.tolist())]
+    return ordered, travel_before, travel_after
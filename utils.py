@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def generate_line(pt, theta):
@@ -103,6 +102,8 @@ def generate_arc_v2(pt1, pt2, theta1, theta2, r, quadrant, N):
 
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     pts = generate_arc_v2(np.array([0, 0]), np.array([1, 0]), np.pi/2, np.pi/2, 10)
     print(pts)
     plt.plot([x[0] for x in pts], [x[1] for x in pts])